@@ -1,8 +1,11 @@
 from xml.etree import ElementTree
 
+import numpy
+
+from vistas.core.classification import RangeClassifier, ValueClassifier, as_float_array
 from vistas.core.color import RGBColor
 from vistas.core.graphics.feature import FeatureFactory
-from vistas.core.graphics.terrain import TerrainTileFactory
+from vistas.core.graphics.terrain import StreamingTerrainFactory
 from vistas.core.legend import StretchedLegend, CategoricalLegend
 from vistas.core.plugins.data import DataPlugin
 from vistas.core.plugins.option import Option, OptionGroup
@@ -30,6 +33,7 @@ class EnvisionVisualization(VisualizationPlugin3D):
         # Renderable objects for this scene
         self.tile_layer = None
         self.feature_layer = None
+        self._idu_index = None      # Sorted IDUs of the features of the feature layer
         self.feature_data = None
         self.delta_data = None
 
@@ -114,11 +118,13 @@ class EnvisionVisualization(VisualizationPlugin3D):
             if value is not None:
                 self.legend = CategoricalLegend(self.envision_style[self.current_attribute].get('categories'))
 
-                # Decide which color function to use
+                # Decide which classifier to use
+                style = self.envision_style[self.current_attribute]
                 if self.delta_data and self.is_delta_attribute(self.current_attribute) and self.use_deltas:
-                    self.feature_layer.set_color_function(self.color_deltas)
+                    classifier = lambda values: self.classify_deltas(style, values)
                 else:
-                    self.feature_layer.set_color_function(self.color_shapes)
+                    classifier = lambda values: self.classify_colors(style, values)
+                self.feature_layer.set_color_classifier(style.get('column'), classifier)
 
             else:   # Nothing to be done, color it grey
                 self.legend = None
@@ -127,7 +133,6 @@ class EnvisionVisualization(VisualizationPlugin3D):
         else:   # Envision styling is not active
             stats = self.feature_data.variable_stats(self.current_attribute)
             value = props.get(self.current_attribute)
-            self.feature_layer.set_color_function(self.color_shapes)
 
             if isinstance(value, (int, float)):
                 min_value = stats.min_value
@@ -143,6 +148,11 @@ class EnvisionVisualization(VisualizationPlugin3D):
             else:
                 self.legend = None
 
+            if self.legend is not None:
+                self.feature_layer.set_color_classifier(self.current_attribute, self.legend.get_colors)
+            else:
+                self.feature_layer.set_color_function(self.color_shapes)
+
         post_new_legend()
 
         if self.needs_color:
@@ -224,6 +234,8 @@ class EnvisionVisualization(VisualizationPlugin3D):
                     minmax.append((float(data.get('minVal')), float(data.get('maxVal'))))
                 self.envision_style[column]['minmax'] = minmax
 
+            self.compile_style(self.envision_style[column])
+
         for column in empties:
             self.envision_style.pop(column)
 
@@ -296,9 +308,11 @@ class EnvisionVisualization(VisualizationPlugin3D):
         post_redisplay()
 
     def create_terrain_mesh(self):
+        self.dispose_layers()
+
         if self.feature_data is not None:
             zoom = int(self._zoom.value)
-            self.tile_layer = TerrainTileFactory(self.feature_data.extent, initial_zoom=zoom, plugin=self)
+            self.tile_layer = StreamingTerrainFactory(self.feature_data.extent, initial_zoom=zoom, plugin=self)
             self.scene.add_object(self.tile_layer)
             self.feature_layer = FeatureFactory(
                 self.feature_data.extent, self.feature_data, initial_zoom=zoom, plugin=self
@@ -308,12 +322,53 @@ class EnvisionVisualization(VisualizationPlugin3D):
             self.needs_color = False
         else:
             self.scene.remove_all_objects()
-            if self.tile_layer is not None:
-                self.tile_layer.dispose()
-                self.tile_layer = None
-            if self.feature_layer is not None:
-                self.feature_layer.dispose()
-                self.feature_layer = None
+
+    def dispose_layers(self):
+        """
+        Removes the tile and feature layers from the scene, releases their cached meshes, and closes them, which stops
+        any tiles still being loaded.
+        """
+
+        for layer in (self.tile_layer, self.feature_layer):
+            if layer is not None:
+                if self.scene is not None and self.scene.has_object(layer):
+                    self.scene.remove_object(layer)
+                layer.clear_cached_meshes()
+                layer.dispose()
+                layer.close()
+        self.tile_layer = self.feature_layer = None
+        self._idu_index = None
+
+    @staticmethod
+    def compile_style(style):
+        """
+        Compiles the legend of a parsed style into a classifier, which maps column values to legend entries, and a
+        palette of the color of each entry. The last color of the palette is for values which match no entry.
+        """
+
+        legend = style.get('legend')
+        minmax = style.get('minmax')
+        if minmax is not None:
+            style['classifier'] = RangeClassifier(minmax)
+        else:
+            values, classes = [], []
+            for i, entry in enumerate(legend):
+                try:
+                    values.append(float(entry.get('value')))
+                except (TypeError, ValueError):
+                    continue
+                classes.append(i)
+            style['classifier'] = ValueClassifier(values, classes)
+
+        categories = CategoricalLegend(style.get('categories'))
+        colors = [categories.get_color(entry.get('label')) or GREY for entry in legend]
+        style['palette'] = numpy.array([color.rgb.rgb_list for color in colors + [GREY]], dtype=numpy.float32)
+
+    @staticmethod
+    def classify_colors(style, values):
+        """ Colors an array of column values with a compiled style """
+
+        return style['palette'][style['classifier'].classify(values)]
 
     def color_shapes(self, feature, data):
         """
@@ -325,88 +380,55 @@ class EnvisionVisualization(VisualizationPlugin3D):
 
         if self.envision_style is not None:
             envision_attribute = self.envision_style[self.current_attribute]
-            shp_attribute = envision_attribute.get('column')
-            legend = envision_attribute.get('legend')
-            value = feature.get('properties').get(shp_attribute)
-            minmax = envision_attribute.get('minmax', None)
-            string_value = ''
-
-            if minmax is not None:
-                for i, pair in enumerate(minmax):
-                    if pair[0] <= value <= pair[1]:
-                        string_value = legend[i].get('label')
-                        break
-            else:
-                for entry in legend:
-                    try:
-                        val = float(entry.get('value'))
-                    except ValueError:
-                        continue
-                    if val == value:
-                        string_value = entry.get('label')
-                        break
-
-            color = self.legend.get_color(string_value)
-            if color is None:
-                color = GREY
-            return color
+            value = feature.get('properties').get(envision_attribute.get('column'))
+            return RGBColor(*self.classify_colors(envision_attribute, [value])[0])
 
         # Fallback to coloring based on shapefile schema
         else:
             value = feature.get('properties').get(self.current_attribute)
             return self.legend.get_color(value)
 
-    def color_deltas(self, feature, data):
+    def get_idu_index(self):
         """
-        Color features based on presence in the Envision Delta Array. Features absent from delta array are colored grey.
+        Returns the sorted IDUs of the features and the permutation of the features which sorts them. The index is
+        built once per feature layer.
         """
 
-        if self.legend is None:
-            return GREY
-
-        envision_attribute = self.envision_style[self.current_attribute]
-        shp_attribute = envision_attribute.get('column')
-        legend = envision_attribute.get('legend')
-        value = feature.get('properties').get(shp_attribute)
-        idu = int(feature.get('id'))
-        minmax = envision_attribute.get('minmax', None)
-        string_value = ''
-
-        try:
-            if 'delta_array' not in data:
-                data['delta_array'] = self.delta_data.get_data(shp_attribute, Timeline.app().current)
-                data['index'] = 0
-                if data.get('delta_array') is None:
-                    self.feature_layer.set_color_function(self.color_shapes)
-                    post_message('Could not retrieve deltas, defaulting to base value.', 1)
-                    return self.color_shapes(feature, None)
-
-            darray = data.get('delta_array')
-            index = data.get('index')
-
-            if darray[index].idu == idu:
-                value += darray[index].new_value
-                data['index'] += 1
-            else:
-                if darray[index].idu < idu:
-                    while darray[index].idu <= idu:
-                        index += 1
-                data['index'] = index
+        if self._idu_index is None or self._idu_index[0] is not self.feature_layer:
+            idus = self.feature_data.get_ids().astype(numpy.int64)
+            order = numpy.argsort(idus, kind='stable')
+            self._idu_index = (self.feature_layer, idus[order], order)
+        return self._idu_index[1:]
 
-                return GREY
-
-        # Handle if we reached the end of the delta array
-        except IndexError:
-            return GREY
-
-        if minmax is not None:
-            for i, pair in enumerate(minmax):
-                if pair[0] <= value <= pair[1]:
-                    string_value = legend[i].get('label')
-                    break
-
-        color = self.legend.get_color(string_value)
-        if color is None:
-            color = GREY
+    def classify_deltas(self, style, values):
+        """
+        Colors an array of column values with a compiled style, after applying the deltas of the current year. Deltas
+        are matched to features by IDU, and only the first delta of each IDU is applied. Features absent from the
+        delta array are colored grey.
+        """
 
-        return color
+        deltas = self.delta_data.get_deltas(style.get('column'), Timeline.app().current)
+        if deltas is None:
+            post_message('Could not retrieve deltas, defaulting to base value.', 1)
+            return self.classify_colors(style, values)
+
+        delta_idus, delta_values = deltas
+        sorted_idus, order = self.get_idu_index()
+        values = as_float_array(values).copy()
+        if not sorted_idus.size:
+            return self.classify_colors(style, values)
+
+        # Find the feature of the first delta of each IDU
+        delta_idus, first = numpy.unique(delta_idus, return_index=True)
+        delta_values = delta_values[first]
+        position = numpy.minimum(numpy.searchsorted(sorted_idus, delta_idus), sorted_idus.size - 1)
+        found = sorted_idus[position] == delta_idus
+        features = order[position[found]]
+
+        values[features] += delta_values[found]
+        colors = self.classify_colors(style, values)
+
+        changed = numpy.zeros(len(values), dtype=bool)
+        changed[features] = True
+        colors[~changed] = style['palette'][-1]
+        return colors
@@ -126,3 +126,14 @@ class EnvisionDeltaArray(ArrayDataPlugin):
         else:
             return None
 
+
+    def get_deltas(self, variable, date=None):
+        """ Returns the deltas of a variable for the year of date as arrays of IDUs and new values, or None. """
+
+        deltas = self.get_data(variable, date)
+        if deltas is None:
+            return None
+
+        idus = numpy.fromiter((x.idu for x in deltas), dtype=numpy.int64, count=len(deltas))
+        values = numpy.fromiter((x.new_value for x in deltas), dtype=numpy.float64, count=len(deltas))
+        return idus, values
@@ -10,6 +10,7 @@ import numpy as np
 import numpy.ma as ma
 
 from vistas.core.gis.extent import Extent
+from vistas.core.gis.sampling import read_cells
 from vistas.core.plugins.data import RasterDataPlugin, VariableStats, TemporalInfo
 from vistas.core.timeline import Timeline
 
@@ -123,9 +124,11 @@ class ESRIGridAscii(RasterDataPlugin):
         except rasterio.RasterioIOError:
             return False
 
-    def get_data(self, variable, date=None):
-        if self._current_grid is not None and self._current_time == date and self._current_variable == variable:
-            return self._current_grid.copy()
+    def _get_path(self, date=None):
+        """
+        Returns the path of the grid for the given time, along with the time the grid represents: the date clamped to
+        the timestamps, or None if the data isn't temporal.
+        """
 
         path = os.path.abspath(self.path)
         if self._is_velma and self.time_info.is_temporal:
@@ -147,6 +150,15 @@ class ESRIGridAscii(RasterDataPlugin):
                 filename = filename + '_{:2d}_{:2d}'.format(date.hour, date.minute)
             filename = "{}.asc".format(filename)
             path = os.path.join(os.path.dirname(path), filename)
+        else:
+            date = None
+
+        return path, date
+
+    def get_data(self, variable, date=None):
+        path, date = self._get_path(date)
+        if self._current_grid is not None and self._current_time == date and self._current_variable == variable:
+            return self._current_grid.copy()
 
         with rasterio.open(path) as src:
             self._current_grid = ma.array(src.read(1), mask=np.logical_not(src.read_masks(1)))
@@ -154,6 +166,14 @@ class ESRIGridAscii(RasterDataPlugin):
         self._current_time = date
         return self._current_grid.copy()
 
+    def sample(self, variable, date, rows, cols):
+        path, date = self._get_path(date)
+        if self._current_grid is not None and self._current_time == date and self._current_variable == variable:
+            return self._current_grid[np.asarray(rows, dtype=int), np.asarray(cols, dtype=int)]
+
+        with rasterio.open(path) as src:
+            return read_cells(src, 1, rows, cols)
+
     @property
     def variables(self):
         return [self.data_name]
@@ -172,5 +192,6 @@ class ESRIGridAscii(RasterDataPlugin):
             stats.max_value = float(max(maxs))
             stats.nodata_value = self._nodata_value
             stats.misc['shape'] = "({},{})".format(*self.shape)
+            self.calculate_histograms(self.data_name, stats)
             self.stats[self.data_name] = stats
             self.save_stats()
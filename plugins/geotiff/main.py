@@ -6,6 +6,8 @@ import numpy as np
 import numpy.ma as ma
 
 from vistas.core.gis.extent import Extent
+from vistas.core.gis.sampling import read_cells
+from vistas.core.histogram import compute_histogram_counts
 from vistas.core.plugins.data import RasterDataPlugin, VariableStats
 
 
@@ -67,6 +69,13 @@ class GeoTIFF(RasterDataPlugin):
             self._current_grid = ma.array(src.read(band), mask=np.logical_not(src.read_masks(band)))
         return self._current_grid.copy()
 
+    def sample(self, variable, date, rows, cols):
+        band = int(self._band(variable))
+        if band == self._current_band:
+            return self._current_grid[np.asarray(rows, dtype=int), np.asarray(cols, dtype=int)]
+        with rasterio.open(self.path, 'r') as src:
+            return read_cells(src, band, rows, cols)
+
     @property
     def variables(self):
         return ['Band {}'.format(i) for i in range(1, self._count + 1)]
@@ -77,7 +86,11 @@ class GeoTIFF(RasterDataPlugin):
                 variables = self.variables
                 for i, band in enumerate(range(1, self._count + 1)):
                     data = src.read(band)
-                    if self._nodata is not None:
-                        data = data[data != self._nodata]
-                    self.stats[variables[i]] = VariableStats(float(data.min()), float(data.max()), self._nodata)
+                    valid = data[data != self._nodata] if self._nodata is not None else data
+                    stats = VariableStats(float(valid.min()), float(valid.max()), self._nodata)
+                    stats.misc['histograms'] = [
+                        compute_histogram_counts(data, stats.min_value, stats.max_value, self._nodata)
+                    ]
+                    stats.misc['histogram'] = stats.misc['histograms'][0]
+                    self.stats[variables[i]] = stats
             self.save_stats()
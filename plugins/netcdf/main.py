@@ -6,9 +6,11 @@ from clover.netcdf.variable import SpatialCoordinateVariable, SpatialCoordinateV
 import clover.netcdf.describe
 from netCDF4 import Dataset
 import datetime as dt
+import numpy
 import wx
 
 from vistas.core.gis.extent import Extent
+from vistas.core.gis.sampling import bounding_window
 from vistas.core.plugins.data import RasterDataPlugin, TemporalInfo, VariableStats
 from vistas.core.timeline import Timeline
 from vistas.ui.app import App
@@ -124,13 +126,34 @@ class NetCDF4DataPlugin(RasterDataPlugin):
                 self._current_grid = ds.variables[variable][slice_to_read]
             self._current_variable = variable
 
-        slice_to_return = slice(None)
+        return self._current_grid[self._time_index(date)]
+
+    def _time_index(self, date=None):
+        """ Returns the index of the timestep closest to the date, or a full slice if the data isn't temporal. """
+
         if self.time_info.is_temporal:
             if date is None:
                 date = Timeline.app().current
-            slice_to_return = min([i for i in enumerate(self.time_info.timestamps)],
-                key=lambda d: abs(d[1] - date))[0]
-        return self._current_grid[slice_to_return]
+            return min([i for i in enumerate(self.time_info.timestamps)], key=lambda d: abs(d[1] - date))[0]
+        return slice(None)
+
+    def sample(self, variable, date, rows, cols):
+        rows = numpy.asarray(rows, dtype=int)
+        cols = numpy.asarray(cols, dtype=int)
+        if variable == self._current_variable:
+            return self._current_grid[self._time_index(date)][rows, cols]
+
+        # Read only the window bounding the cells
+        row_offset, col_offset, height, width = bounding_window(rows, cols)
+        window = (slice(row_offset, row_offset + height), slice(col_offset, col_offset + width))
+        with Dataset(self.path, 'r') as ds:
+            var = ds.variables[variable]
+            if len(var.shape) == 3:
+                time_index = self._time_index(date) if self.time_info.is_temporal else -1
+                data = var[(time_index, *window)]
+            else:
+                data = var[window]
+        return data[rows - row_offset, cols - col_offset]
 
     @property
     def shape(self):
@@ -141,9 +164,16 @@ class NetCDF4DataPlugin(RasterDataPlugin):
         return self._resolution
 
     def calculate_stats(self):
-        with Dataset(self.path, 'r') as ds:
-            desc = clover.netcdf.describe.describe(ds)
+        if self.stats.is_stale:
+            with Dataset(self.path, 'r') as ds:
+                desc = clover.netcdf.describe.describe(ds)
+                for var in self.variables:
+                    v_desc = desc['variables'][var]
+                    # Stats are saved as JSON, so numpy scalars are converted to Python values
+                    self.stats[var] = VariableStats(*(
+                        None if x is None else numpy.asarray(x).item() for x in
+                        (v_desc['min'], v_desc['max'], get_fill_value_for_variable(ds.variables[var]))
+                    ))
             for var in self.variables:
-                v_desc = desc['variables'][var]
-                self.stats[var] = VariableStats(v_desc['min'], v_desc['max'],
-                    get_fill_value_for_variable(ds.variables[var]))
+                self.calculate_histograms(var, self.stats[var])
+            self.save_stats()
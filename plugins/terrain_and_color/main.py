@@ -12,6 +12,8 @@ from rasterstats import zonal_stats
 from shapely.geometry import Polygon, Point, LinearRing
 
 from vistas.core.color import RGBColor
+from vistas.core.gis.zonal import ZonalStatistics, zone_statistics
+from vistas.core.graphics.boundary import boundary_texture_shape, draw_selection, selection_box
 from vistas.core.graphics.mesh import Mesh
 from vistas.core.graphics.terrain import TerrainColorGeometry, TerrainColorShaderProgram
 from vistas.core.graphics.texture import Texture
@@ -34,6 +36,10 @@ class TerrainAndColorPlugin(VisualizationPlugin3D):
     version = '1.0'
     visualization_name = 'Terrain & Color'
 
+    boundary_texels_per_cell = 4
+    max_boundary_texture_size = 2048
+    max_flow_vectors = 250000
+
     zonal_stats = dict(median=numpy.median, stdev=numpy.std, range=lambda array: numpy.max(array) - numpy.min(array))
 
     def __init__(self):
@@ -54,9 +60,19 @@ class TerrainAndColorPlugin(VisualizationPlugin3D):
         self.selected_point = (-1, -1)
         self.feature_boundary = None
         self._needs_terrain = self._needs_color = False
+        self._needs_heights = False
         self._needs_boundaries = False
         self._needs_flow = False
 
+        # Cached boundary overlay layers
+        self._boundary_layer = None
+        self._boundary_image = None
+        self._selection_rect = None
+        self._zonal_layer_key = None
+
+        self._zonal_statistics = ZonalStatistics()
+        self._flow_static = None
+
         self._is_filtered = False
         self._filter_min = self._filter_max = 0
 
@@ -83,7 +99,10 @@ class TerrainAndColorPlugin(VisualizationPlugin3D):
         self._hide_no_data = Option(self, Option.CHECKBOX, "Hide No Data Values", False)
         self._per_vertex_color = Option(self, Option.CHECKBOX, "Per Vertex Color", True)
         self._per_vertex_lighting = Option(self, Option.CHECKBOX, "Per Vertex Lighting", False)
-        graphics_group.items = [self._hide_no_data, self._per_vertex_color, self._per_vertex_lighting]
+        self._value_texture = Option(self, Option.CHECKBOX, "Store Values in Texture", False)
+        graphics_group.items = [
+            self._hide_no_data, self._per_vertex_color, self._per_vertex_lighting, self._value_texture
+        ]
 
         self._options.items = [color_group, value_group, data_group, graphics_group]
 
@@ -147,6 +166,9 @@ class TerrainAndColorPlugin(VisualizationPlugin3D):
             post_new_legend()
 
         elif name == self._elevation_attribute.name:
+            self._needs_heights = True
+
+        elif name == self._value_texture.name:
             self._needs_terrain = True
 
         elif name is self._boundary_width.name:
@@ -178,9 +200,14 @@ class TerrainAndColorPlugin(VisualizationPlugin3D):
 
             elif name == self._hide_no_data_vectors.name:
                 vector_shader.hide_no_data = self._hide_no_data_vectors.value
+                self._needs_flow = True
 
             elif name == self._acc_filter.name:
                 vector_shader.use_mag_filter = self._acc_filter.value and self.flow_acc_data is not None
+                self._needs_flow = True
+
+            elif name == self._flow_stride.name:
+                self._needs_flow = True
 
             elif name == self._vector_speed.name:
                 vector_shader.vector_speed = self._vector_speed.value
@@ -188,6 +215,8 @@ class TerrainAndColorPlugin(VisualizationPlugin3D):
             elif name in [self._acc_min.name, self._acc_max.name]:
                 vector_shader.mag_min = self._acc_min.value
                 vector_shader.mag_max = self._acc_max.value
+                if self._acc_filter.value:
+                    self._needs_flow = True
 
             elif name == self._acc_scale.name:
                 vector_shader.use_magnitude_scale = self._acc_scale.value and self.flow_acc_data is not None
@@ -195,11 +224,20 @@ class TerrainAndColorPlugin(VisualizationPlugin3D):
         self.refresh()
 
     def timeline_changed(self):
-        if self.terrain_data and self.terrain_data.time_info and self.terrain_data.time_info.is_temporal:
-            self._needs_terrain = True
+        if self._is_temporal(self.terrain_data):
+            self._needs_heights = True
         self._needs_color = True
+
+        # Only the dynamic vector columns are rebuilt, and only if one of their inputs changes over time
+        if self.flow_dir_data is not None and any(
+                self._is_temporal(x) for x in (self.flow_dir_data, self.flow_acc_data, self.attribute_data)):
+            self._needs_flow = True
         self.refresh()
 
+    @staticmethod
+    def _is_temporal(data):
+        return data is not None and data.time_info is not None and data.time_info.is_temporal
+
     @property
     def can_visualize(self):
         return self.terrain_data is not None
@@ -286,14 +324,14 @@ class TerrainAndColorPlugin(VisualizationPlugin3D):
     @property
     def filter_histogram(self):
         if self.attribute_data is not None:
-            variable = self._attribute.selected
-            stats = self.attribute_data.variable_stats(variable)
-            return Histogram(
-                self.attribute_data.get_data(variable, Timeline.app().current),
-                min_value=stats.min_value,
-                max_value=stats.max_value,
-                nodata_value=stats.nodata_value
-            )
+            return self.attribute_data.get_histogram(self._attribute.selected, Timeline.app().current)
+        else:
+            return Histogram()
+
+    @property
+    def filter_histogram_all_timesteps(self):
+        if self.attribute_data is not None:
+            return self.attribute_data.get_histogram(self._attribute.selected, all_timesteps=True)
         else:
             return Histogram()
 
@@ -340,10 +378,15 @@ class TerrainAndColorPlugin(VisualizationPlugin3D):
         if self._needs_terrain:
             self._create_terrain_mesh()
             self._needs_terrain = False
+            self._needs_heights = False
             self._needs_color = False
-        elif self._needs_color:
-            self._update_terrain_color()
-            self._needs_color = False
+        else:
+            if self._needs_heights:
+                self._update_terrain_heights()
+                self._needs_heights = False
+            if self._needs_color:
+                self._update_terrain_color()
+                self._needs_color = False
         if self._needs_boundaries:
             self._update_boundaries()
             self._needs_boundaries = False
@@ -389,28 +432,17 @@ class TerrainAndColorPlugin(VisualizationPlugin3D):
                 self.terrain_mesh.geometry.dispose()
                 self.terrain_mesh = None
 
-            elevation_attribute = self._elevation_attribute.selected
-            height_stats = self.terrain_data.variable_stats(elevation_attribute)
-            nodata_value = height_stats.nodata_value
-            min_value = height_stats.min_value
-            max_value = height_stats.max_value
             cellsize = self.terrain_data.resolution
-            height_data = self.terrain_data.get_data(elevation_attribute)
-            if isinstance(height_data, numpy.ma.MaskedArray):
-                height_data = height_data.data
-
-            factor = 1.0
+            height_data = self._get_height_data()
             height, width = height_data.shape
 
-            max_height = math.sqrt(width * height * cellsize) / 2
-            if max_value > max_height:
-                factor = max_height / max_value
-
-            height_data[height_data != nodata_value] *= factor      # Apply factor where needed
-            height_data[height_data == nodata_value] = min_value    # Otherwise, set to min value
-
-            geometry = TerrainColorGeometry(width, height, cellsize, height_data)
+            geometry = TerrainColorGeometry(
+                width, height, cellsize, height_data, use_value_texture=self._value_texture.value
+            )
             shader = TerrainColorShaderProgram()
+            shader.value_texture = geometry.value_texture
+            self._zonal_layer_key = None
+            self._flow_static = None
             mesh = Mesh(geometry, shader, plugin=self)
 
             self.terrain_mesh = mesh
@@ -422,6 +454,51 @@ class TerrainAndColorPlugin(VisualizationPlugin3D):
                 self.terrain_mesh.geometry.dispose()
                 self.terrain_mesh = None
 
+    def _get_height_data(self):
+        """ Retrieves the current elevation grid, scaled to the terrain mesh and with nodata values flattened. """
+
+        elevation_attribute = self._elevation_attribute.selected
+        height_stats = self.terrain_data.variable_stats(elevation_attribute)
+        nodata_value = height_stats.nodata_value
+        min_value = height_stats.min_value
+        max_value = height_stats.max_value
+        cellsize = self.terrain_data.resolution
+        height_data = self.terrain_data.get_data(elevation_attribute, Timeline.app().current)
+        if isinstance(height_data, numpy.ma.MaskedArray):
+            height_data = height_data.data
+
+        factor = 1.0
+        height, width = height_data.shape
+
+        max_height = math.sqrt(width * height * cellsize) / 2
+        if max_value > max_height:
+            factor = max_height / max_value
+
+        height_data[height_data != nodata_value] *= factor      # Apply factor where needed
+        height_data[height_data == nodata_value] = min_value    # Otherwise, set to min value
+        return height_data
+
+    def _update_terrain_heights(self):
+        """ Updates the heights of the existing terrain mesh in place, rebuilding it only if the grid has changed. """
+
+        if self.terrain_data is None or self.terrain_mesh is None:
+            self._create_terrain_mesh()
+            return
+
+        height_data = self._get_height_data()
+        geometry = self.terrain_mesh.geometry
+        if height_data.shape != (geometry.height, geometry.width):
+            self._create_terrain_mesh()
+            return
+
+        geometry.heights = height_data
+        self.terrain_mesh.update()
+        self._flow_static = None
+
+        # Flow vectors are positioned on the terrain surface
+        if self.flow_dir_data is not None:
+            self._needs_flow = True
+
     def _update_terrain_color(self):
         if self.terrain_mesh is not None:
             shader = self.terrain_mesh.shader
@@ -451,100 +528,138 @@ class TerrainAndColorPlugin(VisualizationPlugin3D):
         shader = self.terrain_mesh.shader
         if self.terrain_data is not None:
             shader.has_boundaries = True
-
-            # Create boundary image
-            texture_w, texture_h = 512, 512
-            image_data = numpy.ones((texture_h, texture_w, 3), dtype=numpy.uint8) * 255
-
-            terrain_extent = self.terrain_data.extent
-            if self.boundary_data is not None:
-                # Burn geometry to texture
-                shapes = self.boundary_data.get_features()
-                image_data[:, :, 0] = numpy.flipud(features.rasterize(
-                    [shapely.geometry.shape(f['geometry']).exterior.buffer(self._boundary_width.value) for f in shapes
-                        if f['geometry']['type'] == 'Polygon'],
-                    out_shape=(texture_h, texture_w), fill=255, default_value=0,
-                    transform=transform.from_bounds(*terrain_extent.as_list(), texture_w, texture_h)
-                ))
-
-            if self.selected_point != (-1, -1):
-                p = (self.selected_point[0], self.selected_point[1] + 1)
-                cell_size = self.terrain_data.resolution
-                grid_width, grid_height = self.terrain_data.shape
-                xscale = texture_w / terrain_extent.width
-                yscale = texture_h / terrain_extent.height
-                box_w, box_h = cell_size * xscale, cell_size * yscale
-                center = (int(p[0] / grid_height * texture_h), int(512 - p[1] / grid_width * texture_w))
-
-                # Draw black rectangle directly into data
-                min_x = min(max(center[0] - box_w / 2, 0), 510)
-                max_x = min(max(center[0] + box_w / 2, min_x + 1), 511)
-                min_y = min(max(center[1] - box_h / 2, 0), 510)
-                max_y = min(max(center[1] + box_h / 2, min_y + 1), 511)
-
-                image_data[round(min_y): round(max_y), round(min_x): round(max_x), 0] = 0
-
-            shader.boundary_texture = Texture(
-                data=image_data.ravel(), width=texture_w, height=texture_h, src_format=GL_RGB8
-            )
-
-            # Update zonal stats texture
-            image_data = numpy.ones((texture_h, texture_w, 3), dtype=numpy.uint8) * 255
-            if self.feature_boundary is not None:
-                shader.has_zonal_boundary = True
-                t_res = self.terrain_data.resolution
-                normalized_coords = [(p[0] / t_res, p[1] / t_res) for p in self.feature_boundary.coords]
-                if isinstance(self.feature_boundary, Point):
-                    feat = Point(*[[transform.xy(self.terrain_data.affine, *p) for p in normalized_coords]])
-                else:
-                    feat = LinearRing(*[[transform.xy(self.terrain_data.affine, *p) for p in normalized_coords]])
-                image_data[:, :, 0] = numpy.flipud(features.rasterize(
-                    [feat.buffer(self._boundary_width.value)],
-                    out_shape=(texture_h, texture_w), fill=255, default_value=1, all_touched=True,
-                    transform=transform.from_bounds(*terrain_extent.as_list(), texture_w, texture_h)
-                ))
-            else:
-                shader.has_zonal_boundary = False
-
-            shader.zonal_texture = Texture(
-                data=image_data.ravel(), width=texture_w, height=texture_h, src_format=GL_RGB8
+            texture_shape = self._boundary_texture_shape()
+            texture_h, texture_w = texture_shape
+
+            # The composed boundary image is kept between updates. While the boundary layer and the texture are
+            # unchanged, only the old and new selection boxes are redrawn and uploaded.
+            boundary_layer = self._get_boundary_layer(texture_shape) if self.boundary_data is not None else None
+            selection_rect = selection_box(self.selected_point, self.terrain_data.shape, texture_shape)
+            image = self._boundary_image
+            if image is None or image[0] is not boundary_layer or image[1].shape[:2] != texture_shape or \
+                    image[2] is not shader.boundary_texture:
+                image_data = numpy.full((texture_h, texture_w, 3), 255, dtype=numpy.uint8)
+                if boundary_layer is not None:
+                    image_data[:, :, 0] = boundary_layer
+                draw_selection(image_data, boundary_layer, None, selection_rect)
+                shader.boundary_texture = self._update_boundary_texture(shader.boundary_texture, image_data)
+                self._boundary_image = (boundary_layer, image_data, shader.boundary_texture)
+            elif selection_rect != self._selection_rect:
+                image_data = image[1]
+                for x, y, w, h in draw_selection(image_data, boundary_layer, self._selection_rect, selection_rect):
+                    shader.boundary_texture.update(numpy.ascontiguousarray(image_data[y:y+h, x:x+w]), x, y, w, h)
+            self._selection_rect = selection_rect
+
+            # Update zonal stats texture, only if the zonal feature has changed
+            shader.has_zonal_boundary = self.feature_boundary is not None
+            zonal_key = (
+                self.feature_boundary.wkb if self.feature_boundary is not None else None,
+                self._boundary_width.value, tuple(self.terrain_data.extent.as_list()), texture_shape
             )
+            if self._zonal_layer_key != zonal_key:
+                image_data = numpy.ones((texture_h, texture_w, 3), dtype=numpy.uint8) * 255
+                if self.feature_boundary is not None:
+                    image_data[:, :, 0] = self._get_zonal_layer(texture_shape)
+                shader.zonal_texture = self._update_boundary_texture(shader.zonal_texture, image_data)
+                self._zonal_layer_key = zonal_key
 
         else:
             shader.has_boundaries = False
             shader.has_zonal_boundary = False
             shader.boundary_texture = Texture()
             shader.zonal_texture = Texture()
+            self._boundary_image = self._selection_rect = None
+            self._zonal_layer_key = None
+
+    def _boundary_texture_shape(self):
+        """ Size the boundary textures from the terrain grid, using several texels per cell for small grids. """
+
+        return boundary_texture_shape(self.terrain_data.shape, self.boundary_texels_per_cell,
+                                      self.max_boundary_texture_size)
+
+    def _get_boundary_layer(self, texture_shape):
+        """ Returns the rasterized boundary layer. The layer is cached, since the boundaries rarely change. """
+
+        terrain_extent = self.terrain_data.extent
+        key = (
+            self.boundary_data, self._boundary_width.value, tuple(terrain_extent.as_list()),
+            self.terrain_data.resolution, texture_shape
+        )
+        if self._boundary_layer is None or self._boundary_layer[0] != key:
+            texture_h, texture_w = texture_shape
+            shapes = self.boundary_data.get_features()
+            layer = numpy.flipud(features.rasterize(
+                [shapely.geometry.shape(f['geometry']).exterior.buffer(self._boundary_width.value) for f in shapes
+                    if f['geometry']['type'] == 'Polygon'],
+                out_shape=(texture_h, texture_w), fill=255, default_value=0, dtype=numpy.uint8,
+                transform=transform.from_bounds(*terrain_extent.as_list(), texture_w, texture_h)
+            ))
+            self._boundary_layer = (key, layer)
+
+        return self._boundary_layer[1]
+
+    def _get_zonal_layer(self, texture_shape):
+        """ Returns the zonal feature boundary rasterized into the terrain extent. """
+
+        texture_h, texture_w = texture_shape
+        t_res = self.terrain_data.resolution
+        normalized_coords = [(p[0] / t_res, p[1] / t_res) for p in self.feature_boundary.coords]
+        if isinstance(self.feature_boundary, Point):
+            feat = Point(*[[transform.xy(self.terrain_data.affine, *p) for p in normalized_coords]])
+        else:
+            feat = LinearRing(*[[transform.xy(self.terrain_data.affine, *p) for p in normalized_coords]])
+        return numpy.flipud(features.rasterize(
+            [feat.buffer(self._boundary_width.value)],
+            out_shape=(texture_h, texture_w), fill=255, default_value=1, all_touched=True, dtype=numpy.uint8,
+            transform=transform.from_bounds(*self.terrain_data.extent.as_list(), texture_w, texture_h)
+        ))
+
+    @staticmethod
+    def _update_boundary_texture(texture, image_data):
+        """ Uploads image data into an existing texture of the same size, or creates a new texture otherwise. """
+
+        texture_h, texture_w, _ = image_data.shape
+        if texture is not None and texture.width == texture_w and texture.height == texture_h:
+            texture.update(image_data.ravel())
+            return texture
+        return Texture(data=image_data.ravel(), width=texture_w, height=texture_h, src_format=GL_RGB8)
 
     def _update_flow(self):
-        if self.terrain_data is not None and self.flow_dir_data is not None:
+        if self.terrain_mesh is not None and self.flow_dir_data is not None:
 
-            height_label = self._elevation_attribute.selected
             flow_dir_label = self.flow_dir_data.variables[0]
             flow_acc_label = self.flow_acc_data.variables[0] if self.flow_acc_data is not None else ""
             attribute_label = self._attribute.selected if self.attribute_data is not None else ""
 
-            height_data = self.terrain_data.get_data(height_label, Timeline.app().current)
+            geometry = self.terrain_mesh.geometry
             flow_dir = self.flow_dir_data.get_data(flow_dir_label, Timeline.app().current)
 
-            height, width = flow_dir.shape
-
-            if not flow_dir.shape == height_data.shape:
+            if not flow_dir.shape == (geometry.height, geometry.width):
                 post_message("Terrain and flow grids don't match. Did you load the correct flow grid for this terrain?",
                              MessageEvent.ERROR)
                 return
 
-            # Clobber all the data into one big array
-            vector_data = numpy.zeros((height, width, VectorGeometry.BUFFER_WIDTH), dtype=numpy.float32)
-            vector_data[:, :, 0:3] = self.terrain_mesh.geometry.vertices.reshape((height, width, 3))
-            vector_data[:, :, 3] = flow_dir * -45.0 + 45.0       # VELMA flow direction, converted to polar degrees
-            vector_data[:, :, 4] = 90 - numpy.arcsin(numpy.abs(
-                self.terrain_mesh.geometry.normals.reshape((height, width, 3))[:, :, 2]
-            )) * 180 / numpy.pi
-            vector_data[:, :, 5] = numpy.ones((height, width), dtype=numpy.float32) if self.flow_acc_data is None else \
-                self.flow_acc_data.get_data(flow_acc_label, Timeline.app().current)
-            vector_data[:, :, 6] = numpy.zeros((height, width), dtype=numpy.float32) if self.attribute_data is None \
-                else self.attribute_data.get_data(attribute_label, Timeline.app().current)
+            stride = self._get_flow_stride(geometry.height, geometry.width)
+            decimate = (slice(None, None, stride), slice(None, None, stride))
+
+            # Positions and tilt only depend on the terrain, so they are only rebuilt when the terrain or stride changes
+            if self._flow_static is None or self._flow_static[0] != stride:
+                positions = geometry.vertices.reshape((geometry.height, geometry.width, 3))[decimate].reshape(-1, 3)
+                tilt = 90 - numpy.arcsin(numpy.abs(
+                    geometry.normals.reshape((geometry.height, geometry.width, 3))[decimate][:, :, 2]
+                )) * 180 / numpy.pi
+                self._flow_static = (stride, positions, tilt.ravel())
+            _, positions, tilt = self._flow_static
+
+            direction = flow_dir[decimate].ravel() * -45.0 + 45.0     # VELMA flow direction, converted to polar degrees
+            if self.flow_acc_data is None:
+                magnitude = numpy.ones(direction.shape, dtype=numpy.float32)
+            else:
+                magnitude = self.flow_acc_data.get_data(flow_acc_label, Timeline.app().current)[decimate].ravel()
+            if self.attribute_data is None:
+                value = numpy.zeros(direction.shape, dtype=numpy.float32)
+            else:
+                value = self.attribute_data.get_data(attribute_label, Timeline.app().current)[decimate].ravel()
 
             # Inform vector_renderable of attribute grid (if set) so shader knows whether to hide nodata values
             if self.attribute_data is not None:
@@ -552,9 +667,31 @@ class TerrainAndColorPlugin(VisualizationPlugin3D):
             else:
                 nodata_value = 1.0
 
+            # Skip hidden vectors before upload, rather than discarding them in the shader
+            visible = numpy.ones(direction.shape, dtype=bool)
+            if self._hide_no_data_vectors.value and nodata_value is not None:
+                visible &= numpy.round(numpy.ma.getdata(value)) != round(nodata_value)
+            if self._acc_filter.value and self.flow_acc_data is not None:
+                magnitude_data = numpy.ma.getdata(magnitude)
+                visible &= (magnitude_data >= self._acc_min.value) & (magnitude_data <= self._acc_max.value)
+
+            # Clobber the visible vectors into one big array
+            vector_data = numpy.zeros((int(visible.sum()), VectorGeometry.BUFFER_WIDTH), dtype=numpy.float32)
+            vector_data[:, 0:3] = positions[visible]
+            vector_data[:, 3] = numpy.ma.getdata(direction)[visible]
+            vector_data[:, 4] = tilt[visible]
+            vector_data[:, 5] = numpy.ma.getdata(magnitude)[visible]
+            vector_data[:, 6] = numpy.ma.getdata(value)[visible]
+
+            max_instances = positions.shape[0]
+            if self.vector_mesh is not None and self.vector_mesh.geometry.max_instances < max_instances:
+                self.scene.remove_object(self.vector_mesh)
+                self.vector_mesh.geometry.dispose()
+                self.vector_mesh = None
+
             if self.vector_mesh is None:
                 self.vector_mesh = Mesh(
-                    VectorGeometry(max_instances=width * height, data=vector_data),
+                    VectorGeometry(max_instances=max_instances, data=vector_data),
                     VectorShaderProgram()
                 )
                 self.scene.add_object(self.vector_mesh)
@@ -572,6 +709,15 @@ class TerrainAndColorPlugin(VisualizationPlugin3D):
             self.scene.remove_object(self.vector_mesh)
             self.vector_mesh = None
 
+    def _get_flow_stride(self, height, width):
+        """
+        Returns the stride used to decimate flow vectors: the user's stride, increased if needed to stay within the
+        flow vector budget.
+        """
+
+        budget_stride = math.ceil(math.sqrt(height * width / self.max_flow_vectors))
+        return max(int(self._flow_stride.value), budget_stride, 1)
+
     def has_legend(self):
         return self.attribute_data is not None
 
@@ -587,31 +733,28 @@ class TerrainAndColorPlugin(VisualizationPlugin3D):
             cell_y = int(round((point.x / res)))
 
             terrain_attr = self._elevation_attribute.selected
-            terrain_ref = self.terrain_data.get_data(terrain_attr)
 
             if self.attribute_data is not None:
-                attribute_ref = self.attribute_data.get_data(
-                    self._attribute.selected, Timeline.app().current
-                )
-                attr_height, attr_width = attribute_ref.shape
+                attr_height, attr_width = self.attribute_data.shape[-2:]
                 if 0 <= cell_x < attr_width and 0 <= cell_y < attr_height:
 
                     result = OrderedDict()
                     result['Point'] = "{}, {}".format(cell_x, cell_y)
-                    result['Value'] = attribute_ref[cell_y, cell_x]
-                    result['Height'] = terrain_ref[cell_y, cell_x]
+                    # Sample at the current time, which the mesh and flow vectors are built from
+                    current = Timeline.app().current
+                    result['Value'] = self.attribute_data.sample(self._attribute.selected, current, cell_y, cell_x)
+                    result['Height'] = self.terrain_data.sample(terrain_attr, current, cell_y, cell_x)
 
                     if self.flow_dir_data is not None:
-                        flow_dir_ref = self.flow_dir_data.get_data(self.flow_dir_data.variables[0])
-                        direction = flow_dir_ref[cell_y, cell_x]
+                        direction = self.flow_dir_data.sample(self.flow_dir_data.variables[0], current, cell_y, cell_x)
                         result['Flow Direction (input)'] = direction
                         degrees = 45.0 + 45.0 * direction
                         result['Flow Direction (degrees)'] = degrees if degrees < 360.0 else degrees - 360.0
 
                     if self.flow_acc_data is not None:
-                        result['Flow Accumulation'] = self.flow_acc_data.get_data(
-                            self.flow_acc_data.variables[0]
-                        )[cell_y, cell_x]
+                        result['Flow Accumulation'] = self.flow_acc_data.sample(
+                            self.flow_acc_data.variables[0], current, cell_y, cell_x
+                        )
 
                     self.selected_point = (cell_x, cell_y)
                     self._needs_boundaries = True
@@ -644,16 +787,20 @@ class TerrainAndColorPlugin(VisualizationPlugin3D):
                 nodata = var_stats.nodata_value
 
                 # Transform point coordinates to crs of raster
-                p = shapely.geometry.Point(*transform.xy(affine, point.x / res, point.y / res))
-                zones = []
-                for feat in self.boundary_data.get_features():
-                    if shapely.geometry.shape(feat['geometry']).contains(p):
-                        zones.append(feat)
-
-                # Retrieve zonal stats for this raster
-                result = zonal_stats(zones, raster, affine=affine, nodata=nodata, add_stats=self.zonal_stats)
-                for j, row in enumerate(result):
-                    row['Name'] = "{} (Zone {})".format(plugin.data_name, zones[j].get('id'))
+                x, y = transform.xy(affine, point.x / res, point.y / res)
+                zones = self.boundary_data.query_point(x, y)
+
+                if not zones:
+                    continue
+
+                # Retrieve zonal stats for this raster, computed for all zones from the cached zone raster
+                zone_raster = self._zonal_statistics.zone_raster(self.boundary_data, raster.shape, affine)
+                stats = zone_raster.statistics(raster, nodata)
+                for feat in zones:
+                    zone = zone_statistics(stats, zone_raster.zone_of(feat))
+                    row = {key: zone[key] for key in ('min', 'max', 'mean', 'count', 'median', 'range')}
+                    row['stdev'] = zone['std']
+                    row['Name'] = "{} (Zone {})".format(plugin.data_name, feat.get('id'))
                     results.append(row)
         return results
 
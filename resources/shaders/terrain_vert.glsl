@@ -16,6 +16,8 @@ uniform float maxValue;
 uniform vec4 minColor;
 uniform vec4 maxColor;
 uniform vec4 noDataColor;
+uniform bool useValueTexture;
+uniform sampler2D valueTexture;
 
 layout(location = 0) in vec3 position;
 layout(location = 1) in vec3 normal;
@@ -29,6 +31,8 @@ out float fragBrightness;
 out vec2 fragBoundaryTexCoord;
 out float fragValue;
 
+float vertexValue;
+
 void hsvToRGB(in vec4 colorIn, out vec4 colorOut) {
     float r, g, b;
     float h = colorIn.x;
@@ -82,7 +86,7 @@ void hsvToRGB(in vec4 colorIn, out vec4 colorOut) {
 }
 
 void interpolateColor(out vec4 colorOut) {
-	if (round(value) == round(noDataValue) || (isFiltered && (value < filterMin || value > filterMax))) {
+	if (round(vertexValue) == round(noDataValue) || (isFiltered && (vertexValue < filterMin || vertexValue > filterMax))) {
 		hsvToRGB(noDataColor, colorOut);
 		return;
 	}
@@ -90,22 +94,31 @@ void interpolateColor(out vec4 colorOut) {
         hsvToRGB(maxColor, colorOut);
         return;
     }
-    if (value <= minValue) {
+    if (vertexValue <= minValue) {
         hsvToRGB(minColor, colorOut);
         return;
     }
-    if (value >= maxValue) {
+    if (vertexValue >= maxValue) {
         hsvToRGB(maxColor, colorOut);
         return;
     }
 
-    float factor = (value - minValue) / (maxValue - minValue);
+    float factor = (vertexValue - minValue) / (maxValue - minValue);
     vec4 color = abs(minColor + (maxColor - minColor) * factor);
     color.x = round(color.x);
     hsvToRGB(color, colorOut);
 }
 
 void main() {
+    if (useValueTexture) {
+        // Values are stored one texel per vertex, in the same row-major order as the vertices
+        ivec2 size = textureSize(valueTexture, 0);
+        vertexValue = texelFetch(valueTexture, ivec2(gl_VertexID % size.x, gl_VertexID / size.x), 0).r;
+    }
+    else {
+        vertexValue = value;
+    }
+
     vec3 scale = vec3(1., 1., heightFactor);
 	vec4 eyePosition = modelViewMatrix * vec4(position * scale, 1.0);
 	//vec4 eyePosition = modelViewMatrix * vec4(position, 1.0);
@@ -113,7 +126,7 @@ void main() {
     fragPosition = eyePosition.xyz;
     fragNormal = normal / scale;
     fragBoundaryTexCoord = uv;
-	fragValue = value;
+	fragValue = vertexValue;
 
 	if (perVertexColor) {
 		interpolateColor(fragColor);
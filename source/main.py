@@ -1,3 +1,4 @@
+import multiprocessing
 import platform
 
 import matplotlib
@@ -7,5 +8,9 @@ if platform.uname().system == 'Windows':
 
 from vistas.ui.app import App
 
-app = App.get()
-app.MainLoop()
+if __name__ == '__main__':
+    # Feature triangulation spawns worker processes, which re-run this module; only the main process starts the app
+    multiprocessing.freeze_support()
+
+    app = App.get()
+    app.MainLoop()
@@ -0,0 +1,5 @@
+import os
+
+# PyOpenGL chooses its platform when OpenGL is first imported, so the headless backend is selected before any test
+# module is collected. Tests that need a context create one with HeadlessContext, or are skipped.
+os.environ.setdefault('PYOPENGL_PLATFORM', 'egl')
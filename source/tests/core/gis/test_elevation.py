@@ -0,0 +1,124 @@
+import mercantile
+import numpy
+import pytest
+
+from vistas.core.gis.elevation import ElevationService, meters_per_px, normals_from_heights
+from vistas.core.gis.tile_fetcher import TileFetcher
+from vistas.core.gis.tile_source import TILE_SIZE, TileSource
+from vistas.core.gis.tile_store import TileStore
+
+ZOOM = 2
+
+
+class ConstantTileSource(TileSource):
+    """ Tiles of constant heights, with tile (x, y) at 100 * (x + 2 * y - 2) for the zoom 2 tiles (1..2, 1..2) """
+
+    name = 'constant'
+    cache = False
+
+    def __init__(self, missing=()):
+        self.missing = set(missing)
+
+    def has_tile(self, z, x, y):
+        return 1 <= x <= 2 and 1 <= y <= 2 and (x, y) not in self.missing
+
+    def get_tile(self, z, x, y):
+        return numpy.full((TILE_SIZE, TILE_SIZE), 100 * (x + 2 * y - 2), dtype=numpy.float32)
+
+
+@pytest.fixture
+def service(tmp_path):
+    return ElevationService(TileStore(str(tmp_path / 'tiles.sqlite')), ConstantTileSource(), TileFetcher(1))
+
+
+def tile_lonlat(x, y):
+    """ The lon/lat of fractional zoom 2 tile coordinates which are multiples of 0.5 """
+
+    lon, lat = mercantile.ul(int(x * 2), int(y * 2), ZOOM + 1)
+    return numpy.array([lon]), numpy.array([lat])
+
+
+def test_lonlat_to_tile_coords():
+    x, y = ElevationService._lonlat_to_tile_coords(numpy.array([-180, 0, 180]), numpy.array([0, 0, 0]), ZOOM)
+    assert numpy.allclose(x, [0, 2, 4])
+    assert numpy.allclose(y, [2, 2, 2])
+
+    for tile in (mercantile.Tile(1, 2, ZOOM), mercantile.Tile(3, 0, ZOOM), mercantile.Tile(5, 7, ZOOM + 1)):
+        lon, lat = mercantile.ul(tile)
+        x, y = ElevationService._lonlat_to_tile_coords(lon, lat, tile.z)
+        assert numpy.isclose(x, tile.x) and numpy.isclose(y, tile.y)
+
+    # Latitudes beyond web mercator are clamped to the first and last rows of tiles
+    x, y = ElevationService._lonlat_to_tile_coords(numpy.array([0, 0]), numpy.array([90, -90]), ZOOM)
+    assert numpy.allclose(y, [0, 4], atol=1e-6)
+
+
+def test_sample_bilinear():
+    grid = numpy.array([[0, 10, 20], [30, 40, 50]], dtype=numpy.float32)
+
+    def sample(px, py):
+        return ElevationService._sample_bilinear(grid, numpy.array(px, dtype=float), numpy.array(py, dtype=float))
+
+    assert (sample([0, 1, 2, 2], [0, 0, 1, 0]) == [0, 10, 50, 20]).all()
+    assert numpy.allclose(sample([0.5, 1.5, 0.25], [0, 0.5, 1]), [5, 30, 32.5])
+
+    # Positions beyond the grid are clamped to its edges
+    assert numpy.allclose(sample([-1, 5, 5, 1.5], [-1, -1, 3, 7]), [0, 20, 50, 45])
+
+
+def test_get_mosaic(service):
+    service.source = ConstantTileSource({(2, 2)})
+    mosaic = service._get_mosaic(1, 1, 2, 2, ZOOM)
+
+    assert mosaic.shape == (2 * TILE_SIZE, 2 * TILE_SIZE)
+    assert (mosaic[:TILE_SIZE, :TILE_SIZE] == 100).all()
+    assert (mosaic[:TILE_SIZE, TILE_SIZE:] == 200).all()
+    assert (mosaic[TILE_SIZE:, :TILE_SIZE] == 300).all()
+    assert (mosaic[TILE_SIZE:, TILE_SIZE:] == 0).all()     # Missing tiles are left as zeros
+
+
+def test_sample_mosaic(service):
+    mosaic = service._get_mosaic(1, 1, 2, 2, ZOOM)
+
+    def sample(x, y):
+        return float(service._sample_mosaic(mosaic, 1, 1, ZOOM, *tile_lonlat(x, y))[0])
+
+    # Tile centers
+    assert numpy.isclose(sample(1.5, 1.5), 100)
+    assert numpy.isclose(sample(2.5, 2.5), 400)
+
+    # Where tiles meet, values are interpolated across the seam
+    assert numpy.isclose(sample(2, 1.5), 150)
+    assert numpy.isclose(sample(1.5, 2), 200)
+    assert numpy.isclose(sample(2, 2), 250)
+
+    # Where the mosaic ends, the edge of the mosaic is used
+    assert numpy.isclose(sample(1, 1), 100)
+    assert numpy.isclose(sample(3, 1.5), 200)
+    assert numpy.isclose(sample(3, 3), 400)
+    assert numpy.isclose(sample(0.5, 3.5), 300)
+
+
+def test_normals_from_heights():
+    normals = normals_from_heights(numpy.full((4, 5), 12.5), 30)
+    assert normals.shape == (4, 5, 3)
+    assert numpy.allclose(normals, [0, 0, 1])
+
+    # Heights rising by half a cell along the rows, then along the columns
+    rows, cols = numpy.mgrid[0:4, 0:5] * 30.0
+    assert numpy.allclose(normals_from_heights(rows / 2, 30), numpy.array([-0.5, 0, 1]) / numpy.sqrt(1.25))
+    assert numpy.allclose(normals_from_heights(cols / 2, 30), numpy.array([0, -0.5, 1]) / numpy.sqrt(1.25))
+
+    # Normals are unit length, and grids without a gradient are flat
+    assert numpy.allclose(numpy.linalg.norm(normals_from_heights(rows * cols / 1000, 30), axis=2), 1)
+    assert numpy.allclose(normals_from_heights(numpy.arange(5.0).reshape((1, 5)), 30), [0, 0, 1])
+
+
+def test_create_data_normals(service):
+    dem = service._get_mosaic(1, 1, 2, 2, ZOOM)
+    normals = ElevationService.create_data_normals(dem, ZOOM)
+
+    assert normals.shape == (*dem.shape, 3)
+    assert numpy.allclose(normals, normals_from_heights(dem, meters_per_px(ZOOM)))
+    assert numpy.allclose(normals[100, 100], [0, 0, 1])
+    assert normals[100, TILE_SIZE, 1] < 0     # The seam between tiles of 100 and 200 rises along the columns
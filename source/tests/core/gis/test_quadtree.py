@@ -0,0 +1,69 @@
+import mercantile
+import numpy
+
+from vistas.core.gis.quadtree import TileQuadtree
+
+BOUNDS = (-123.5, 44.0, -122.5, 45.0)
+
+
+def view_projection(scale, translate_x=0.0):
+    """ An orthographic view which maps the square [-scale, scale] onto the viewport """
+
+    matrix = numpy.identity(4) / scale
+    matrix[3] = (translate_x, 0, 0, 1)
+    return matrix
+
+
+def test_frame():
+    tree = TileQuadtree(BOUNDS, 10)
+    assert tree.offset(tree.ul) == (0, 0)
+    assert tree.span(tree.ul) == 255
+
+    parent = mercantile.parent(tree.ul)
+    assert tree.cellsize(parent) == 2
+    child = mercantile.Tile(tree.ul.x * 2 + 1, tree.ul.y * 2 + 1, 11)
+    assert tree.cellsize(child) == 0.5
+    assert tree.offset(child) == (127.5, 127.5)
+
+    assert len(tree.roots) <= TileQuadtree.max_roots
+    assert all(tree.intersects(root) for root in tree.roots)
+
+
+def test_select_requests_roots():
+    tree = TileQuadtree(BOUNDS, 10)
+    draw, requests = tree.select((0, 0, 1e6), view_projection(1e7), 500, lambda tile: False)
+    assert draw == []
+    assert set(requests) == set(tree.roots)
+
+
+def test_select_refines_near_camera():
+    tree = TileQuadtree(BOUNDS, 10, max_zoom=12)
+    vp = view_projection(1e7)
+
+    # Far away, the roots are enough
+    draw, requests = tree.select((0, 0, 1e7), vp, 500, lambda tile: True)
+    assert set(draw) == set(tree.roots)
+    assert requests == []
+
+    # Close to a tile, it is refined to the maximum zoom, and tiles further away are coarser
+    near = next(mercantile.tiles(*BOUNDS, [12]))
+    x, y = tree.offset(near)
+    camera = (x + 1, y + 1, 10)
+    draw, requests = tree.select(camera, vp, 500, lambda tile: True)
+    assert near in draw
+    assert min(tile.z for tile in draw) < 12
+    assert requests == []
+
+    # Until the children are loaded, the loaded parents are drawn and the children are requested coarsest first
+    loaded = set(tree.roots)
+    draw, requests = tree.select(camera, vp, 500, lambda tile: tile in loaded)
+    assert set(draw) <= loaded
+    assert requests
+    assert all(mercantile.parent(tile) in loaded for tile in requests)
+
+
+def test_select_culls_to_frustum():
+    tree = TileQuadtree(BOUNDS, 10)
+    draw, requests = tree.select((0, 0, 1e6), view_projection(1e7, translate_x=10), 500, lambda tile: True)
+    assert draw == []
+    assert requests == []
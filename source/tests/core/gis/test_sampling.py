@@ -0,0 +1,35 @@
+import numpy
+import pytest
+from affine import Affine
+from rasterio.io import MemoryFile
+
+from vistas.core.gis.sampling import bounding_window, read_cells
+
+
+def make_dataset(memfile):
+    data = numpy.arange(20, dtype=numpy.float32).reshape(4, 5)
+    data[2, 3] = -9999
+    dataset = memfile.open(
+        driver='GTiff', width=5, height=4, count=1, dtype='float32', nodata=-9999, transform=Affine(1, 0, 0, 0, -1, 4)
+    )
+    dataset.write(data, 1)
+    return dataset
+
+
+def test_bounding_window():
+    assert bounding_window(numpy.array([1, 3]), numpy.array([4, 2])) == (1, 2, 3, 3)
+    assert bounding_window(2, 3) == (2, 3, 1, 1)
+
+
+def test_read_cells():
+    with MemoryFile() as memfile:
+        with make_dataset(memfile) as dataset:
+            assert read_cells(dataset, 1, 1, 2) == 7
+
+            values = read_cells(dataset, 1, numpy.array([0, 3, 2]), numpy.array([4, 0, 3]))
+            assert values.shape == (3,)
+            assert list(values[:2]) == [4, 15]
+            assert values.mask[2]
+
+            with pytest.raises(IndexError):
+                read_cells(dataset, 1, 4, 0)
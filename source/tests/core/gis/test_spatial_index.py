@@ -0,0 +1,33 @@
+from shapely.geometry import box, mapping
+
+from vistas.core.gis.spatial_index import FeatureIndex
+
+
+def make_features():
+    return [
+        {'id': '0', 'geometry': mapping(box(0, 0, 10, 10))},
+        {'id': '1', 'geometry': mapping(box(10, 0, 20, 10))},
+        {'id': '2', 'geometry': None},
+        {'id': '3', 'geometry': mapping(box(5, 5, 15, 15))}
+    ]
+
+
+def test_query_point():
+    index = FeatureIndex(make_features())
+    assert len(index) == 3
+    assert [f['id'] for f in index.query_point(2, 2)] == ['0']
+    assert [f['id'] for f in index.query_point(7, 7)] == ['0', '3']
+    assert [f['id'] for f in index.query_point(12, 12)] == ['3']
+    assert index.query_point(50, 50) == []
+
+
+def test_query_bbox():
+    index = FeatureIndex(make_features())
+    assert [f['id'] for f in index.query_bbox(16, 1, 18, 2)] == ['1']
+    assert [f['id'] for f in index.query_bbox(-5, -5, 30, 30)] == ['0', '1', '3']
+
+
+def test_empty_index():
+    index = FeatureIndex([])
+    assert len(index) == 0
+    assert index.query_point(0, 0) == []
@@ -0,0 +1,67 @@
+import os
+import threading
+from functools import partial
+from http.server import HTTPServer, SimpleHTTPRequestHandler
+
+import pytest
+
+from vistas.core.gis.tile_fetcher import TileFetcher, TileFetchError
+
+
+class FlakyHandler(SimpleHTTPRequestHandler):
+    """ Serves files from a directory, failing the first request for each path """
+
+    failed_paths = set()
+
+    def do_GET(self):
+        if self.path not in self.failed_paths:
+            self.failed_paths.add(self.path)
+            self.send_error(503)
+        else:
+            super().do_GET()
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def tile_server(tmp_path):
+    for x in range(4):
+        (tmp_path / '1' / str(x)).mkdir(parents=True)
+        (tmp_path / '1' / str(x) / '0.png').write_bytes('tile {}'.format(x).encode())
+
+    FlakyHandler.failed_paths = set()
+    server = HTTPServer(('127.0.0.1', 0), partial(FlakyHandler, directory=str(tmp_path)))
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield 'http://127.0.0.1:{}/{{z}}/{{x}}/{{y}}.png'.format(server.server_address[1])
+    server.shutdown()
+    server.server_close()
+
+
+def test_fetch(tile_server):
+    fetcher = TileFetcher(max_concurrency=2, retries=2, backoff=0.01)
+    results = {}
+    tiles = [((1, x, 0), tile_server.format(z=1, x=x, y=0)) for x in range(5)]
+
+    failed = fetcher.fetch(tiles, results.__setitem__)
+
+    # Every tile fails once and is retried. The missing tile fails without stopping the others.
+    assert failed == [(1, 4, 0)]
+    assert results == {(1, x, 0): 'tile {}'.format(x).encode() for x in range(4)}
+
+
+def test_get_no_retries(tile_server):
+    fetcher = TileFetcher(retries=0)
+    with pytest.raises(TileFetchError):
+        fetcher.get(tile_server.format(z=1, x=0, y=0))
+
+
+def test_download(tile_server, tmp_path):
+    fetcher = TileFetcher(retries=1, backoff=0.01)
+    out = tmp_path / 'out'
+    tiles = [(tile_server.format(z=1, x=x, y=0), str(out / '1' / str(x) / '0.png')) for x in range(2)]
+
+    assert fetcher.download(tiles) == []
+    assert (out / '1' / '1' / '0.png').read_bytes() == b'tile 1'
+    assert not [name for name in os.listdir(str(out / '1' / '0')) if name.endswith('.tmp')]
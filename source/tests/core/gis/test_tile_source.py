@@ -0,0 +1,52 @@
+import mercantile
+import numpy
+import rasterio
+from PIL import Image
+from rasterio.transform import from_bounds
+
+from vistas.core.gis.tile_source import RasterTileSource, XYZTileSource, decode_terrarium
+
+
+def encode_terrarium(heights):
+    value = heights + 32768.0
+    red = numpy.floor(value / 256)
+    green = numpy.floor(value - red * 256)
+    blue = numpy.floor((value - red * 256 - green) * 256)
+    return Image.fromarray(numpy.dstack((red, green, blue)).astype(numpy.uint8), 'RGB')
+
+
+def test_decode_terrarium():
+    heights = numpy.array([[-100.5, 0], [1000.25, 8848]], dtype=numpy.float32)
+    assert numpy.allclose(decode_terrarium(encode_terrarium(heights)), heights)
+
+
+def test_xyz_tile_source(tmp_path):
+    heights = numpy.full((256, 256), 1234.5, dtype=numpy.float32)
+    (tmp_path / '3' / '1').mkdir(parents=True)
+    encode_terrarium(heights).save(str(tmp_path / '3' / '1' / '2.png'))
+
+    source = XYZTileSource(str(tmp_path))
+    assert source.has_tile(3, 1, 2)
+    assert not source.has_tile(3, 2, 2)
+    assert numpy.allclose(source.get_tile(3, 1, 2), heights)
+
+
+def test_raster_tile_source(tmp_path):
+    # A web mercator raster covering exactly one zoom 4 tile
+    tile = mercantile.Tile(3, 5, 4)
+    path = str(tmp_path / 'dem.tif')
+    with rasterio.open(
+        path, 'w', driver='GTiff', width=64, height=64, count=1, dtype='float32', crs='EPSG:3857',
+        transform=from_bounds(*mercantile.xy_bounds(tile), 64, 64), nodata=-9999
+    ) as dataset:
+        dataset.write(numpy.full((1, 64, 64), 500, dtype=numpy.float32))
+
+    source = RasterTileSource(path)
+    assert source.has_tile(tile.z, tile.x, tile.y)
+    assert not source.has_tile(4, 10, 10)
+
+    grid = source.get_tile(tile.z, tile.x, tile.y)
+    assert grid.shape == (256, 256)
+    assert numpy.allclose(grid[8:-8, 8:-8], 500)
+    assert (source.get_tile(4, 10, 10) == 0).all()
+    source.close()
@@ -0,0 +1,64 @@
+import numpy
+
+from vistas.core.gis.tile_store import TileStore
+
+TILE_BYTES = 16 * 16 * 4
+
+
+def make_tile(value):
+    return numpy.full((16, 16), value, dtype=numpy.float32)
+
+
+def test_put_get(tmp_path):
+    store = TileStore(str(tmp_path / 'tiles.sqlite'))
+    assert store.get('terrarium', 1, 0, 0) is None
+    assert store.stats.misses == 1
+
+    store.put('terrarium', 1, 0, 0, make_tile(5))
+    assert store.contains('terrarium', 1, 0, 0)
+    assert not store.contains('normal', 1, 0, 0)
+    assert (store.get('terrarium', 1, 0, 0) == 5).all()
+    assert store.stats.memory_hits == 1
+    assert store.size == TILE_BYTES
+
+    # Replacing a tile doesn't change the size
+    store.put('terrarium', 1, 0, 0, make_tile(6))
+    assert store.size == TILE_BYTES
+    store.close()
+
+    # Tiles persist, and are read from disk by a new store
+    store = TileStore(str(tmp_path / 'tiles.sqlite'))
+    assert len(store) == 1
+    tile = store.get('terrarium', 1, 0, 0)
+    assert tile.shape == (16, 16)
+    assert (tile == 6).all()
+    assert store.stats.disk_hits == 1
+
+
+def test_eviction(tmp_path):
+    store = TileStore(str(tmp_path / 'tiles.sqlite'), quota=TILE_BYTES * 4, memory_tiles=2)
+    for i in range(4):
+        store.put('terrarium', 2, i, 0, make_tile(i))
+
+    store.get('terrarium', 2, 0, 0)  # Tile 0 is now more recently used than tile 1
+    store.put('terrarium', 2, 4, 0, make_tile(4))
+
+    assert store.size <= store.quota
+    assert store.contains('terrarium', 2, 0, 0)
+    assert not store.contains('terrarium', 2, 1, 0)
+    assert store.contains('terrarium', 2, 4, 0)
+
+    store.quota = 0
+    assert len(store) == 0
+    assert store.size == 0
+
+
+def test_put_over_quota(tmp_path):
+    store = TileStore(str(tmp_path / 'tiles.sqlite'), quota=TILE_BYTES // 2)
+    store.put('terrarium', 2, 0, 0, make_tile(0))
+    tile = store.put('terrarium', 2, 1, 0, make_tile(1))
+
+    # The tile just added is kept, even though it alone is over quota
+    assert (tile == 1).all()
+    assert not store.contains('terrarium', 2, 0, 0)
+    assert (store.get('terrarium', 2, 1, 0) == 1).all()
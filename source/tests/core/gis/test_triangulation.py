@@ -0,0 +1,121 @@
+import multiprocessing
+
+import numpy
+import pyproj
+import pytest
+
+from vistas.core.gis.triangulation import TriangulationCache, polygon_rings, project_rings, simplify_ring, \
+    triangulate_features
+
+
+def square(x, y, size=1.0):
+    return [(x, y), (x + size, y), (x + size, y + size), (x, y + size), (x, y)]
+
+
+def features(count):
+    for i in range(count):
+        if i % 3 == 0:
+            geometry = {'type': 'MultiPolygon', 'coordinates': [[square(i, 0)], [square(i, 5, 2)]]}
+        else:
+            geometry = {'type': 'Polygon', 'coordinates': [square(i, 0)]}
+        yield {'geometry': geometry}
+
+
+def test_polygon_rings():
+    rings = polygon_rings({'type': 'Polygon', 'coordinates': [square(0, 0), square(0.25, 0.25, 0.5)]})
+    assert len(rings) == 1
+    assert rings[0].shape == (4, 2)
+
+    with pytest.raises(ValueError):
+        polygon_rings({'type': 'LineString', 'coordinates': [(0, 0), (1, 1)]})
+
+
+def test_project_rings():
+    utm = pyproj.Proj('+proj=utm +zone=10 +datum=WGS84')
+    mercator = pyproj.Proj('+proj=merc +datum=WGS84')
+    transformer = pyproj.Transformer.from_proj(utm, mercator, always_xy=True)
+
+    rings = [numpy.array([[500000.0, 5000000.0], [500100.0, 5000000.0]]), numpy.array([[501000.0, 5001000.0]])]
+    projected = project_rings(rings, transformer)
+    assert [len(r) for r in projected] == [2, 1]
+    for ring, result in zip(rings, projected):
+        for (x, y), (px, py) in zip(ring, result):
+            assert numpy.allclose(transformer.transform(x, y), (px, py))
+
+
+def test_triangulate_features():
+    triangles, counts = triangulate_features(features(10))
+    assert counts.tolist() == [12 if i % 3 == 0 else 6 for i in range(10)]
+    assert triangles.shape == (counts.sum(), 2)
+
+    # Triangles of each feature lie within the feature
+    start = 0
+    for i, count in enumerate(counts):
+        assert triangles[start:start + 6, 0].min() == i
+        start += count
+
+
+def test_simplify_ring():
+    # A square with a slightly bumpy edge
+    ring = numpy.array([(0, 0), (0.5, 0.01), (1, 0), (1, 1), (0, 1)], dtype=numpy.float64)
+
+    assert numpy.array_equal(simplify_ring(ring, 0)[0], ring)
+    simplified = simplify_ring(ring, 0.1)
+    assert len(simplified) == 1
+    assert len(simplified[0]) == 4
+
+
+def test_triangulate_simplified_features():
+    circle = [(numpy.cos(t), numpy.sin(t)) for t in numpy.linspace(0, 2 * numpy.pi, 257)]
+    feature = {'geometry': {'type': 'Polygon', 'coordinates': [circle]}}
+
+    _, full = triangulate_features([feature])
+    triangles, simplified = triangulate_features([feature], tolerance=0.05)
+    assert 0 < simplified[0] < full[0]
+    assert triangles.shape == (simplified[0], 2)
+
+
+def test_triangulate_features_in_chunks():
+    # Processes are spawned, as on Windows and macOS, so the workers must not rely on state inherited by forking
+    expected = triangulate_features(features(25))
+    triangles, counts = triangulate_features(
+        features(25), chunk_size=4, processes=2, mp_context=multiprocessing.get_context('spawn')
+    )
+    assert numpy.array_equal(counts, expected[1])
+    assert numpy.array_equal(triangles, expected[0])
+
+
+def test_triangulate_features_cancelled():
+    class Task:
+        should_stop = True
+
+        def inc_progress(self, increment=1):
+            pass
+
+    assert triangulate_features(features(25), task=Task(), chunk_size=4) is None
+
+
+def test_triangulation_cache(tmp_path):
+    data = tmp_path / 'features.shp'
+    data.write_bytes(b'features')
+    cache = TriangulationCache(str(tmp_path / 'cache'))
+
+    key = cache.key(str(data), '+proj=utm +zone=10')
+    assert cache.get(key) is None
+    assert cache.key(str(data), '+proj=utm +zone=11') != key
+    assert cache.key(str(data), '+proj=utm +zone=10', params='other') != key
+
+    vertices = numpy.arange(12, dtype=numpy.float32).reshape((4, 3))
+    cache.put(key, vertices, numpy.array([6, 8]), numpy.array([3, 1]))
+    cached = cache.get(key)
+    assert isinstance(cached.vertices, numpy.memmap)
+    assert numpy.array_equal(cached.vertices, vertices)
+    assert cached.counts.tolist() == [3, 1]
+
+    # Loaded arrays are copy-on-write
+    cached.vertices[:] = 0
+    assert numpy.array_equal(cache.get(key).vertices, vertices)
+
+    # Changing the file changes the key
+    data.write_bytes(b'other features')
+    assert cache.key(str(data), '+proj=utm +zone=10') != key
@@ -0,0 +1,176 @@
+import datetime
+
+import numpy
+from affine import Affine
+from shapely.geometry import box, mapping
+
+from vistas.core.gis.zonal import ZonalStatistics, ZoneRaster, zone_statistics
+from vistas.core.plugins.data import FeatureDataPlugin, RasterDataPlugin, TemporalInfo
+from vistas.core.stats import VariableStats
+from vistas.core.task import Task
+
+# A 4x4 grid with 1 unit cells, origin in the upper left at (0, 4)
+AFFINE = Affine(1, 0, 0, 0, -1, 4)
+
+
+DATES = [datetime.datetime(2000 + i, 1, 1) for i in range(3)]
+
+
+class FakeFeatureData(FeatureDataPlugin):
+    def __init__(self, feature_list):
+        super().__init__()
+        self.feature_list = feature_list
+
+    def get_features(self, date=None):
+        return iter(self.feature_list)
+
+
+class FakeRasterData(RasterDataPlugin):
+    """ A 4x4 temporal raster, which is the grid 0..15 plus 100 times the index of the timestamp """
+
+    def __init__(self, task=None, stop_after=None):
+        super().__init__()
+        self.task = task
+        self.stop_after = stop_after
+        self.reads = 0
+
+    @property
+    def affine(self):
+        return AFFINE
+
+    @property
+    def time_info(self):
+        time_info = TemporalInfo()
+        time_info.timestamps = DATES
+        return time_info
+
+    def variable_stats(self, variable):
+        return VariableStats(nodata_value=-9999)
+
+    def get_data(self, variable, date=None):
+        self.reads += 1
+        if self.reads == self.stop_after:
+            self.task.status = Task.SHOULD_STOP
+
+        data = numpy.arange(16, dtype=numpy.float32).reshape(4, 4) + 100 * DATES.index(date)
+        data[3, 0] = -9999
+        return data
+
+
+def make_feature_list():
+    return [
+        {'id': '0', 'geometry': mapping(box(0, 0, 2, 4))},     # Left half
+        {'id': '1', 'geometry': mapping(box(2, 2, 4, 4))},     # Upper right quarter
+        {'id': '2', 'geometry': mapping(box(10, 10, 11, 11))}  # Outside the grid
+    ]
+
+
+def make_zone_raster():
+    return ZoneRaster(make_feature_list(), (4, 4), AFFINE)
+
+
+def test_zone_raster():
+    zone_raster = make_zone_raster()
+    assert zone_raster.num_zones == 3
+    assert (zone_raster.zones[:, :2] == 0).all()
+    assert (zone_raster.zones[:2, 2:] == 1).all()
+    assert (zone_raster.zones[2:, 2:] == -1).all()
+    assert zone_raster.zone_of(zone_raster.features[1]) == 1
+
+
+def test_statistics():
+    zone_raster = make_zone_raster()
+    data = numpy.arange(16, dtype=numpy.float32).reshape(4, 4)
+    data[3, 0] = -9999
+    stats = zone_raster.statistics(data, nodata=-9999)
+
+    left = numpy.array([0, 1, 4, 5, 8, 9, 13])
+    right = numpy.array([2, 3, 6, 7])
+
+    zone = zone_statistics(stats, 0)
+    assert zone['count'] == left.size
+    assert zone['min'] == left.min()
+    assert zone['max'] == left.max()
+    assert numpy.isclose(zone['mean'], left.mean())
+    assert numpy.isclose(zone['std'], left.std())
+    assert zone['median'] == numpy.median(left)
+    assert zone['range'] == left.max() - left.min()
+
+    zone = zone_statistics(stats, 1)
+    assert zone['count'] == right.size
+    assert zone['sum'] == right.sum()
+    assert zone['median'] == numpy.median(right)
+
+    zone = zone_statistics(stats, 2)
+    assert zone['count'] == 0
+    assert zone['mean'] is None
+
+
+def test_statistics_masked():
+    zone_raster = make_zone_raster()
+    data = numpy.ma.array(numpy.ones((4, 4)), mask=numpy.zeros((4, 4), dtype=bool))
+    data.mask[:, 0] = True
+    stats = zone_raster.statistics(data)
+    assert stats['count'][0] == 4
+    assert stats['count'][1] == 4
+
+
+def test_statistics_nested_zones():
+    affine = Affine(1, 0, 0, 0, -1, 10)
+    feature_list = [
+        {'id': 'outer', 'geometry': mapping(box(0, 0, 10, 10))},
+        {'id': 'inner', 'geometry': mapping(box(0, 5, 5, 10))},
+        {'id': 'neighbor', 'geometry': mapping(box(10, 0, 12, 10))}
+    ]
+    zone_raster = ZoneRaster(feature_list, (10, 10), affine)
+    assert len(zone_raster.layers) == 2
+
+    stats = zone_raster.statistics(numpy.ones((10, 10)))
+    assert stats['count'][0] == 100
+    assert stats['count'][1] == 25
+    assert stats['count'][2] == 0
+
+
+def test_zonal_statistics():
+    feature_data = FakeFeatureData(make_feature_list())
+    zonal_statistics = ZonalStatistics()
+    zone_raster, stats = zonal_statistics.statistics(feature_data, FakeRasterData(), 'value', DATES[1])
+
+    assert zone_raster is zonal_statistics.zone_raster(feature_data, (4, 4), AFFINE)
+    assert list(stats['count']) == [7, 4, 0]
+    assert stats['min'][0] == 100
+    assert stats['max'][1] == 107
+
+    # Features returned by queries belong to the cached zone raster
+    feature = feature_data.query_point(3, 3)[0]
+    assert zone_raster.zone_of(feature) == 1
+
+
+def test_time_series():
+    feature_data = FakeFeatureData(make_feature_list())
+    left = numpy.array([0, 1, 4, 5, 8, 9, 13])
+    right = numpy.array([2, 3, 6, 7])
+
+    table = ZonalStatistics().time_series(feature_data, FakeRasterData(), 'value')
+    assert table.shape == (3, 3)
+    assert numpy.allclose(table[0], left.mean() + numpy.array([0, 100, 200]))
+    assert numpy.allclose(table[1], right.mean() + numpy.array([0, 100, 200]))
+    assert numpy.isnan(table[2]).all()
+
+    table = ZonalStatistics().time_series(feature_data, FakeRasterData(), 'value', 'max', dates=DATES[::-1])
+    assert list(table[1]) == [207, 107, 7]
+
+
+def test_time_series_stop():
+    task = Task('Zonal statistics')
+    try:
+        raster_data = FakeRasterData(task, stop_after=1)
+        table = ZonalStatistics().time_series(FakeFeatureData(make_feature_list()), raster_data, 'value', task=task)
+
+        assert raster_data.reads == 1
+        assert task.progress == 1
+        assert table.shape == (3, 3)
+        assert not numpy.isnan(table[:2, 0]).any()
+        assert numpy.isnan(table[:, 1:]).all()
+    finally:
+        Task.tasks.remove(task)
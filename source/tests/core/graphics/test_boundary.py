@@ -0,0 +1,42 @@
+import numpy
+
+from vistas.core.graphics.boundary import boundary_texture_shape, draw_selection, selection_box
+
+
+def test_boundary_texture_shape():
+    assert boundary_texture_shape((10, 20), 4, 2048) == (40, 80)
+    assert boundary_texture_shape((5, 7), 4, 2048) == (20, 28)
+
+    # Large grids get fewer texels per cell, and are capped at the maximum size
+    assert boundary_texture_shape((3000, 1000), 4, 2048) == (2048, 1000)
+    assert boundary_texture_shape((1001, 999), 4, 2048) == (2004, 2000)
+
+
+def test_selection_box():
+    assert selection_box((-1, -1), (10, 20), (40, 80)) is None
+
+    # Grid row 2 is texture rows 26-30, counted from the bottom; columns are widened to multiples of 4
+    assert selection_box((5, 2), (10, 20), (40, 80)) == (16, 26, 8, 4)
+
+    # Boxes stay inside the texture
+    x, y, w, h = selection_box((19, 9), (10, 20), (40, 80))
+    assert x >= 0 and y >= 0 and x + w <= 80 and y + h <= 40
+
+
+def test_draw_selection():
+    layer = numpy.full((40, 80), 255, dtype=numpy.uint8)
+    layer[:, 18] = 0
+    image = numpy.full((40, 80, 3), 255, dtype=numpy.uint8)
+    image[:, :, 0] = layer
+
+    old_rect, new_rect = (16, 26, 8, 4), (40, 10, 8, 4)
+    assert draw_selection(image, layer, None, old_rect) == [old_rect]
+    assert (image[26:30, 16:24, 0] == 0).all()
+
+    assert draw_selection(image, layer, old_rect, new_rect) == [old_rect, new_rect]
+    assert (image[:, :, 0][:, :40] == layer[:, :40]).all()
+    assert (image[10:14, 40:48, 0] == 0).all()
+
+    # Without a boundary layer, the old box is cleared
+    draw_selection(image, None, new_rect, None)
+    assert (image[10:14, 40:48, 0] == 255).all()
@@ -0,0 +1,27 @@
+import OpenGL.GL  # noqa: F401
+import pytest
+
+from vistas.core.graphics.context import use_headless
+
+
+def test_use_headless():
+    with pytest.raises(ValueError):
+        use_headless('glx')
+
+
+def test_use_headless_after_import(monkeypatch):
+    monkeypatch.setenv('PYOPENGL_PLATFORM', 'glx')
+
+    with pytest.raises(RuntimeError):
+        use_headless('egl')
+
+
+def test_default_backend(monkeypatch):
+    import vistas.core.graphics.context as context
+
+    monkeypatch.delenv('PYOPENGL_PLATFORM', raising=False)
+    monkeypatch.setattr(context, 'use_headless', lambda backend: None)
+    monkeypatch.setattr(context.HeadlessContext, '_create_egl', lambda self: None)
+    monkeypatch.setattr(context.HeadlessContext, 'make_current', lambda self: None)
+
+    assert context.HeadlessContext().backend == 'egl'
@@ -0,0 +1,75 @@
+import numpy
+import pytest
+from OpenGL.GL import GL_ARRAY_BUFFER, GLfloat, glBindBuffer, glGetBufferSubData, sizeof
+
+from vistas.core.graphics.context import HeadlessContext
+from vistas.core.graphics.geometry import Geometry, UploadStats
+from vistas.core.graphics.terrain.geometry import TerrainColorGeometry
+
+
+@pytest.fixture(scope='module')
+def context():
+    try:
+        context = HeadlessContext()
+    except Exception as e:
+        pytest.skip('No headless OpenGL context: {}'.format(e))
+
+    yield context
+    context.dispose()
+
+
+@pytest.fixture
+def stats(monkeypatch):
+    stats = UploadStats()
+    monkeypatch.setattr(UploadStats, '_app_stats', stats)
+    return stats
+
+
+def buffer_data(buffer, count):
+    glBindBuffer(GL_ARRAY_BUFFER, buffer)
+    data = glGetBufferSubData(GL_ARRAY_BUFFER, 0, count * sizeof(GLfloat))
+    glBindBuffer(GL_ARRAY_BUFFER, 0)
+    return numpy.frombuffer(data, dtype=numpy.float32)
+
+
+def test_upload(context, stats):
+    geometry = Geometry(num_vertices=10, has_normal_array=True)
+
+    # Setting an attribute twice before drawing uploads it once
+    geometry.vertices = numpy.zeros(30)
+    geometry.vertices = numpy.ones(30)
+    assert geometry._dirty == {'vertices': (0, 30)}
+
+    geometry.upload()
+    assert (stats.frame_uploads, stats.frame_bytes) == (1, 30 * 4)
+    assert not geometry._dirty
+    assert (buffer_data(geometry.vertex_buffer, 30) == 1).all()
+
+    # In-place changes are merged into one range, from the first changed element to the last
+    geometry.vertices[3:6] = 2
+    geometry.mark_dirty('vertices', 3, 6)
+    geometry.vertices[12:15] = 3
+    geometry.mark_dirty('vertices', 12, 15)
+    geometry.mark_dirty('vertices', 4, 5)
+    assert geometry._dirty == {'vertices': (3, 15)}
+
+    stats.end_frame()
+    geometry.upload()
+    assert (stats.frame_uploads, stats.frame_bytes) == (1, 12 * 4)
+    assert numpy.array_equal(buffer_data(geometry.vertex_buffer, 30), geometry.vertices)
+
+    # Nothing is uploaded until something changes
+    stats.end_frame()
+    geometry.upload()
+    assert stats.frame_uploads == 0
+
+    geometry.dispose()
+
+
+def test_terrain_color_nbytes(context):
+    geometry = TerrainColorGeometry(4, 3, 1.0, heights=numpy.zeros((3, 4)))
+    geometry.values = numpy.ones((3, 4))
+
+    # The value buffer and the client-side copy of the values, 12 floats each
+    assert geometry.nbytes == Geometry.nbytes.fget(geometry) + 2 * 12 * 4
+    geometry.dispose()
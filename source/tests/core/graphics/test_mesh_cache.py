@@ -0,0 +1,44 @@
+from vistas.core.graphics.mesh_cache import MeshSetCache
+
+
+def test_mesh_set_cache():
+    disposed = []
+    cache = MeshSetCache(budget=100)
+
+    cache.put('a', 9, 'a9', 40, disposed.append)
+    cache.put('a', 10, 'a10', 40, disposed.append)
+    assert cache.size == 80
+    assert len(cache) == 2
+
+    # Taking a mesh set transfers ownership without disposing of it
+    assert cache.pop('a', 9) == 'a9'
+    assert cache.pop('a', 9) is None
+    assert cache.size == 40
+    assert disposed == []
+
+    # Least recently added sets are evicted to stay within the budget
+    cache.put('a', 9, 'a9', 40, disposed.append)
+    cache.put('b', 9, 'b9', 40, disposed.append)
+    assert disposed == ['a10']
+    assert cache.size == 80
+
+    # A set larger than the budget is disposed of right away
+    cache.put('b', 10, 'b10', 200, disposed.append)
+    assert 'b10' in disposed
+    assert ('b', 10) not in cache
+
+
+def test_mesh_set_cache_discard():
+    disposed = []
+    cache = MeshSetCache(budget=100)
+    cache.put('a', 9, 'a9', 10, disposed.append)
+    cache.put('a', 10, 'a10', 10, disposed.append)
+    cache.put('b', 9, 'b9', 10, disposed.append)
+
+    cache.discard('a')
+    assert sorted(disposed) == ['a10', 'a9']
+    assert len(cache) == 1
+
+    cache.budget = 5
+    assert disposed[-1] == 'b9'
+    assert cache.size == 0
@@ -0,0 +1,28 @@
+import numpy
+
+from vistas.core.graphics.plane import plane_indices, plane_vertices
+
+
+def test_plane_indices():
+    width, height = 4, 3
+    expected = []
+    for j in range(height - 1):
+        for i in range(width - 1):
+            a = i + width * j
+            b = i + width * (j + 1)
+            c = (i + 1) + width * (j + 1)
+            d = (i + 1) + width * j
+            expected += [a, b, d, b, c, d]
+
+    indices = plane_indices(width, height)
+    assert indices.dtype == numpy.uint32
+    assert indices.tolist() == expected
+    assert not indices.flags.writeable
+    assert plane_indices(width, height) is indices
+    assert plane_indices(1, 5).size == 0
+
+
+def test_plane_vertices():
+    vertices = plane_vertices(3, 2, 2.0)
+    assert vertices.shape == (2, 3, 3)
+    assert vertices[1, 2].tolist() == [2.0, 4.0, 0.0]
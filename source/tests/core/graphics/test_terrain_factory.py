@@ -0,0 +1,44 @@
+import numpy
+
+from vistas.core.graphics.terrain.factory import stitch_tile_seams
+
+TILE = 3
+
+
+def make_mosaic(values):
+    """ A mosaic of constant 3x3 tiles """
+
+    return numpy.kron(numpy.array(values, dtype=numpy.float32), numpy.ones((TILE, TILE), dtype=numpy.float32))
+
+
+def test_stitch_tile_seams():
+    mosaic = stitch_tile_seams(make_mosaic([[1, 2], [3, 4]]), tile_size=TILE)
+
+    # The first column and row of each tile are taken from the tile before it
+    assert (mosaic[:TILE, TILE] == 1).all()
+    assert (mosaic[TILE, :TILE] == 1).all()
+    assert (mosaic[TILE + 1:, TILE] == 3).all()
+    assert (mosaic[TILE, TILE + 1:] == 2).all()
+    assert mosaic[TILE, TILE] == 1
+    assert (mosaic[TILE + 1:, TILE + 1:] == 4).all()
+
+
+def test_stitch_tile_seams_missing_tiles():
+    # The upper left tile is missing, and is zeros in the mosaic
+    available = numpy.array([[False, True], [True, True]])
+    mosaic = stitch_tile_seams(make_mosaic([[0, 2], [3, 4]]), available, tile_size=TILE)
+
+    # Tiles after the missing tile keep their own edges
+    assert (mosaic[:TILE, TILE] == 2).all()
+    assert (mosaic[TILE, :TILE] == 3).all()
+
+    # Other seams are stitched
+    assert (mosaic[TILE + 1:, TILE] == 3).all()
+    assert (mosaic[TILE, TILE + 1:] == 2).all()
+    assert mosaic[TILE, TILE] == 2      # From the first row of the tile above
+    assert (mosaic != 0).sum() == 3 * TILE * TILE
+
+    # With every tile available, the result is the same as without a mask
+    values = numpy.arange(6).reshape((2, 3)) + 1
+    assert (stitch_tile_seams(make_mosaic(values), numpy.ones((2, 3)), tile_size=TILE) ==
+            stitch_tile_seams(make_mosaic(values), tile_size=TILE)).all()
@@ -41,3 +41,26 @@ def test_texture_with_image(m1, m2, m3, m4, generic_app):
             assert m.call_args[0][3:5] == (10, 10)
 
     generic_app(test_callback)
+
+
+@patch('{}.glGenTextures'.format(texture.__name__))
+@patch('{}.glBindTexture'.format(texture.__name__))
+@patch('{}.glTexParameteri'.format(texture.__name__))
+@patch('{}.glDeleteTextures'.format(texture.__name__))
+@patch('{}.glTexImage2D'.format(texture.__name__))
+def test_texture_update(m1, m2, m3, m4, m5, generic_app):
+    def test_callback():
+        data = numpy.zeros((10, 10), dtype=numpy.float32)
+        t = texture.Texture(
+            data, 10, 10, src_format=texture.GL_R32F, gl_format=texture.GL_RED, data_type=texture.GL_FLOAT
+        )
+
+        with patch('{}.glTexSubImage2D'.format(texture.__name__)) as m:
+            rows = numpy.ones((2, 10), dtype=numpy.float32)
+            t.update(rows, 0, 4, 10, 2)
+            assert m.called
+            assert m.call_args[0][2:6] == (0, 4, 10, 2)
+            assert m.call_args[0][-2] == texture.GL_FLOAT
+            assert m.call_args[0][-1] is rows
+
+    generic_app(test_callback)
@@ -0,0 +1,19 @@
+from vistas.core.graphics.geometry import UploadStats
+
+
+def test_upload_stats():
+    stats = UploadStats()
+    stats.add(100)
+    stats.add(28)
+    assert stats.frame_bytes == 128
+
+    stats.end_frame()
+    assert stats.last_frame_bytes == 128
+    assert stats.last_frame_uploads == 2
+    assert stats.frame_bytes == 0
+
+    stats.add(64)
+    stats.end_frame()
+    assert stats.last_frame_bytes == 64
+    assert stats.total_bytes == 192
+    assert stats.frames == 2
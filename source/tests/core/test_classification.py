@@ -0,0 +1,17 @@
+from numpy import array_equal
+
+from vistas.core.classification import RangeClassifier, ValueClassifier
+
+
+def test_range_classifier():
+    classifier = RangeClassifier([(10, 20), (0, 10), (30, 40)])
+
+    assert array_equal(classifier.classify([5, 10, 15, 25, 40, -1, 50]), [1, 1, 0, -1, 2, -1, -1])
+    assert array_equal(classifier.classify([None, 35.0]), [-1, 2])
+
+
+def test_value_classifier():
+    classifier = ValueClassifier([3, 1, 2, 1], classes=[4, 5, 6, 7])
+
+    assert array_equal(classifier.classify([1, 2, 3, 4, None]), [5, 6, 4, -1, -1])
+    assert array_equal(ValueClassifier([]).classify([1, 2]), [-1, -1])
@@ -0,0 +1,32 @@
+import numpy
+
+from vistas.core.histogram import Histogram, compute_histogram_counts
+
+
+def test_compute_histogram_counts():
+    data = numpy.array([[0, 1, 2], [3, -9999, 3]], dtype=numpy.float32)
+    counts = compute_histogram_counts(data, 0, 4, -9999, bins=4)
+    assert counts == [1, 1, 1, 2]
+
+
+def test_rebin_counts():
+    data = numpy.random.RandomState(0).uniform(0, 100, 10000)
+    counts = compute_histogram_counts(data, 0, 100)
+    histogram = Histogram(counts=counts, min_value=0, max_value=100)
+
+    for bins in (1, 8, 64, 256):
+        expected = numpy.histogram(data, bins, range=(0, 100))[0]
+        assert (histogram.generate_histogram(bins) == expected).all()
+
+    # Rebinning to a resolution that doesn't divide evenly keeps all counts
+    assert numpy.isclose(histogram.generate_histogram(300).sum(), data.size)
+
+
+def test_rebin_counts_to_more_bins():
+    histogram = Histogram(counts=numpy.full(256, 10), min_value=0, max_value=1)
+    bins = histogram.generate_histogram(400)
+
+    assert bins.size == 400
+    assert (bins > 0).all()
+    assert numpy.isclose(bins, 6.4).all()
+    assert numpy.isclose(bins.sum(), 2560)
@@ -0,0 +1,22 @@
+from numpy import isclose, nan
+
+from vistas.core.color import RGBColor
+from vistas.core.legend import CategoricalLegend, StretchedLegend
+
+
+def test_stretched_get_colors():
+    legend = StretchedLegend(0, 100, RGBColor(1, 0, 0), RGBColor(0, 0, 1))
+    colors = legend.get_colors([0, 100, 50, -10, 110, nan], steps=101)
+
+    assert colors.shape == (6, 3)
+    for color, value in zip(colors, (0, 100, 50, -10, 110)):
+        assert isclose(color, legend.get_color(value).rgb.rgb_list, atol=1e-6).all()
+    assert isclose(colors[5], (.5, .5, .5)).all()
+
+
+def test_categorical_get_colors():
+    legend = CategoricalLegend([(RGBColor(1, 0, 0), 'a'), (RGBColor(0, 1, 0), 'b'), (RGBColor(0, 0, 1), 'a')])
+    colors = legend.get_colors(['b', 'a', 'c', 'b'])
+
+    assert isclose(colors, [(0, 1, 0), (1, 0, 0), (.5, .5, .5), (0, 1, 0)]).all()
+    assert legend.get_colors([]).shape == (0, 3)
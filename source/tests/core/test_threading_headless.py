@@ -0,0 +1,28 @@
+import threading
+
+from vistas.core.threading import Thread
+
+
+def test_sync_with_main_headless():
+    calls = []
+
+    def sync_fn(i):
+        calls.append((i, threading.current_thread()))
+
+    def run():
+        for i in range(3):
+            worker.sync_with_main(sync_fn, (i,), block=True)
+
+    # Without the UI, synced functions are queued, and the worker isn't blocked
+    worker = Thread(target=run)
+    worker.start()
+    worker.join(5)
+    assert not worker.is_alive()
+    assert not calls
+
+    # They're run in order by the thread which runs the queue
+    Thread.run_synced()
+    assert calls == [(i, threading.current_thread()) for i in range(3)]
+
+    Thread.run_synced()
+    assert len(calls) == 3
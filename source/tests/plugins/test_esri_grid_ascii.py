@@ -0,0 +1,39 @@
+import datetime
+
+import numpy
+import pytest
+
+from tests.plugins.utils import load_plugin
+
+pytest.importorskip('osgeo')
+
+HEADER = 'ncols 3\nnrows 2\nxllcorner 0\nyllcorner 0\ncellsize 10\nNODATA_value -9999\n'
+
+
+@pytest.fixture
+def velma_grids(tmp_path):
+    """ A VELMA series of 2x3 grids for days 1-3 of 2000, where each cell is 10 times the day plus its index """
+
+    for day in (1, 2, 3):
+        values = numpy.arange(6).reshape((2, 3)) + 10 * day
+        with open(str(tmp_path / 'runoff_1_2000_{}.asc'.format(day)), 'w') as f:
+            f.write(HEADER + '\n'.join(' '.join(str(x) for x in row) for row in values))
+
+    plugin = load_plugin('esri_grid_ascii').ESRIGridAscii()
+    plugin.set_path(str(tmp_path / 'runoff_1_2000_1.asc'))
+    return plugin
+
+
+def test_sample(velma_grids):
+    plugin = velma_grids
+    assert len(plugin.time_info.timestamps) == 3
+
+    day_2 = datetime.datetime(2000, 1, 2)
+    assert plugin.sample('runoff', day_2, 1, 2) == 25
+    assert (plugin.sample('runoff', day_2, [0, 1], [0, 1]) == [20, 24]).all()
+
+    # Dates are clamped to the timestamps before the cached grid is used
+    assert (plugin.get_data('runoff', datetime.datetime(2001, 1, 1)) == numpy.arange(6).reshape((2, 3)) + 30).all()
+    assert plugin.sample('runoff', datetime.datetime(1999, 1, 1), 0, 0) == 10
+    assert plugin.sample('runoff', datetime.datetime(2000, 1, 3), 0, 0) == 30
+    assert plugin.sample('runoff', datetime.datetime(2001, 1, 1), 1, 1) == 34
@@ -0,0 +1,36 @@
+import numpy
+import pytest
+import rasterio
+from rasterio.transform import from_origin
+
+from tests.plugins.utils import load_plugin
+
+
+@pytest.fixture
+def geotiff(tmp_path):
+    path = str(tmp_path / 'grid.tif')
+    data = numpy.arange(2 * 6 * 5, dtype=numpy.float32).reshape((2, 6, 5))
+    with rasterio.open(path, 'w', driver='GTiff', width=5, height=6, count=2, dtype='float32', crs='EPSG:32610',
+                       transform=from_origin(500000, 5000000, 30, 30), nodata=-9999) as dst:
+        dst.write(data)
+
+    plugin = load_plugin('geotiff').GeoTIFF()
+    plugin.set_path(path)
+    return plugin, data
+
+
+def test_sample(geotiff):
+    plugin, data = geotiff
+
+    # Read from disk
+    assert plugin.sample('Band 2', None, 3, 4) == data[1, 3, 4]
+    rows, cols = numpy.array([0, 5, 2]), numpy.array([4, 0, 2])
+    assert (plugin.sample('Band 1', None, rows, cols) == data[0, rows, cols]).all()
+
+    # Read from the cached grid
+    assert (plugin.get_data('Band 1') == data[0]).all()
+    assert (plugin.sample('Band 1', None, rows, cols) == data[0, rows, cols]).all()
+    assert plugin.sample('Band 2', None, 3, 4) == data[1, 3, 4]
+
+    with pytest.raises(IndexError):
+        plugin.sample('Band 2', None, 6, 0)
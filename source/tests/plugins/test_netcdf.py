@@ -0,0 +1,52 @@
+import datetime
+
+import numpy
+import pytest
+
+from tests.plugins.utils import load_plugin
+
+netCDF4 = pytest.importorskip('netCDF4')
+pytest.importorskip('clover')
+pytest.importorskip('wx')
+
+
+@pytest.fixture
+def netcdf(tmp_path):
+    """ A temporal 3x4 grid with 3 timesteps, where each cell is 100 times the timestep plus its index """
+
+    path = str(tmp_path / 'grid.nc')
+    with netCDF4.Dataset(path, 'w') as ds:
+        ds.createDimension('time', 3)
+        ds.createDimension('y', 3)
+        ds.createDimension('x', 4)
+
+        time = ds.createVariable('time', 'i4', ('time',))
+        time.units = 'days since 2000-01-01'
+        time[:] = [0, 1, 2]
+        x = ds.createVariable('x', 'f8', ('x',))
+        x.units = 'm'
+        x[:] = [5, 15, 25, 35]
+        y = ds.createVariable('y', 'f8', ('y',))
+        y.units = 'm'
+        y[:] = [25, 15, 5]
+
+        values = ds.createVariable('values', 'f4', ('time', 'y', 'x'))
+        values[:] = numpy.arange(12).reshape((1, 3, 4)) + 100 * numpy.arange(3).reshape((3, 1, 1))
+
+    plugin = load_plugin('netcdf').NetCDF4DataPlugin()
+    plugin.set_path(path)
+    return plugin
+
+
+def test_sample(netcdf):
+    plugin = netcdf
+    day_2 = datetime.datetime(2000, 1, 2)
+    rows, cols = numpy.array([0, 2, 1]), numpy.array([3, 0, 1])
+
+    # Read from disk
+    assert plugin.sample('values', day_2, 2, 3) == 111
+    assert (plugin.sample('values', day_2, rows, cols) == 100 + rows * 4 + cols).all()
+
+    # Read from the cached grid
+    assert (plugin.get_data('values', day_2) == numpy.arange(12).reshape((3, 4)) + 100).all()
+    assert (plugin.sample('values', datetime.datetime(2000, 1, 3), rows, cols) == 200 + rows * 4 + cols).all()
@@ -0,0 +1,21 @@
+import os
+import sys
+from importlib.util import spec_from_file_location, module_from_spec
+
+PLUGINS_DIR = os.path.join(os.path.dirname(__file__), '..', '..', '..', 'plugins')
+
+
+def load_plugin(directory):
+    """ Loads the main module of a plugin the way load_plugins() does, once per test session """
+
+    module_name = 'plugins.{}'.format(directory)
+    if module_name not in sys.modules:
+        spec = spec_from_file_location(module_name, os.path.join(PLUGINS_DIR, directory, 'main.py'))
+        mod = module_from_spec(spec)
+        sys.modules[module_name] = mod
+        try:
+            spec.loader.exec_module(mod)
+        except Exception:
+            del sys.modules[module_name]
+            raise
+    return sys.modules[module_name]
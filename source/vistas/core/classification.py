@@ -0,0 +1,67 @@
+import numpy
+
+
+def as_float_array(values):
+    """ Converts values to a float array. Missing values (None) become NaN, which no class matches. """
+
+    values = numpy.asarray(values)
+    if values.dtype == object:
+        values = numpy.array([numpy.nan if value is None else value for value in values.ravel()])
+    return values.astype(numpy.float64, copy=False)
+
+
+class Classifier:
+    """ Base class for classifiers, which map arrays of values to the indices of their classes. """
+
+    def classify(self, values):
+        """ Returns an array of the class index of each value, or -1 for values which don't belong to any class. """
+
+        raise NotImplementedError
+
+
+class RangeClassifier(Classifier):
+    """
+    Classifies values into closed [min, max] ranges with a binary search. Ranges shouldn't overlap, except that
+    neighboring ranges may share an endpoint; a value on a shared endpoint belongs to the lower range.
+    """
+
+    def __init__(self, ranges):
+        ranges = numpy.asarray(ranges, dtype=numpy.float64).reshape((-1, 2))
+        self.order = numpy.argsort(ranges[:, 1], kind='stable')
+        self.mins = ranges[self.order, 0]
+        self.maxs = ranges[self.order, 1]
+
+    def classify(self, values):
+        values = as_float_array(values)
+        if not self.maxs.size:
+            return numpy.full(values.shape, -1, dtype=numpy.intp)
+
+        # The first range whose max is at least the value is the only one which can contain it
+        index = numpy.minimum(numpy.searchsorted(self.maxs, values, side='left'), self.maxs.size - 1)
+        found = (self.mins[index] <= values) & (values <= self.maxs[index])
+        return numpy.where(found, self.order[index], -1)
+
+
+class ValueClassifier(Classifier):
+    """ Classifies values which are exactly equal to the value of a class. If values repeat, the first class wins. """
+
+    def __init__(self, values, classes=None):
+        """
+        Constructor
+        :param values: The value of each class.
+        :param classes: The index of each class, if not their position in values.
+        """
+
+        values = numpy.asarray(values, dtype=numpy.float64).ravel()
+        classes = numpy.arange(values.size) if classes is None else numpy.asarray(classes, dtype=numpy.intp)
+        self.values, first = numpy.unique(values, return_index=True)
+        self.classes = classes[first]
+
+    def classify(self, values):
+        values = as_float_array(values)
+        if not self.values.size:
+            return numpy.full(values.shape, -1, dtype=numpy.intp)
+
+        index = numpy.minimum(numpy.searchsorted(self.values, values), self.values.size - 1)
+        found = self.values[index] == values
+        return numpy.where(found, self.classes[index], -1)
@@ -10,7 +10,7 @@ from vistas.core.plugins.visualization import VisualizationPlugin, Visualization
 from vistas.core.task import Task
 from vistas.core.threading import Thread
 from vistas.core.timeline import Timeline
-from vistas.ui.utils import post_message
+from vistas.core.utils import post_message
 
 
 class ExportItem:
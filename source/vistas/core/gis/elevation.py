@@ -1,15 +1,14 @@
-import asyncio
 import os
-from io import BytesIO
 from typing import Dict, Union
 
-import aiohttp
 import mercantile
 import numpy
 from PIL import Image
 from pyproj import Proj, transform
 
-from vistas.core.gis.file_writer import RasterWriter
+from vistas.core.gis.tile_fetcher import TileFetcher
+from vistas.core.gis.tile_source import TERRARIUM, TileSource
+from vistas.core.gis.tile_store import TileStore
 from vistas.core.paths import get_config_dir
 from vistas.core.plugins.data import FeatureDataPlugin
 from vistas.core.plugins.interface import Plugin
@@ -22,21 +21,36 @@ def meters_per_px(zoom):
     return 6378137.0 * 2 * numpy.pi / (TILE_SIZE * (2 ** zoom))
 
 
+def normals_from_heights(heights, cellsize):
+    """
+    Computes unit surface normals for a height grid from its gradient. The x and y components of the normals are along
+    the rows and columns of the grid, respectively.
+    """
+
+    if heights.shape[0] > 1 and heights.shape[1] > 1:
+        dzdx, dzdy = numpy.gradient(heights, cellsize)
+    else:
+        dzdx = dzdy = numpy.zeros_like(heights)
+    normals = numpy.dstack((-dzdx, -dzdy, numpy.ones_like(heights))).astype(numpy.float32)
+    normals /= numpy.linalg.norm(normals, axis=2)[:, :, numpy.newaxis]
+    return normals
+
+
 class ElevationService:
     """
-    An interface for obtaining elevation data from public datasets sorted as a tile service. Can generate a digital
-    elevation model (DEM) for use in visualizing spatial datasets in 3D.
+    An interface for obtaining elevation data from public datasets sorted as a tile service, or from a local TileSource.
+    Can generate a digital elevation model (DEM) for use in visualizing spatial datasets in 3D.
     """
 
     TILE_SIZE = 256
-    AWS_ELEVATION = "https://s3.amazonaws.com/elevation-tiles-prod/terrarium/{z}/{x}/{y}.png"
-    AWS_NORMALS = "https://s3.amazonaws.com/elevation-tiles-prod/normal/{z}/{x}/{y}.png"
+    dem_block_size = 2 ** 18  # Number of DEM cells to project and sample at once
+    AWS_ELEVATION = TERRARIUM.url
 
-    def __init__(self):
-        self.x = None
-        self.y = None
+    def __init__(self, store=None, source=None, fetcher=None):
+        self.store = store if store is not None else TileStore.app()
+        self.fetcher = fetcher if fetcher is not None else TileFetcher.app()
+        self.source = source if source is not None else TileSource.app()
         self.resolution = None
-        self._current_grid = None
         self._zoom = None
 
     @property
@@ -66,103 +80,117 @@ class ElevationService:
     def zoom(self, zoom):
         self._zoom = int(zoom)
 
-    def get_grid(self, x, y, z=None, src=AWS_ELEVATION):
+    def _resolve_source(self, src=None) -> TileSource:
+        """ Returns the tile source for src, which may be a TileSource, the AWS elevation URL, or None for the default """
+
+        if src is None:
+            return self.source
+        elif isinstance(src, TileSource):
+            return src
+        return TERRARIUM
+
+    def get_grid(self, x, y, z=None, src=None):
+        """
+        Returns a decoded tile. Tiles from cached sources are shared with the tile store and are read-only.
+        """
+
         z = z if z else self.zoom
-        if x != self.x or y != self.y or src != self.AWS_ELEVATION:
-            self.x = x
-            self.y = y
-            img = Image.open(self._get_tile_path(z, x, y, src=src))
-            grid = numpy.array(img.getdata(), dtype=numpy.float32).reshape(256, 256, 3 if src == self.AWS_ELEVATION else 4)
-            img.close()
-
-            # decode AWS elevation to height grid
-            if src == self.AWS_ELEVATION:
-                self._current_grid = (grid[:, :, 0] * 256.0 + grid[:, :, 1] + grid[:, :, 2] / 256.0) - 32768.0
+        source = self._resolve_source(src)
+        if not source.cache:
+            return source.get_tile(z, x, y)
+
+        grid = self.store.get(source.name, z, x, y)
+        if grid is None:
+            path = self._get_tile_path(z, x, y, source)
+            if source.is_remote and os.path.exists(path):
+                # Migrate tiles downloaded before the tile store existed
+                with Image.open(path) as img:
+                    tile = source.decode(img)
+                os.remove(path)
+            elif source.is_remote:
+                tile = source.decode_bytes(self.fetcher.get(source.tile_url(z, x, y)))
             else:
-                self._current_grid = grid[:, :, 0:3] / 256.0
-        return self._current_grid
+                tile = source.get_tile(z, x, y)
+            grid = self.store.put(source.name, z, x, y, tile)
+
+        return grid
+
+    def has_tile(self, x, y, z=None, src=None):
+        """ Returns whether a tile is available without fetching it from a remote source """
+
+        z = z if z else self.zoom
+        source = self._resolve_source(src)
+        if source.cache and self.store.contains(source.name, z, x, y):
+            return True
+        if source.is_remote:
+            return os.path.exists(self._get_tile_path(z, x, y, source))
+        return source.has_tile(z, x, y)
 
     @staticmethod
-    def _get_tile_path(z, x, y, src=AWS_ELEVATION):
-        if src == ElevationService.AWS_ELEVATION:
+    def _get_tile_path(z, x, y, source):
+        """ Path of a tile from a remote source, as downloaded by previous versions """
+
+        if source.name == TERRARIUM.name:
             datatype = 'Elevation'
         else:
             datatype = 'Normals'
         return os.path.join(get_config_dir(), 'Tiles', 'AWS', datatype, str(z), str(x), "{}.png".format(y))
 
     def get_tiles(self, extent, task=None):
-        async def fetch_tile(client, url, tile_path):
-            async with client.get(url) as r:
-                tile_im = Image.open(BytesIO(await r.read()))
+        """
+        Fetches the tiles for an extent from a remote source ahead of time, and returns the (source, z, x, y) keys of
+        tiles that couldn't be fetched. Local sources are read on demand.
+        """
 
-                if not os.path.exists(tile_path):
-                    if not os.path.exists(os.path.dirname(tile_path)):
-                        os.makedirs(os.path.dirname(tile_path))
-                    tile_im.save(tile_path)
-                if task:
-                    task.inc_progress()
+        if not self.source.is_remote:
+            return []
 
-        loop = asyncio.get_event_loop()
+        def store_tile(key, data):
+            source, z, x, y = key
+            self.store.put(source.name, z, x, y, source.decode_bytes(data))
 
         # Retrieve tiles that we don't currently have
-        with aiohttp.ClientSession(loop=loop) as client:
-            requests = []
-            min_x, min_y, max_x, max_y = [None] * 4
-            for t in mercantile.tiles(extent.xmin, extent.ymin, extent.xmax, extent.ymax, [self.zoom]):
-                z, x, y = t.z, t.x, t.y
-                if min_x is None:
-                    min_x = max_x = x
-                    min_y = max_y = y
-                else:
-                    min_x = x if x < min_x else min_x
-                    min_y = y if y < min_y else min_y
-                    max_x = x if x > max_x else max_x
-                    max_y = y if y > max_y else max_y
-
-                path = self._get_tile_path(z, x, y)
-                npath = self._get_tile_path(z, x, y, self.AWS_NORMALS)
-                if not os.path.exists(path):
-                    url = self.AWS_ELEVATION.format(z=z, x=x, y=y)
-                    nurl = self.AWS_NORMALS.format(z=z, x=x, y=y)
-                    requests.append(fetch_tile(client, url, path))
-                    requests.append(fetch_tile(client, nurl, npath))
-
-            # Get corner tiles for good measure
-            min_x -= 1
-            min_y -= 1
-            max_x += 1
-            max_y += 1
-
-            for i in range(min_x, max_x+1):
-
-                # Top tiles
-                if not os.path.exists(self._get_tile_path(self.zoom, i, min_y)):
-                    requests.append(
-                        fetch_tile(client, self.AWS_ELEVATION.format(
-                            z=self.zoom, x=i, y=min_y
-                        ), self._get_tile_path(self.zoom, i, min_y))
-                    )
-
-                # Bottom tiles
-                if not os.path.exists(self._get_tile_path(self.zoom, i, max_y)):
-                    requests.append(    # Bottom tiles
-                        fetch_tile(client, self.AWS_ELEVATION.format(
-                            z=self.zoom, x=i, y=max_y
-                        ), self._get_tile_path(self.zoom, i, max_y))
-                    )
-
-                if i == min_x or i == max_x:    # Side tiles
-                    for j in range(min_y+1, max_y):
-                        if not os.path.exists(self._get_tile_path(self.zoom, i, j)):
-                            requests.append(
-                                fetch_tile(client, self.AWS_ELEVATION.format(
-                                    z=self.zoom, x=i, y=j
-                                ), self._get_tile_path(self.zoom, i, j))
-                            )
-            if task:
-                task.target = len(requests)
-
-            loop.run_until_complete(asyncio.gather(*requests))
+        requests = []
+        min_x, min_y, max_x, max_y = [None] * 4
+        for t in mercantile.tiles(extent.xmin, extent.ymin, extent.xmax, extent.ymax, [self.zoom]):
+            z, x, y = t.z, t.x, t.y
+            if min_x is None:
+                min_x = max_x = x
+                min_y = max_y = y
+            else:
+                min_x = x if x < min_x else min_x
+                min_y = y if y < min_y else min_y
+                max_x = x if x > max_x else max_x
+                max_y = y if y > max_y else max_y
+
+            if not self.has_tile(x, y, z):
+                requests.append((self.source, z, x, y))
+
+        # Get corner tiles for good measure
+        min_x -= 1
+        min_y -= 1
+        max_x += 1
+        max_y += 1
+
+        for i in range(min_x, max_x+1):
+
+            # Top tiles
+            if not self.has_tile(i, min_y):
+                requests.append((self.source, self.zoom, i, min_y))
+
+            # Bottom tiles
+            if not self.has_tile(i, max_y):
+                requests.append((self.source, self.zoom, i, max_y))
+
+            if i == min_x or i == max_x:    # Side tiles
+                for j in range(min_y+1, max_y):
+                    if not self.has_tile(i, j):
+                        requests.append((self.source, self.zoom, i, j))
+        if task:
+            task.target = len(requests)
+
+        # Tiles that couldn't be fetched are left out of the DEM, rather than failing it
+        return self.fetcher.fetch([(key, key[0].tile_url(*key[1:])) for key in requests], store_tile, task)
 
     def create_dem(self, native_extent, projected_extent, shape, resolution, save_path, task):
 
@@ -175,38 +203,94 @@ class ElevationService:
 
         task.description = 'Building DEM file...'
         height, width = shape
-        task.target = width * height
+        zoom = self.zoom
+
+        # Mosaic of the tiles covering the extent, including the border tiles fetched by get_tiles()
+        ul = mercantile.tile(projected_extent.xmin, projected_extent.ymax, zoom)
+        br = mercantile.tile(projected_extent.xmax, projected_extent.ymin, zoom)
+        max_tile = 2 ** zoom - 1
+        min_tx, min_ty = max(ul.x - 1, 0), max(ul.y - 1, 0)
+        max_tx, max_ty = min(br.x + 1, max_tile), min(br.y + 1, max_tile)
+        mosaic = self._get_mosaic(min_tx, min_ty, max_tx, max_ty, zoom)
+
+        xs = native_extent.xmin + numpy.arange(width) * resolution
+        block_rows = max(1, self.dem_block_size // width)
+        task.target = height
+        task.progress = 0
         height_grid = numpy.zeros(shape, dtype=numpy.float32)
-        for j in range(height):
-            for i in range(width):
-                x = native_extent.xmin + i * resolution
-                y = native_extent.ymax - j * resolution
 
-                # convert x,y to wgs extent
-                lon, lat = transform(native_extent.projection, projected_extent.projection, x, y)
+        for row in range(0, height, block_rows):
+            rows = min(block_rows, height - row)
+            ys = native_extent.ymax - numpy.arange(row, row + rows) * resolution
+            x_grid, y_grid = numpy.meshgrid(xs, ys)
 
-                # determine tile and get the right grid
-                tile = mercantile.tile(lon, lat, self.zoom)
-                bounds = mercantile.bounds(tile)
+            # convert x,y to wgs extent
+            lon, lat = transform(native_extent.projection, projected_extent.projection, x_grid, y_grid)
 
-                # determine position within grid
-                p_x = (lon - bounds.west) / (bounds.east - bounds.west)
-                p_y = (1 - ((lat - bounds.south) / (bounds.north - bounds.south)))
+            height_grid[row:row + rows] = self._sample_mosaic(mosaic, min_tx, min_ty, zoom, lon, lat)
+            task.inc_progress(rows)
 
-                if p_y < 0.0:
-                    p_y += 1.0
-                    y -= 1
-                elif p_y >= 1.0:
-                    p_y -= 1.0
-                    y += 1
+        # Imported here so that elevation services can be used without GDAL, which is only needed to write files
+        from vistas.core.gis.file_writer import RasterWriter
 
-                u = int(numpy.floor(p_x * DEFAULT_TILE_SIZE))
-                v = int(numpy.floor(p_y * DEFAULT_TILE_SIZE))
+        RasterWriter.write_esri_grid_ascii_file(save_path, height_grid, native_extent, resolution)
 
-                height_grid[j][i] = self.get_grid(tile.x, tile.y)[v, u]
-                task.inc_progress()
+    @classmethod
+    def _sample_mosaic(cls, mosaic, min_tx, min_ty, zoom, lon, lat):
+        """ Samples a mosaic of tiles whose upper left tile is (min_tx, min_ty) at arrays of lon/lat """
 
-        RasterWriter.write_esri_grid_ascii_file(save_path, height_grid, native_extent, resolution)
+        # Position in mosaic pixels, relative to pixel centers
+        px, py = cls._lonlat_to_tile_coords(lon, lat, zoom)
+        px = (px - min_tx) * DEFAULT_TILE_SIZE - 0.5
+        py = (py - min_ty) * DEFAULT_TILE_SIZE - 0.5
+        return cls._sample_bilinear(mosaic, px, py)
+
+    @staticmethod
+    def _lonlat_to_tile_coords(lon, lat, zoom):
+        """ Converts arrays of lon/lat to fractional web mercator tile coordinates at a zoom level """
+
+        n = 2 ** zoom
+        lat_rad = numpy.radians(numpy.clip(lat, -85.051129, 85.051129))
+        x = (numpy.asarray(lon) + 180.0) / 360.0 * n
+        y = (1.0 - numpy.log(numpy.tan(lat_rad) + 1.0 / numpy.cos(lat_rad)) / numpy.pi) / 2.0 * n
+        return x, y
+
+    @staticmethod
+    def _sample_bilinear(grid, px, py):
+        """ Samples a grid at fractional pixel positions, clamping to the edges of the grid """
+
+        grid_height, grid_width = grid.shape
+        px = numpy.clip(px, 0, grid_width - 1)
+        py = numpy.clip(py, 0, grid_height - 1)
+        x0 = numpy.minimum(numpy.floor(px).astype(numpy.intp), grid_width - 2 if grid_width > 1 else 0)
+        y0 = numpy.minimum(numpy.floor(py).astype(numpy.intp), grid_height - 2 if grid_height > 1 else 0)
+        x1 = numpy.minimum(x0 + 1, grid_width - 1)
+        y1 = numpy.minimum(y0 + 1, grid_height - 1)
+        tx = (px - x0).astype(numpy.float32)
+        ty = (py - y0).astype(numpy.float32)
+
+        top = grid[y0, x0] * (1 - tx) + grid[y0, x1] * tx
+        bottom = grid[y1, x0] * (1 - tx) + grid[y1, x1] * tx
+        return top * (1 - ty) + bottom * ty
+
+    def _get_mosaic(self, min_x, min_y, max_x, max_y, zoom, src=None):
+        """ Merges a range of tiles into a single grid. Tiles that aren't available are left as zeros. """
+
+        source = self._resolve_source(src)
+        shape = ((max_y - min_y + 1) * DEFAULT_TILE_SIZE, (max_x - min_x + 1) * DEFAULT_TILE_SIZE)
+        if source.bands == 1:
+            data = numpy.zeros(shape, dtype=numpy.float32)
+        else:
+            data = numpy.zeros((*shape, source.bands), dtype=numpy.float32)
+
+        for x in range(min_x, max_x + 1):
+            for y in range(min_y, max_y + 1):
+                if not self.has_tile(x, y, zoom, src=src):
+                    continue
+                w = (x - min_x) * DEFAULT_TILE_SIZE
+                h = (y - min_y) * DEFAULT_TILE_SIZE
+                data[h: h + DEFAULT_TILE_SIZE, w: w + DEFAULT_TILE_SIZE] = self.get_grid(x, y, zoom, src=src)
+        return data
 
     def create_dem_from_plugin(self, plugin, save_path, task):
         if isinstance(plugin, FeatureDataPlugin):
@@ -247,7 +331,17 @@ class ElevationService:
         new_plugin.calculate_stats()
         return new_plugin
 
-    def create_data_dem(self, extent, zoom, merge=False, src=AWS_ELEVATION) -> Union[Dict[mercantile.Tile, numpy.ndarray], numpy.ndarray]:
+    @staticmethod
+    def create_data_normals(dem, zoom) -> numpy.ndarray:
+        """
+        Computes normals for a merged DEM at a zoom level, as returned by create_data_dem. Normals are computed from the
+        gradient of the whole DEM, so they are continuous across tiles. They are cheap to compute from the heights, so
+        they aren't kept in the tile store.
+        """
+
+        return normals_from_heights(dem, meters_per_px(zoom))
+
+    def create_data_dem(self, extent, zoom, merge=False, src=None) -> Union[Dict[mercantile.Tile, numpy.ndarray], numpy.ndarray]:
         """
         Creates an elevation grid from elevation data in memory.
         :param extent Extent to build the DEM for.
@@ -264,15 +358,7 @@ class ElevationService:
         if merge:
             ul = tiles[0]
             br = tiles[-1]
-            shape = ((br.y - ul.y + 1) * DEFAULT_TILE_SIZE, (br.x - ul.x + 1) * DEFAULT_TILE_SIZE)
-            if src == self.AWS_ELEVATION:
-                data = numpy.zeros(shape, dtype=numpy.float32)
-            else:
-                data = numpy.zeros((*shape, 3), dtype=numpy.float32)
-            for tile in tiles:
-                w = (tile.x - ul.x) * DEFAULT_TILE_SIZE
-                h = (tile.y - ul.y) * DEFAULT_TILE_SIZE
-                data[h: h + DEFAULT_TILE_SIZE, w: w + DEFAULT_TILE_SIZE] = self.get_grid(tile.x, tile.y, src=src)
-            return data
+            return self._get_mosaic(ul.x, ul.y, br.x, br.y, self.zoom, src)
         else:
-            return {t: self.get_grid(t.x, t.y) for t in tiles}
+            # Tiles that couldn't be fetched are left out
+            return {t: numpy.array(self.get_grid(t.x, t.y, src=src)) for t in tiles if self.has_tile(t.x, t.y, src=src)}
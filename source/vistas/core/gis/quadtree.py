@@ -0,0 +1,146 @@
+import mercantile
+import numpy
+
+from vistas.core.bounds import BoundingBox
+from vistas.core.gis.tile_source import TILE_SIZE
+
+
+class TileQuadtree:
+    """
+    A quadtree of XYZ tiles covering a geographic extent, used to choose the zoom of each tile from the view.
+
+    Tiles are placed in the scene frame of a base zoom: one scene unit is one cell of a base zoom tile, the upper-left
+    base zoom tile is at the origin, and neighboring tiles share their edge vertices. Rows of a tile run along the scene
+    x axis and columns along the y axis, as with the tiles of a TerrainTileFactory.
+    """
+
+    max_roots = 4   # The root zoom is the finest zoom at which the extent is covered by at most this many tiles
+
+    def __init__(self, bounds, base_zoom, max_zoom=15, tile_size=TILE_SIZE):
+        """
+        Constructor
+        :param bounds: The (west, south, east, north) geographic bounds of the extent.
+        :param base_zoom: The zoom which defines the scene frame.
+        :param max_zoom: The finest zoom tiles are refined to.
+        """
+
+        self.bounds = bounds
+        self.base_zoom = base_zoom
+        self.max_zoom = max_zoom
+        self.tile_size = tile_size
+
+        base_tiles = list(mercantile.tiles(*bounds, [base_zoom]))
+        self.ul = mercantile.Tile(min(t.x for t in base_tiles), min(t.y for t in base_tiles), base_zoom)
+
+        zoom = min(base_zoom, max_zoom)
+        self.roots = list(mercantile.tiles(*bounds, [zoom]))
+        while zoom > 0 and len(self.roots) > self.max_roots:
+            zoom -= 1
+            self.roots = list(mercantile.tiles(*bounds, [zoom]))
+
+    def cellsize(self, tile):
+        """ Size of a cell of the tile in scene units """
+
+        return 2.0 ** (self.base_zoom - tile.z)
+
+    def span(self, tile):
+        """ Width of the tile in scene units """
+
+        return (self.tile_size - 1) * self.cellsize(tile)
+
+    def offset(self, tile):
+        """ Scene (x, y) position of the first vertex of the tile """
+
+        scale = self.cellsize(tile)
+        return (
+            (tile.y * scale - self.ul.y) * (self.tile_size - 1),
+            (tile.x * scale - self.ul.x) * (self.tile_size - 1)
+        )
+
+    def intersects(self, tile):
+        west, south, east, north = mercantile.bounds(tile)
+        xmin, ymin, xmax, ymax = self.bounds
+        return west < xmax and east > xmin and south < ymax and north > ymin
+
+    def children(self, tile):
+        """ Child tiles which intersect the extent """
+
+        return [child for child in mercantile.children(tile) if self.intersects(child)]
+
+    def bounding_box(self, tile, z_range=(0, 0)):
+        x, y = self.offset(tile)
+        span = self.span(tile)
+        return BoundingBox(x, y, z_range[0], x + span, y + span, z_range[1])
+
+    def select(self, camera_position, view_projection, pixel_scale, is_loaded, z_range=(0, 0), max_pixel_error=2.0):
+        """
+        Selects the tiles to draw for a view. A tile is refined into its children while its cells would be larger than
+        max_pixel_error pixels on screen, and tiles outside of the view frustum are skipped. A tile is only replaced by
+        its children once all of its visible children are loaded, so that the view never has holes and refines
+        progressively as tiles arrive.
+
+        :param camera_position: Position of the camera in the scene frame.
+        :param view_projection: The combined model-view and projection matrix, in row-vector (pyrr) convention.
+        :param pixel_scale: Height of the viewport in pixels divided by 2 * tan(fov / 2).
+        :param is_loaded: A callable which returns whether a tile is loaded.
+        :param z_range: The range of heights of the terrain, in scene units.
+        :return: The list of tiles to draw, and the list of tiles to load in order of priority.
+        """
+
+        camera_position = numpy.asarray(camera_position, dtype=numpy.float64)
+        view_projection = numpy.asarray(view_projection, dtype=numpy.float64)
+        draw = []
+        requests = {}
+
+        def request(tile, distance):
+            requests[tile] = (tile.z, distance)
+
+        def visit(tile):
+            bbox = self.bounding_box(tile, z_range)
+            if not self.in_frustum(bbox, view_projection):
+                return
+
+            distance = self.distance(bbox, camera_position)
+            if not is_loaded(tile):
+                request(tile, distance)
+                return
+
+            if tile.z < self.max_zoom and self.cellsize(tile) * pixel_scale / distance > max_pixel_error:
+                children = [
+                    child for child in self.children(tile)
+                    if self.in_frustum(self.bounding_box(child, z_range), view_projection)
+                ]
+                missing = [child for child in children if not is_loaded(child)]
+                if not missing:
+                    for child in children:
+                        visit(child)
+                    return
+
+                for child in missing:
+                    request(child, self.distance(self.bounding_box(child, z_range), camera_position))
+
+            draw.append(tile)
+
+        for root in self.roots:
+            visit(root)
+
+        return draw, sorted(requests, key=requests.get)
+
+    @staticmethod
+    def distance(bbox, point):
+        """ Distance from a point to the nearest point of a bounding box, at least a small positive value """
+
+        nearest = numpy.clip(point, (bbox.min_x, bbox.min_y, bbox.min_z), (bbox.max_x, bbox.max_y, bbox.max_z))
+        return max(float(numpy.linalg.norm(point - nearest)), 1e-6)
+
+    @staticmethod
+    def in_frustum(bbox, view_projection):
+        """ Conservative frustum test. A box is outside only if all of its corners are outside of one clip plane. """
+
+        corners = numpy.array([
+            (x, y, z, 1.0)
+            for x in (bbox.min_x, bbox.max_x) for y in (bbox.min_y, bbox.max_y) for z in (bbox.min_z, bbox.max_z)
+        ])
+        clip = corners.dot(view_projection)
+        w = clip[:, 3:4]
+        return not (numpy.all(clip[:, :3] < -w, axis=0).any() or numpy.all(clip[:, :3] > w, axis=0).any())
@@ -0,0 +1,28 @@
+import numpy
+from rasterio.windows import Window
+
+
+def bounding_window(rows, cols):
+    """ Returns the (row_offset, col_offset, height, width) of the smallest window containing all of the cells. """
+
+    row_offset, col_offset = int(numpy.min(rows)), int(numpy.min(cols))
+    return row_offset, col_offset, int(numpy.max(rows)) - row_offset + 1, int(numpy.max(cols)) - col_offset + 1
+
+
+def read_cells(dataset, band, rows, cols):
+    """
+    Reads cells from a band of an open rasterio dataset. Only the window bounding the cells is read. rows and cols may
+    be scalars or arrays of the same shape; a masked array (or masked scalar) of the cell values is returned.
+    """
+
+    rows = numpy.asarray(rows, dtype=int)
+    cols = numpy.asarray(cols, dtype=int)
+
+    height, width = dataset.shape
+    if rows.size and (rows.min() < 0 or rows.max() >= height or cols.min() < 0 or cols.max() >= width):
+        raise IndexError("Cells are outside of the grid")
+
+    row_offset, col_offset, window_height, window_width = bounding_window(rows, cols)
+    window = Window(col_offset, row_offset, window_width, window_height)
+    data = dataset.read(band, window=window, masked=True)
+    return data[rows - row_offset, cols - col_offset]
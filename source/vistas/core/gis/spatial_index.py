@@ -0,0 +1,49 @@
+import numpy
+import shapely.geometry
+from shapely.strtree import STRtree
+
+
+class FeatureIndex:
+    """
+    A packed R-tree (STRtree) over a feature collection. Built once, the index finds the features at a location without
+    constructing and testing every feature geometry.
+    """
+
+    def __init__(self, features):
+        self.features = []
+        self.shapes = []
+        for feature in features:
+            if feature.get('geometry') is None:
+                continue
+            self.features.append(feature)
+            self.shapes.append(shapely.geometry.shape(feature['geometry']))
+
+        self._tree = STRtree(self.shapes) if self.shapes else None
+        self._indices_by_shape = {id(shape): i for i, shape in enumerate(self.shapes)}
+
+    def __len__(self):
+        return len(self.features)
+
+    def _candidates(self, geometry):
+        """ Returns the sorted indices of features whose bounding boxes intersect the geometry. """
+
+        if self._tree is None:
+            return []
+
+        # Newer versions of shapely return indices, older versions return the geometries themselves
+        result = self._tree.query(geometry)
+        return sorted(
+            int(x) if isinstance(x, (int, numpy.integer)) else self._indices_by_shape[id(x)] for x in result
+        )
+
+    def query_point(self, x, y):
+        """ Returns the features that contain the point, in feature collection order. """
+
+        point = shapely.geometry.Point(x, y)
+        return [self.features[i] for i in self._candidates(point) if self.shapes[i].contains(point)]
+
+    def query_bbox(self, xmin, ymin, xmax, ymax):
+        """ Returns the features that intersect the bounding box, in feature collection order. """
+
+        bbox = shapely.geometry.box(xmin, ymin, xmax, ymax)
+        return [self.features[i] for i in self._candidates(bbox) if self.shapes[i].intersects(bbox)]
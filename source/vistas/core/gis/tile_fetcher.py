@@ -0,0 +1,137 @@
+import logging
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+import requests
+from requests.adapters import HTTPAdapter
+
+logger = logging.getLogger(__name__)
+
+
+class TileFetchError(Exception):
+    pass
+
+
+class TileFetcher:
+    """
+    Fetches tiles over HTTP with bounded concurrency. Requests share a pool of worker threads and a pool of keep-alive
+    connections, and failed requests are retried with exponential backoff. A tile that can't be fetched doesn't stop
+    the others; failures are reported to the caller instead.
+    """
+
+    default_max_concurrency = 8
+    default_retries = 3
+    default_backoff = 0.5       # Seconds before the first retry, doubled for each retry after
+    default_timeout = 30
+
+    # Client errors other than these won't succeed on retry
+    retry_statuses = {408, 429}
+
+    _app_fetcher = None
+
+    @classmethod
+    def app(cls):
+        """ Application tile fetcher, shared by all tile requests """
+
+        if cls._app_fetcher is None:
+            # Imported here so that the fetcher can be used without the UI toolkit
+            from vistas.core.preferences import Preferences
+
+            cls._app_fetcher = TileFetcher(
+                Preferences.app().get('tile_fetch_concurrency', cls.default_max_concurrency)
+            )
+
+        return cls._app_fetcher
+
+    def __init__(self, max_concurrency=default_max_concurrency, retries=default_retries, backoff=default_backoff,
+                 timeout=default_timeout):
+        self.max_concurrency = max_concurrency
+        self.retries = retries
+        self.backoff = backoff
+        self.timeout = timeout
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=max_concurrency, pool_maxsize=max_concurrency)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._executor = ThreadPoolExecutor(max_concurrency)
+
+    def get(self, url) -> bytes:
+        """ Fetches a URL, retrying failures. Raises TileFetchError if the URL can't be fetched. """
+
+        error = None
+        for attempt in range(self.retries + 1):
+            if attempt:
+                time.sleep(self.backoff * 2 ** (attempt - 1))
+
+            try:
+                response = self.session.get(url, timeout=self.timeout)
+            except requests.RequestException as e:
+                error = e
+                continue
+
+            if response.status_code == 200:
+                return response.content
+
+            error = 'HTTP {}'.format(response.status_code)
+            if 400 <= response.status_code < 500 and response.status_code not in self.retry_statuses:
+                break
+
+        raise TileFetchError('Could not fetch {}: {}'.format(url, error))
+
+    def fetch(self, tiles, callback, task=None):
+        """
+        Fetches tiles concurrently. tiles is a list of (key, url) pairs, and callback(key, data) is called from a
+        worker thread with the content of each tile. Returns a list of the keys that couldn't be fetched. If the task
+        is stopped, pending requests are cancelled.
+        """
+
+        def fetch_one(key, url):
+            callback(key, self.get(url))
+
+        futures = {self._executor.submit(fetch_one, key, url): key for key, url in tiles}
+        failed = []
+
+        for future in as_completed(futures):
+            if future.cancelled():
+                continue
+
+            try:
+                future.result()
+            except Exception as e:
+                logger.warning(str(e))
+                failed.append(futures[future])
+
+            if task:
+                task.inc_progress()
+                if task.should_stop:
+                    for pending in futures:
+                        pending.cancel()
+
+        return failed
+
+    def download(self, tiles, task=None):
+        """
+        Fetches tiles to files. tiles is a list of (url, path) pairs. Files are written atomically, so that an
+        interrupted download never leaves a partial tile behind. Returns a list of the paths that couldn't be fetched.
+        """
+
+        return self.fetch([(path, url) for url, path in tiles], write_atomic, task)
+
+
+def write_atomic(path, data):
+    """ Writes data to a temporary file next to path, then renames it into place """
+
+    directory = os.path.dirname(os.path.abspath(path))
+    os.makedirs(directory, exist_ok=True)
+
+    fd, temp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        os.replace(temp_path, path)
+    except:
+        os.remove(temp_path)
+        raise
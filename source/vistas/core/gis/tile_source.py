@@ -0,0 +1,175 @@
+import os
+import threading
+from io import BytesIO
+from urllib.request import urlopen
+
+import mercantile
+import numpy
+import rasterio
+from PIL import Image
+from rasterio.transform import from_bounds
+from rasterio.warp import Resampling, reproject, transform_bounds
+
+TILE_SIZE = 256
+
+
+def decode_terrarium(img):
+    """ Decodes a terrarium encoded image to a grid of heights in meters """
+
+    grid = numpy.asarray(img.convert('RGB'), dtype=numpy.float32)
+    return (grid[:, :, 0] * 256.0 + grid[:, :, 1] + grid[:, :, 2] / 256.0) - 32768.0
+
+
+class TileSource:
+    """
+    Interface for a source of web mercator (XYZ) tiles. Tiles are decoded float32 grids of TILE_SIZE x TILE_SIZE
+    cells, with an extra dimension if the source has more than one band.
+    """
+
+    _app_source = None
+
+    name = None         # Unique name of the source, used as the key for stored tiles
+    bands = 1
+    max_zoom = 15
+    is_remote = False   # Remote sources are fetched ahead of time, in bulk
+    cache = True        # Whether tiles should be kept in the tile store
+
+    @classmethod
+    def app(cls):
+        """
+        The application elevation source, configured by the 'elevation_source' preference ('terrarium', 'xyz' or
+        'raster') and the 'elevation_source_path' preference for local sources.
+        """
+
+        if cls._app_source is None:
+            # Imported here so that sources can be used without the UI toolkit
+            from vistas.core.preferences import Preferences
+
+            preferences = Preferences.app()
+            kind = preferences.get('elevation_source', 'terrarium')
+            path = preferences.get('elevation_source_path')
+
+            if kind == 'xyz':
+                cls._app_source = XYZTileSource(path)
+            elif kind == 'raster':
+                cls._app_source = RasterTileSource(path)
+            else:
+                cls._app_source = TERRARIUM
+
+        return cls._app_source
+
+    @classmethod
+    def set_app(cls, source):
+        cls._app_source = source
+
+    def has_tile(self, z, x, y):
+        """ Returns whether the tile can be produced without fetching it from a remote service """
+
+        raise NotImplemented
+
+    def get_tile(self, z, x, y) -> numpy.ndarray:
+        """ Returns a decoded tile """
+
+        raise NotImplemented
+
+
+class RemoteTileSource(TileSource):
+    """ Tiles fetched from a remote XYZ tile service """
+
+    is_remote = True
+
+    def __init__(self, name, url, decode, bands=1):
+        self.name = name
+        self.url = url
+        self.decode = decode
+        self.bands = bands
+
+    def tile_url(self, z, x, y):
+        return self.url.format(z=z, x=x, y=y)
+
+    def decode_bytes(self, data):
+        with Image.open(BytesIO(data)) as img:
+            return self.decode(img)
+
+    def has_tile(self, z, x, y):
+        return False
+
+    def get_tile(self, z, x, y):
+        with urlopen(self.tile_url(z, x, y)) as response:
+            return self.decode_bytes(response.read())
+
+
+TERRARIUM = RemoteTileSource(
+    'terrarium', 'https://s3.amazonaws.com/elevation-tiles-prod/terrarium/{z}/{x}/{y}.png', decode_terrarium
+)
+
+
+class XYZTileSource(TileSource):
+    """ A local directory of terrarium encoded XYZ tiles, such as an extract of the remote terrarium tiles """
+
+    cache = False   # The tiles are already on disk
+
+    def __init__(self, directory, pattern='{z}/{x}/{y}.png', decode=decode_terrarium):
+        self.directory = directory
+        self.pattern = pattern
+        self.decode = decode
+        self.name = 'xyz:{}'.format(os.path.abspath(directory))
+
+    def tile_path(self, z, x, y):
+        return os.path.join(self.directory, *self.pattern.format(z=z, x=x, y=y).split('/'))
+
+    def has_tile(self, z, x, y):
+        return os.path.exists(self.tile_path(z, x, y))
+
+    def get_tile(self, z, x, y):
+        with Image.open(self.tile_path(z, x, y)) as img:
+            return self.decode(img)
+
+
+class RasterTileSource(TileSource):
+    """
+    Tiles cut on the fly from a local elevation raster (e.g., a GeoTIFF or ESRI grid), reprojected to web mercator.
+    Reprojected tiles are kept in the tile store, keyed by the path and modification time of the raster. Cells outside
+    of the raster, or without data, are 0.
+    """
+
+    def __init__(self, path, band=1, crs=None, resampling=Resampling.bilinear):
+        self.path = path
+        self.band = band
+        self.resampling = resampling
+        self.name = 'raster:{}:{}:{}'.format(os.path.abspath(path), band, os.path.getmtime(path))
+
+        self._lock = threading.Lock()
+        self._dataset = rasterio.open(path)
+        self.crs = crs if crs is not None else self._dataset.crs
+        if self.crs is None:
+            raise ValueError("The raster has no coordinate reference system, and none was given.")
+
+        self._lnglat_bounds = transform_bounds(self.crs, 'EPSG:4326', *self._dataset.bounds)
+
+    def has_tile(self, z, x, y):
+        west, south, east, north = mercantile.bounds(x, y, z)
+        xmin, ymin, xmax, ymax = self._lnglat_bounds
+        return west < xmax and east > xmin and south < ymax and north > ymin
+
+    def get_tile(self, z, x, y):
+        tile = numpy.zeros((TILE_SIZE, TILE_SIZE), dtype=numpy.float32)
+        if not self.has_tile(z, x, y):
+            return tile
+
+        bounds = mercantile.xy_bounds(x, y, z)
+        with self._lock:
+            reproject(
+                source=rasterio.band(self._dataset, self.band),
+                destination=tile,
+                src_crs=self.crs,
+                src_nodata=self._dataset.nodata,
+                dst_transform=from_bounds(*bounds, TILE_SIZE, TILE_SIZE),
+                dst_crs='EPSG:3857',
+                dst_nodata=0,
+                resampling=self.resampling
+            )
+        return tile
+
+    def close(self):
+        self._dataset.close()
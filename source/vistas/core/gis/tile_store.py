@@ -0,0 +1,235 @@
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import numpy
+
+
+class TileStoreStats:
+    """ Hit and miss counts for a TileStore """
+
+    def __init__(self):
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @property
+    def hits(self):
+        return self.memory_hits + self.disk_hits
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def reset(self):
+        self.memory_hits = self.disk_hits = self.misses = 0
+
+
+class TileStore:
+    """
+    A store of decoded tiles in a single SQLite database. Tiles are float32 arrays keyed by (source, z, x, y). The
+    database is kept under a disk quota by evicting the least recently used tiles, and recently used tiles are kept
+    decoded in memory.
+    """
+
+    default_quota = 1024 ** 3           # 1 GB
+    default_memory_tiles = 128
+    eviction_ratio = 0.9                # Evict down to this fraction of the quota
+
+    _app_store = None
+
+    @classmethod
+    def app(cls):
+        """ Application tile store, located in the config directory """
+
+        if cls._app_store is None:
+            # Imported here so that the store can be used without the UI toolkit
+            from vistas.core.paths import get_config_dir
+            from vistas.core.preferences import Preferences
+
+            path = os.path.join(get_config_dir(), 'Tiles', 'tiles.sqlite')
+            cls._app_store = TileStore(path, Preferences.app().get('tile_store_quota', cls.default_quota))
+
+        return cls._app_store
+
+    def __init__(self, path, quota=default_quota, memory_tiles=default_memory_tiles):
+        self.path = path
+        self._quota = quota
+        self.memory_tiles = memory_tiles
+        self.stats = TileStoreStats()
+
+        self._memory = OrderedDict()
+        self._accessed = {}             # Access times of tiles served from memory, not yet written to the database
+        self._lock = threading.RLock()
+
+        directory = os.path.dirname(path)
+        if directory and not os.path.exists(directory):
+            os.makedirs(directory)
+
+        self._connection = sqlite3.connect(path, check_same_thread=False)
+        self._connection.execute('PRAGMA auto_vacuum = INCREMENTAL')  # Only applies to new databases
+        self._connection.execute(
+            'CREATE TABLE IF NOT EXISTS tiles ('
+            'source TEXT, z INTEGER, x INTEGER, y INTEGER, shape TEXT, data BLOB, size INTEGER, accessed REAL, '
+            'PRIMARY KEY (source, z, x, y))'
+        )
+        self._connection.execute('CREATE INDEX IF NOT EXISTS tiles_accessed ON tiles (accessed)')
+        self._connection.commit()
+        self._size = self._connection.execute('SELECT COALESCE(SUM(size), 0) FROM tiles').fetchone()[0]
+
+    @property
+    def quota(self):
+        return self._quota
+
+    @quota.setter
+    def quota(self, quota):
+        self._quota = quota
+        self.evict()
+
+    @property
+    def size(self):
+        """ Total size in bytes of the tiles in the database """
+
+        return self._size
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute('SELECT COUNT(*) FROM tiles').fetchone()[0]
+
+    def __contains__(self, key):
+        with self._lock:
+            if key in self._memory:
+                return True
+            return self._connection.execute(
+                'SELECT 1 FROM tiles WHERE source=? AND z=? AND x=? AND y=?', key
+            ).fetchone() is not None
+
+    def contains(self, source, z, x, y):
+        return (source, z, x, y) in self
+
+    def get(self, source, z, x, y):
+        """ Returns the tile, or None if it isn't in the store. Returned arrays are read-only. """
+
+        key = (source, z, x, y)
+        with self._lock:
+            tile = self._memory.get(key)
+            if tile is not None:
+                self._memory.move_to_end(key)
+                self._accessed[key] = time.time()
+                self.stats.memory_hits += 1
+                return tile
+
+            row = self._connection.execute(
+                'SELECT shape, data FROM tiles WHERE source=? AND z=? AND x=? AND y=?', key
+            ).fetchone()
+            if row is None:
+                self.stats.misses += 1
+                return None
+
+            self._connection.execute(
+                'UPDATE tiles SET accessed=? WHERE source=? AND z=? AND x=? AND y=?', (time.time(), *key)
+            )
+            self._connection.commit()
+            self.stats.disk_hits += 1
+
+            shape = tuple(int(x) for x in row[0].split(','))
+            tile = numpy.frombuffer(row[1], dtype=numpy.float32).reshape(shape)
+            self._remember(key, tile)
+            return tile
+
+    def put(self, source, z, x, y, tile):
+        """
+        Adds a tile to the store, replacing any existing tile, and evicts other tiles if the store is over quota.
+        Returns the stored, read-only tile.
+        """
+
+        key = (source, z, x, y)
+        tile = numpy.ascontiguousarray(tile, dtype=numpy.float32)
+        data = tile.tobytes()
+
+        with self._lock:
+            existing = self._connection.execute(
+                'SELECT size FROM tiles WHERE source=? AND z=? AND x=? AND y=?', key
+            ).fetchone()
+            if existing is not None:
+                self._size -= existing[0]
+
+            self._connection.execute(
+                'INSERT OR REPLACE INTO tiles VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (*key, ','.join(str(x) for x in tile.shape), data, len(data), time.time())
+            )
+            self._connection.commit()
+            self._size += len(data)
+
+            tile = tile.copy()
+            tile.flags.writeable = False
+            self._remember(key, tile)
+            self.evict(keep=key)
+            return tile
+
+    def evict(self, keep=None):
+        """
+        Removes the least recently used tiles until the store is within its quota. The tile with the key given by keep
+        is never removed, so a tile that was just added survives a quota smaller than itself.
+        """
+
+        with self._lock:
+            self._flush_accessed()
+
+            if self._size <= self._quota:
+                return
+
+            target = self._size - self._quota * self.eviction_ratio
+            evicted = []
+            for source, z, x, y, tile_size in self._connection.execute(
+                'SELECT source, z, x, y, size FROM tiles ORDER BY accessed'
+            ):
+                if target <= 0:
+                    break
+                if (source, z, x, y) == keep:
+                    continue
+                evicted.append((source, z, x, y))
+                target -= tile_size
+                self._size -= tile_size
+
+            self._connection.executemany('DELETE FROM tiles WHERE source=? AND z=? AND x=? AND y=?', evicted)
+            self._connection.commit()
+            self._connection.execute('PRAGMA incremental_vacuum').fetchall()  # Return freed pages to the file system
+            for key in evicted:
+                self._memory.pop(key, None)
+
+    def clear(self):
+        """ Removes all tiles from the store """
+
+        with self._lock:
+            self._memory.clear()
+            self._accessed.clear()
+            self._connection.execute('DELETE FROM tiles')
+            self._connection.commit()
+            self._size = 0
+            self._connection.execute('VACUUM')
+
+    def close(self):
+        with self._lock:
+            self._flush_accessed()
+            self._connection.close()
+
+    def _remember(self, key, tile):
+        self._memory[key] = tile
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_tiles:
+            self._memory.popitem(last=False)
+
+    def _flush_accessed(self):
+        """ Writes access times of tiles served from memory, so that eviction sees them as recently used """
+
+        if self._accessed:
+            self._connection.executemany(
+                'UPDATE tiles SET accessed=? WHERE source=? AND z=? AND x=? AND y=?',
+                [(accessed, *key) for key, accessed in self._accessed.items()]
+            )
+            self._connection.commit()
+            self._accessed.clear()
@@ -0,0 +1,252 @@
+import hashlib
+import logging
+import multiprocessing
+import os
+import shutil
+import tempfile
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy
+from shapely.geometry import Polygon
+from triangle import triangulate
+
+logger = logging.getLogger(__name__)
+
+# Identifies how features are triangulated. Changing the triangulation should change this, to invalidate cached results.
+TRIANGULATION_PARAMS = 'triangle;exterior-rings'
+
+Triangulation = namedtuple('Triangulation', ['vertices', 'offsets', 'counts'])
+
+
+def polygon_rings(geometry):
+    """
+    Returns the exterior rings of a GeoJSON-like Polygon or MultiPolygon geometry as (n, 2) arrays, without their closing
+    points.
+    """
+
+    if geometry['type'] == 'Polygon':
+        polygons = [geometry['coordinates']]
+    elif geometry['type'] == 'MultiPolygon':
+        polygons = geometry['coordinates']
+    else:
+        raise ValueError("Can't render non polygons!")
+
+    return [numpy.asarray(polygon[0], dtype=numpy.float64)[:-1, :2] for polygon in polygons]
+
+
+def project_rings(rings, transformer):
+    """ Projects a list of rings with a pyproj Transformer, in a single call over all of their coordinates """
+
+    if not rings:
+        return []
+
+    coords = numpy.concatenate(rings)
+    xs, ys = transformer.transform(coords[:, 0], coords[:, 1])
+    projected = numpy.column_stack((xs, ys))
+    return numpy.split(projected, numpy.cumsum([len(ring) for ring in rings])[:-1])
+
+
+def simplify_ring(ring, tolerance):
+    """
+    Simplifies a ring with the Douglas-Peucker algorithm, preserving its topology so that it stays a valid polygon.
+    Returns a list of rings, which is empty if the ring collapses.
+    """
+
+    if tolerance <= 0 or len(ring) <= 3:
+        return [ring]
+
+    simplified = Polygon(ring).simplify(tolerance, preserve_topology=True)
+    polygons = getattr(simplified, 'geoms', [simplified])
+    return [
+        numpy.asarray(polygon.exterior.coords, dtype=numpy.float64)[:-1] for polygon in polygons
+        if not polygon.is_empty and polygon.geom_type == 'Polygon'
+    ]
+
+
+def triangulate_rings(features, tolerance=0.0):
+    """
+    Triangulates the rings of a list of features, where each feature is a list of rings. Rings are first simplified
+    with tolerance, if it's positive. Returns the vertices of the triangles of all features as an (n, 2) array, and the
+    number of triangle vertices of each feature.
+    """
+
+    triangles = []
+    counts = []
+    for rings in features:
+        count = 0
+        for ring in (part for ring in rings for part in simplify_ring(ring, tolerance)):
+            triangulation = triangulate(dict(vertices=ring))
+            if 'triangles' not in triangulation:
+                continue    # Degenerate ring
+            t = triangulation['vertices'][triangulation['triangles']].reshape(-1, 2)
+            triangles.append(t)
+            count += len(t)
+        counts.append(count)
+
+    if not triangles:
+        return numpy.zeros((0, 2)), numpy.array(counts, dtype=numpy.int64)
+    return numpy.concatenate(triangles), numpy.array(counts, dtype=numpy.int64)
+
+
+def triangulate_features(features, transformer=None, task=None, chunk_size=2048, processes=None, tolerance=0.0,
+                         mp_context=None):
+    """
+    Projects and triangulates the exterior rings of polygon features. Each chunk of features is projected in one
+    vectorized call, and chunks are triangulated in a pool of processes; results are kept in the order of the features.
+    A single chunk is triangulated in this process.
+
+    Pool processes are spawned rather than forked by default, on every platform, since forking a process with UI and
+    loader threads isn't safe. Workers only run triangulate_rings(), so they don't import the application; the
+    application entry point must still be guarded by `if __name__ == '__main__'` and call freeze_support().
+
+    Progress is reported to the task as chunks complete. If the task is stopped, pending chunks are cancelled and None
+    is returned.
+
+    :param features: An iterable of GeoJSON-like features.
+    :param transformer: A pyproj Transformer to project rings with, or None to keep their coordinates.
+    :param tolerance: Tolerance to simplify rings with, in projected units, or 0 to keep every vertex.
+    :param mp_context: The multiprocessing context to create the pool with, or None to spawn processes.
+    :return: The vertices of the triangles of all features as an (n, 2) array, and the number of triangle vertices of
+    each feature.
+    """
+
+    def chunks():
+        chunk = []
+        for feature in features:
+            chunk.append(polygon_rings(feature['geometry']))
+            if len(chunk) == chunk_size:
+                yield chunk
+                chunk = []
+        if chunk:
+            yield chunk
+
+    def project(chunk):
+        if transformer is None:
+            return chunk
+        rings = project_rings([ring for rings in chunk for ring in rings], transformer)
+        projected = []
+        for feature_rings in chunk:
+            projected.append(rings[:len(feature_rings)])
+            rings = rings[len(feature_rings):]
+        return projected
+
+    results = []
+    executor = None
+    futures = []
+
+    try:
+        for chunk in chunks():
+            if task and task.should_stop:
+                return None
+
+            chunk = project(chunk)
+            if executor is None and len(chunk) < chunk_size and not futures:
+                results.append(triangulate_rings(chunk, tolerance))  # Everything fits in one chunk
+                if task:
+                    task.inc_progress(len(chunk))
+                continue
+
+            if executor is None:
+                executor = ProcessPoolExecutor(processes, mp_context or multiprocessing.get_context('spawn'))
+            futures.append((executor.submit(triangulate_rings, chunk, tolerance), len(chunk)))
+
+        for future, size in futures:
+            if task and task.should_stop:
+                return None
+            results.append(future.result())
+            if task:
+                task.inc_progress(size)
+
+    finally:
+        if executor is not None:
+            for future, _ in futures:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+    if not results:
+        return numpy.zeros((0, 2)), numpy.zeros(0, dtype=numpy.int64)
+    return numpy.concatenate([r[0] for r in results]), numpy.concatenate([r[1] for r in results])
+
+
+class TriangulationCache:
+    """
+    A cache of feature triangulations in a directory. Entries are keyed by the checksum of the feature file, the
+    projection the triangles are in, and the triangulation parameters, so they're invalidated when any of them change.
+    Arrays are stored uncompressed and loaded memory-mapped, copy-on-write, so loading doesn't read them up front and
+    callers can modify the loaded arrays without changing the cache.
+    """
+
+    _app_cache = None
+    _checksums = {}     # (path, mtime, size) -> checksum, so that unchanged files are only read once
+
+    @classmethod
+    def app(cls):
+        """ Application triangulation cache, located in the config directory """
+
+        if cls._app_cache is None:
+            # Imported here so that the cache can be used without the UI toolkit
+            from vistas.core.paths import get_config_dir
+
+            cls._app_cache = TriangulationCache(os.path.join(get_config_dir(), 'Triangulations'))
+
+        return cls._app_cache
+
+    def __init__(self, directory):
+        self.directory = directory
+
+    @classmethod
+    def checksum(cls, path):
+        stat = os.stat(path)
+        key = (os.path.abspath(path), stat.st_mtime, stat.st_size)
+        if key not in cls._checksums:
+            digest = hashlib.sha1()
+            with open(path, 'rb') as f:
+                for block in iter(lambda: f.read(1024 ** 2), b''):
+                    digest.update(block)
+            cls._checksums[key] = digest.hexdigest()
+        return cls._checksums[key]
+
+    def key(self, path, projection, params=TRIANGULATION_PARAMS):
+        """
+        The cache key of the triangulation of a feature file, in a projection given as a proj string. Triangulations
+        with other settings, such as simplification, should add them to params.
+        """
+
+        digest = hashlib.sha1()
+        for part in (self.checksum(path), projection, params):
+            digest.update(part.encode())
+            digest.update(b'\0')
+        return digest.hexdigest()
+
+    def get(self, key):
+        """ Returns the cached Triangulation, or None if there isn't one. """
+
+        entry = os.path.join(self.directory, key)
+        try:
+            return Triangulation(*(
+                numpy.load(os.path.join(entry, '{}.npy'.format(name)), mmap_mode='c') for name in Triangulation._fields
+            ))
+        except (OSError, ValueError):
+            return None
+
+    def put(self, key, vertices, offsets, counts):
+        """
+        Caches a triangulation. The entry is written to a temporary directory and moved into place, so that readers
+        never see a partial entry. Failures to write are logged and otherwise ignored.
+        """
+
+        entry = os.path.join(self.directory, key)
+        temp = None
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            temp = tempfile.mkdtemp(dir=self.directory, suffix='.tmp')
+            for name, data in zip(Triangulation._fields, (vertices, offsets, counts)):
+                numpy.save(os.path.join(temp, '{}.npy'.format(name)), numpy.asarray(data))
+            if os.path.exists(entry):
+                shutil.rmtree(entry)
+            os.rename(temp, entry)
+        except OSError as e:
+            logger.warning('Could not cache triangulation: {}'.format(e))
+            if temp is not None:
+                shutil.rmtree(temp, ignore_errors=True)
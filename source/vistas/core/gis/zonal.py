@@ -0,0 +1,211 @@
+from collections import OrderedDict
+
+import numpy
+from rasterio import features
+
+from vistas.core.gis.spatial_index import FeatureIndex
+
+STATISTICS = ('count', 'sum', 'mean', 'min', 'max', 'std', 'median', 'range')
+
+
+class ZoneRaster:
+    """
+    A feature collection burned into rasters of zone IDs, aligned with a data grid. Zone IDs are the indices of the
+    features in the collection, and cells outside of every feature are -1. Features whose interiors overlap are burned
+    into separate layers, so that every zone gets all of its cells.
+    """
+
+    def __init__(self, feature_list, shape, affine):
+        self.features = list(feature_list)
+        self.shape = shape
+        self.affine = affine
+        self._zones_by_feature = {id(f): i for i, f in enumerate(self.features)}
+
+        # Assign each feature to the first layer without a feature it overlaps
+        index = FeatureIndex(self.features)
+        shapes_by_zone = {}
+        layers_by_zone = {}
+        layer_shapes = []
+        for feature, feature_shape in zip(index.features, index.shapes):
+            zone = self._zones_by_feature[id(feature)]
+            taken = set()
+            for other in index.query_bbox(*feature_shape.bounds):
+                other_zone = self._zones_by_feature[id(other)]
+                if other_zone in layers_by_zone and feature_shape.relate_pattern(
+                        shapes_by_zone[other_zone], 'T********'):
+                    taken.add(layers_by_zone[other_zone])
+
+            layer = min(set(range(len(taken) + 1)) - taken)
+            if layer == len(layer_shapes):
+                layer_shapes.append([])
+            layer_shapes[layer].append((feature_shape, zone))
+            shapes_by_zone[zone] = feature_shape
+            layers_by_zone[zone] = layer
+
+        self.layers = [
+            features.rasterize(shapes, out_shape=shape, transform=affine, fill=-1, dtype=numpy.int32)
+            for shapes in layer_shapes
+        ] or [numpy.full(shape, -1, dtype=numpy.int32)]
+
+    @property
+    def zones(self):
+        """ The zone ID of each cell in the first layer, which holds every zone unless features overlap. """
+
+        return self.layers[0]
+
+    @property
+    def num_zones(self):
+        return len(self.features)
+
+    def zone_of(self, feature):
+        """ Returns the zone ID of a feature from this collection """
+
+        return self._zones_by_feature[id(feature)]
+
+    def statistics(self, data, nodata=None):
+        """
+        Computes statistics for every zone at once. Returns a dict of arrays indexed by zone ID, with one array for each
+        name in STATISTICS. Zones without valid cells have a count of 0 and NaN for the other statistics.
+        """
+
+        assert data.shape == self.shape
+
+        values = numpy.ma.getdata(data).ravel().astype(numpy.float64)
+        valid = numpy.ones(values.shape, dtype=bool)
+        if nodata is not None:
+            valid &= values != nodata
+        mask = numpy.ma.getmask(data)
+        if mask is not numpy.ma.nomask:
+            valid &= ~mask.ravel()
+
+        # Each layer contributes its (zone, value) pairs, so a cell counts toward every zone containing it
+        zones = numpy.concatenate([layer.ravel() for layer in self.layers])
+        if len(self.layers) > 1:
+            values = numpy.tile(values, len(self.layers))
+            valid = numpy.tile(valid, len(self.layers))
+        valid &= zones >= 0
+
+        zones = zones[valid]
+        values = values[valid]
+        n = self.num_zones
+
+        count = numpy.bincount(zones, minlength=n)
+        has_data = count > 0
+        safe_count = numpy.where(has_data, count, 1)
+
+        total = numpy.bincount(zones, weights=values, minlength=n)
+        mean = numpy.where(has_data, total / safe_count, numpy.nan)
+        deviations = values - mean[zones]
+        variance = numpy.bincount(zones, weights=deviations ** 2, minlength=n) / safe_count
+        std = numpy.where(has_data, numpy.sqrt(variance), numpy.nan)
+
+        # Sort by zone, then value, so that each zone is a contiguous, sorted run
+        order = numpy.lexsort((values, zones))
+        values = values[order]
+        starts = numpy.concatenate(([0], numpy.cumsum(count)[:-1]))
+        last = numpy.where(has_data, starts + count - 1, 0)
+        first = numpy.where(has_data, starts, 0)
+        lower = numpy.where(has_data, starts + (count - 1) // 2, 0)
+        upper = numpy.where(has_data, starts + count // 2, 0)
+
+        if values.size:
+            minimum = numpy.where(has_data, values[first], numpy.nan)
+            maximum = numpy.where(has_data, values[last], numpy.nan)
+            median = numpy.where(has_data, (values[lower] + values[upper]) / 2, numpy.nan)
+        else:
+            minimum = maximum = median = numpy.full(n, numpy.nan)
+
+        return {
+            'count': count,
+            'sum': numpy.where(has_data, total, numpy.nan),
+            'mean': mean,
+            'min': minimum,
+            'max': maximum,
+            'std': std,
+            'median': median,
+            'range': maximum - minimum
+        }
+
+
+def zone_statistics(statistics, zone):
+    """ Returns the statistics for a single zone as a dict, with None for statistics the zone doesn't have. """
+
+    result = {}
+    for name, values in statistics.items():
+        value = values[zone]
+        if name == 'count':
+            result[name] = int(value)
+        else:
+            result[name] = None if numpy.isnan(value) else float(value)
+    return result
+
+
+class ZonalStatistics:
+    """
+    A zonal statistics engine. Zone rasters are built once per feature layer and data grid and cached, and statistics
+    are computed for all zones at once, so that whole zone x time tables can be produced by streaming timesteps.
+    """
+
+    max_cached_rasters = 8
+
+    def __init__(self):
+        self._zone_rasters = OrderedDict()
+
+    def zone_raster(self, feature_data, shape, affine) -> ZoneRaster:
+        """
+        Returns the zone raster for a feature data plugin and grid, building it if needed. Rasters are cached by the
+        plugin's spatial index, so that the features returned by its queries are the features of the zone raster.
+        """
+
+        spatial_index = feature_data.spatial_index
+        key = (spatial_index, tuple(shape), tuple(affine)[:6])
+        zone_raster = self._zone_rasters.get(key)
+
+        if zone_raster is None:
+            zone_raster = ZoneRaster(spatial_index.features, shape, affine)
+            self._zone_rasters[key] = zone_raster
+            if len(self._zone_rasters) > self.max_cached_rasters:
+                self._zone_rasters.popitem(last=False)
+        else:
+            self._zone_rasters.move_to_end(key)
+
+        return zone_raster
+
+    def statistics(self, feature_data, raster_data, variable, date=None):
+        """ Computes statistics for every zone of the feature data over a raster at a given time. """
+
+        grid = raster_data.get_data(variable, date)
+        zone_raster = self.zone_raster(feature_data, grid.shape, raster_data.affine)
+        nodata = raster_data.variable_stats(variable).nodata_value
+        return zone_raster, zone_raster.statistics(grid, nodata)
+
+    def time_series(self, feature_data, raster_data, variable, statistic='mean', dates=None, task=None):
+        """
+        Computes a statistic for every zone at every timestep. Returns a (zones x timesteps) array, with rows in
+        feature collection order and columns in the order of the dates, which default to the raster timestamps.
+        """
+
+        assert statistic in STATISTICS
+
+        if dates is None:
+            time_info = raster_data.time_info
+            dates = time_info.timestamps if time_info is not None and time_info.is_temporal else [None]
+
+        if task:
+            task.progress = 0
+            task.target = len(dates)
+
+        table = None
+        for i, date in enumerate(dates):
+            if task and task.should_stop:
+                break
+
+            zone_raster, stats = self.statistics(feature_data, raster_data, variable, date)
+            if table is None:
+                table = numpy.full((zone_raster.num_zones, len(dates)), numpy.nan)
+            table[:, i] = stats[statistic]
+
+            if task:
+                task.inc_progress()
+
+        return table
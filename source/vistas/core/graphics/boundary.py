@@ -0,0 +1,58 @@
+import numpy
+
+
+def boundary_texture_shape(grid_shape, texels_per_cell, max_size):
+    """
+    Returns the (height, width) of a boundary overlay texture for a grid, using up to texels_per_cell texels per cell
+    for small grids. Neither side exceeds max_size, and both are multiples of 4 to keep RGB rows 4-byte aligned.
+    """
+
+    grid_height, grid_width = grid_shape
+    scale = max(1, min(texels_per_cell, max_size // max(grid_height, grid_width)))
+    return tuple(min(-(-x * scale // 4) * 4, max_size) for x in (grid_height, grid_width))
+
+
+def selection_box(cell, grid_shape, texture_shape):
+    """
+    Returns the (x, y, width, height) of the box around a selected grid cell in a boundary image, or None if cell is
+    (-1, -1). Image rows run bottom to top, while grid rows run top to bottom. The box is widened to 4-texel columns,
+    so that its RGB rows stay 4-byte aligned when it is uploaded on its own.
+    """
+
+    if tuple(cell) == (-1, -1):
+        return None
+
+    texture_h, texture_w = texture_shape
+    grid_height, grid_width = grid_shape
+    box_w, box_h = texture_w / grid_width, texture_h / grid_height
+    center = (
+        int(cell[0] / grid_width * texture_w),
+        int(texture_h - (cell[1] + 1) / grid_height * texture_h)
+    )
+
+    min_x = min(max(center[0] - box_w / 2, 0), texture_w - 2)
+    max_x = min(max(center[0] + box_w / 2, min_x + 1), texture_w - 1)
+    min_y = min(max(center[1] - box_h / 2, 0), texture_h - 2)
+    max_y = min(max(center[1] + box_h / 2, min_y + 1), texture_h - 1)
+
+    min_x, max_x = round(min_x) // 4 * 4, min(-(-round(max_x) // 4) * 4, texture_w)
+    min_y, max_y = round(min_y), round(max_y)
+    return min_x, min_y, max_x - min_x, max_y - min_y
+
+
+def draw_selection(image_data, boundary_layer, old_rect, new_rect):
+    """
+    Restores the boundary layer (or blank texels, if it is None) under the old selection box of an RGB boundary image,
+    and draws the new box. Returns the rects which changed and need to be uploaded.
+    """
+
+    rects = []
+    if old_rect is not None:
+        x, y, w, h = old_rect
+        image_data[y:y+h, x:x+w, 0] = 255 if boundary_layer is None else boundary_layer[y:y+h, x:x+w]
+        rects.append(old_rect)
+    if new_rect is not None:
+        x, y, w, h = new_rect
+        image_data[y:y+h, x:x+w, 0] = 0
+        rects.append(new_rect)
+    return rects
@@ -63,6 +63,7 @@ class BoundingBoxHelper(Object3D):
         ], dtype=GLfloat)
 
     def render(self, color, camera):
+        self.geometry.upload()
         self.shader.pre_render(camera)
         self.shader.uniform3fv("color", 1, color.rgb.rgb_list)
         glBindVertexArray(self.geometry.vertex_array_object)
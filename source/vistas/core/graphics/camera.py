@@ -4,12 +4,13 @@ from PIL import Image
 from pyrr import Matrix44, Vector3, Vector4
 
 from vistas.core.color import RGBColor
-from vistas.core.graphics.overlay import Overlay
+from vistas.core.graphics.geometry import UploadStats
 from vistas.core.graphics.raycaster import Raycaster
 from vistas.core.graphics.scene import Scene
 from vistas.core.graphics.select import BoxSelect, PolySelect
 from vistas.core.observers.camera import CameraObservable
 from vistas.core.observers.interface import Observer
+from vistas.core.threading import Thread
 
 
 class Camera(Observer):
@@ -134,7 +135,10 @@ class Camera(Observer):
     def distance_to_object(self, obj):
         return abs((obj.bounding_box.center - self.get_position()).length)
 
-    def render(self, width, height, overlay: Overlay=None):
+    def render(self, width, height, overlay=None):
+        # Without the UI, updates synced by worker threads are applied here, where the context is current
+        Thread.run_synced()
+
         if self.selection_view:
             self.reset(width, height, RGBColor(1, 1, 1, 1))
         else:
@@ -154,6 +158,8 @@ class Camera(Observer):
             if overlay:
                 overlay.render(width, height)
 
+        UploadStats.app().end_frame()
+
     def render_to_bitmap(self, width, height):
         if not Camera.offscreen_buffers_initialized:
             Camera.offscreen_frame_buffer = glGenFramebuffers(1)
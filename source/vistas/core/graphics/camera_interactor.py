@@ -4,7 +4,7 @@ import numpy
 from pyrr import Matrix44, Vector3
 
 from vistas.core.graphics.camera import Camera
-from vistas.ui.utils import post_redisplay
+from vistas.core.utils import post_redisplay
 
 
 class CameraInteractor:
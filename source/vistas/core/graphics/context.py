@@ -0,0 +1,163 @@
+import ctypes
+import os
+import sys
+
+BACKENDS = ('egl', 'osmesa')
+
+EGL_PLATFORM_SURFACELESS_MESA = 0x31DD   # From EGL_MESA_platform_surfaceless, which PyOpenGL doesn't define
+
+
+def use_headless(backend='egl'):
+    """
+    Selects the PyOpenGL platform of a headless backend. PyOpenGL chooses its platform when OpenGL is first imported, so
+    this must be called before any graphics module is imported.
+    """
+
+    if backend not in BACKENDS:
+        raise ValueError('Unknown headless backend: {}'.format(backend))
+
+    if 'OpenGL.GL' in sys.modules and os.environ.get('PYOPENGL_PLATFORM') != backend:
+        raise RuntimeError('OpenGL was imported before the {} backend was selected'.format(backend))
+
+    os.environ['PYOPENGL_PLATFORM'] = backend
+
+
+class HeadlessContext:
+    """
+    An OpenGL 3.3 core profile context which doesn't need a window or the UI toolkit, created with EGL or OSMesa. Both
+    run on Mesa's llvmpipe software rasterizer where there is no GPU, so scenes can be rendered on compute nodes. The
+    context's own surface is minimal; Camera.render_to_bitmap() renders into an offscreen framebuffer of any size.
+
+    Usage:
+        use_headless('egl')
+        ...
+        with HeadlessContext():
+            image = camera.render_to_bitmap(width, height)
+    """
+
+    def __init__(self, backend=None, width=1, height=1):
+        """
+        Constructor
+        :param backend: 'egl' or 'osmesa'. Defaults to the backend selected with use_headless(), or 'egl'.
+        """
+
+        backend = backend or os.environ.get('PYOPENGL_PLATFORM') or 'egl'
+        use_headless(backend)
+
+        self.backend = backend
+        self.width = width
+        self.height = height
+
+        self._display = None
+        self._surface = None
+        self._context = None
+        self._buffer = None
+
+        if backend == 'egl':
+            self._create_egl()
+        else:
+            self._create_osmesa()
+
+        self.make_current()
+
+    def __enter__(self):
+        self.make_current()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.dispose()
+
+    def _create_egl(self):
+        from OpenGL import EGL
+
+        def attribs(*values):
+            return (EGL.EGLint * (len(values) + 1))(*values, EGL.EGL_NONE)
+
+        self._display = self._get_egl_display()
+        major, minor = EGL.EGLint(), EGL.EGLint()
+        if not EGL.eglInitialize(self._display, ctypes.pointer(major), ctypes.pointer(minor)):
+            raise RuntimeError('Could not initialize EGL')
+
+        config = EGL.EGLConfig()
+        num_configs = EGL.EGLint()
+        config_attribs = attribs(
+            EGL.EGL_SURFACE_TYPE, EGL.EGL_PBUFFER_BIT, EGL.EGL_RENDERABLE_TYPE, EGL.EGL_OPENGL_BIT,
+            EGL.EGL_RED_SIZE, 8, EGL.EGL_GREEN_SIZE, 8, EGL.EGL_BLUE_SIZE, 8, EGL.EGL_ALPHA_SIZE, 8,
+            EGL.EGL_DEPTH_SIZE, 24
+        )
+        if not EGL.eglChooseConfig(self._display, config_attribs, ctypes.pointer(config), 1,
+                                   ctypes.pointer(num_configs)) or not num_configs.value:
+            raise RuntimeError('No EGL config supports offscreen OpenGL rendering')
+
+        self._surface = EGL.eglCreatePbufferSurface(
+            self._display, config, attribs(EGL.EGL_WIDTH, self.width, EGL.EGL_HEIGHT, self.height)
+        )
+
+        EGL.eglBindAPI(EGL.EGL_OPENGL_API)
+        self._context = EGL.eglCreateContext(self._display, config, EGL.EGL_NO_CONTEXT, attribs(
+            EGL.EGL_CONTEXT_MAJOR_VERSION, 3, EGL.EGL_CONTEXT_MINOR_VERSION, 3,
+            EGL.EGL_CONTEXT_OPENGL_PROFILE_MASK, EGL.EGL_CONTEXT_OPENGL_CORE_PROFILE_BIT
+        ))
+        if not self._context:
+            raise RuntimeError('Could not create an OpenGL 3.3 context with EGL')
+
+    @staticmethod
+    def _get_egl_display():
+        """
+        The default EGL display needs a window system. Without one, Mesa's surfaceless platform is used, which renders
+        with the GPU if there is one, or with llvmpipe.
+        """
+
+        from OpenGL import EGL
+        from OpenGL.EGL.EXT.platform_base import eglGetPlatformDisplayEXT
+
+        if os.environ.get('DISPLAY') or os.environ.get('WAYLAND_DISPLAY'):
+            return EGL.eglGetDisplay(EGL.EGL_DEFAULT_DISPLAY)
+
+        return eglGetPlatformDisplayEXT(EGL_PLATFORM_SURFACELESS_MESA, EGL.EGL_DEFAULT_DISPLAY, None)
+
+    def _create_osmesa(self):
+        import numpy
+        from OpenGL import GL, osmesa
+
+        self._context = osmesa.OSMesaCreateContextAttribs([
+            osmesa.OSMESA_FORMAT, osmesa.OSMESA_RGBA, osmesa.OSMESA_DEPTH_BITS, 24,
+            osmesa.OSMESA_PROFILE, osmesa.OSMESA_CORE_PROFILE,
+            osmesa.OSMESA_CONTEXT_MAJOR_VERSION, 3, osmesa.OSMESA_CONTEXT_MINOR_VERSION, 3, 0
+        ], None)
+        if not self._context:
+            raise RuntimeError('Could not create an OpenGL 3.3 context with OSMesa')
+
+        self._buffer = numpy.zeros((self.height, self.width, 4), dtype=numpy.uint8)
+        self._gl_unsigned_byte = GL.GL_UNSIGNED_BYTE
+
+    def make_current(self):
+        if self.backend == 'egl':
+            from OpenGL import EGL
+
+            if not EGL.eglMakeCurrent(self._display, self._surface, self._surface, self._context):
+                raise RuntimeError('Could not make the EGL context current')
+        else:
+            from OpenGL import osmesa
+
+            if not osmesa.OSMesaMakeCurrent(
+                    self._context, self._buffer, self._gl_unsigned_byte, self.width, self.height):
+                raise RuntimeError('Could not make the OSMesa context current')
+
+    def dispose(self):
+        if self._context is None:
+            return
+
+        if self.backend == 'egl':
+            from OpenGL import EGL
+
+            EGL.eglMakeCurrent(self._display, EGL.EGL_NO_SURFACE, EGL.EGL_NO_SURFACE, EGL.EGL_NO_CONTEXT)
+            EGL.eglDestroyContext(self._display, self._context)
+            EGL.eglDestroySurface(self._display, self._surface)
+            EGL.eglTerminate(self._display)
+        else:
+            from OpenGL import osmesa
+
+            osmesa.OSMesaDestroyContext(self._context)
+
+        self._context = None
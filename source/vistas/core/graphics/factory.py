@@ -2,18 +2,18 @@ import mercantile
 
 from vistas.core.bounds import union_bboxs
 from vistas.core.graphics.bounding_box import BoundingBoxHelper
+from vistas.core.graphics.mesh_cache import MeshSetCache
 from vistas.core.graphics.object import Object3D
 from vistas.core.task import Task
 from vistas.core.threading import Thread
-from vistas.ui.utils import post_redisplay
+from vistas.core.utils import post_redisplay
 
 
-def use_event_loop(func):
-    """ Wraps a Thread run function to ensure an event loop is started and refreshes the UI when compeleted. """
+def run_as_task(func):
+    """ Wraps a Thread run function to track its task and refresh the UI when completed. """
     def decorator(*args, **kwargs):
         self = args[0]
         self.task.status = Task.RUNNING
-        self.init_event_loop()
         func(*args, **kwargs)
         self.sync_with_main(post_redisplay)
         self.task.status = Task.COMPLETE
@@ -42,6 +42,7 @@ class MeshFactory(Object3D):
     def __init__(self):
         super().__init__()
         self.items = []     # List[Mesh]
+        self.worker = None
         self.bbox_helper = BoundingBoxHelper(self)
 
     def update(self):
@@ -50,7 +51,14 @@ class MeshFactory(Object3D):
     def build(self):
         """ Signal that work needs to be done. """
 
-        self.worker_class(self).start()
+        self.worker = self.worker_class(self)
+        self.worker.start()
+
+    @property
+    def is_built(self):
+        """ Whether the last build has completed """
+
+        return self.worker is not None and self.worker.task.complete
 
     def dispose(self):
         """ Dispose of all current meshes. """
@@ -81,11 +89,12 @@ class MeshFactory(Object3D):
 class MapMeshFactory(MeshFactory):
     """ A MeshFactory that is geospatially referenced. """
 
-    def __init__(self, extent, shader, plugin=None, initial_zoom=10):
+    def __init__(self, extent, shader, plugin=None, initial_zoom=10, tile_source=None):
         super().__init__()
         self.shader = shader
         self.plugin = plugin
         self.extent = extent
+        self.tile_source = tile_source  # Elevation source, or None for the application default
         self._zoom = None
         self.tiles = []
         self._ul = None
@@ -99,16 +108,65 @@ class MapMeshFactory(MeshFactory):
     @zoom.setter
     def zoom(self, zoom):
         if zoom != self._zoom:
+            if self._zoom is not None:
+                self.cache_meshes()
+
             self._zoom = zoom
             self.tiles = self.extent.tiles(self.zoom)
             self._ul = self.tiles[0]
             self._br = self.tiles[-1]
 
-            # Destroy these meshes
+            # Restore the meshes of this zoom if they were cached, otherwise build new meshes
+            cached = MeshSetCache.app().pop(id(self), zoom)
+            if cached is not None:
+                self.worker, mesh_set = cached     # The worker which built the meshes, so is_built holds
+                self.restore_mesh_set(mesh_set)
+                self.update()
+                post_redisplay()
+            else:
+                self.build()
+
+    def cache_meshes(self):
+        """ Moves the meshes of the current zoom to the mesh cache, or disposes of them if they aren't complete. """
+
+        mesh_set = self.take_mesh_set() if self.is_built else None
+        if mesh_set is None:
             self.dispose()
+        else:
+            MeshSetCache.app().put(
+                id(self), self._zoom, (self.worker, mesh_set), self.mesh_set_nbytes(mesh_set),
+                lambda cached: self.dispose_mesh_set(cached[1])
+            )
+
+    def take_mesh_set(self):
+        """
+        Returns the state needed to restore the current meshes, and removes them from the factory without disposing of
+        them. Returns None if the meshes can't be cached.
+        """
+
+        mesh_set = self.items
+        self.items = []
+        return mesh_set
+
+    def restore_mesh_set(self, mesh_set):
+        self.items = mesh_set
+
+    def mesh_set_nbytes(self, mesh_set):
+        return sum(x.geometry.nbytes for x in mesh_set)
+
+    def dispose_mesh_set(self, mesh_set):
+        for obj in mesh_set:
+            obj.geometry.dispose()
+
+    def clear_cached_meshes(self):
+        """ Disposes of the meshes cached for other zooms """
+
+        MeshSetCache.app().discard(id(self))
+
+    def close(self):
+        """ Releases the resources used to build meshes, once the factory is disposed of and won't be used again. """
 
-            # Now build new meshes
-            self.build()
+        pass
 
     @property
     def mercator_bounds(self):
@@ -1,15 +1,10 @@
-import os
-from functools import partial
-
 import numpy
 import pyproj
-import shapely.geometry as shp
-from shapely.ops import transform
-from triangle import triangulate
 
 from vistas.core.color import RGBColor
 from vistas.core.gis.elevation import ElevationService, TILE_SIZE, meters_per_px
-from vistas.core.graphics.factory import MapMeshFactory, MeshFactoryWorker, use_event_loop
+from vistas.core.gis.triangulation import TRIANGULATION_PARAMS, TriangulationCache, triangulate_features
+from vistas.core.graphics.factory import MapMeshFactory, MeshFactoryWorker, run_as_task
 from vistas.core.graphics.feature.geometry import FeatureGeometry
 from vistas.core.graphics.feature.shader import FeatureShaderProgram
 from vistas.core.graphics.mesh import Mesh
@@ -20,19 +15,23 @@ class FeatureFactoryWorker(MeshFactoryWorker):
 
     task_name = "Building Features"
 
-    @use_event_loop
+    @run_as_task
     def run(self):
-        verts, indices, normals, colors = [None] * 4
+        zoom = self.factory.zoom
+        verts, indices, normals, features, colors = [None] * 5
         if self.factory.needs_vertices and not self.task.should_stop:
-            verts, indices, normals = self.factory.generate_meshes(self.task)
-            self.factory.needs_vertices = False
+            verts, indices, normals, features = self.factory.generate_meshes(self.task)
+            self.factory.needs_vertices = verts is None
 
         if self.factory.needs_color and not self.task.should_stop:
             colors = self.factory.generate_colors(self.task)
-            self.factory.needs_color = False
+            self.factory.needs_color = colors is None
 
         self.sync_with_main(
-            self.factory.update_features, kwargs=dict(vertices=verts, indices=indices, normals=normals, colors=colors),
+            self.factory.update_features,
+            kwargs=dict(
+                vertices=verts, indices=indices, normals=normals, features=features, colors=colors, zoom=zoom
+            ),
             block=True
         )
 
@@ -42,9 +41,14 @@ class FeatureFactory(MapMeshFactory):
 
     worker_class = FeatureFactoryWorker
 
-    def __init__(self, extent, data_src: FeatureDataPlugin, shader=None, plugin=None, initial_zoom=10):
-        super().__init__(extent, shader or FeatureShaderProgram(), plugin, initial_zoom)
+    simplify_pixels = 0.5   # Features are simplified by up to this many pixels at the zoom they're built for
+
+    def __init__(self, extent, data_src: FeatureDataPlugin, shader=None, plugin=None, initial_zoom=10,
+                 tile_source=None):
+        super().__init__(extent, shader or FeatureShaderProgram(), plugin, initial_zoom, tile_source)
         self._color_func = None
+        self._color_classifier = None
+        self._column_values = {}    # Values of the attribute columns used by color classifiers
         self._render_thread = None
 
         if not isinstance(data_src, FeatureDataPlugin):
@@ -52,33 +56,51 @@ class FeatureFactory(MapMeshFactory):
         self.data_src = data_src
 
         self.use_cache = self.data_src is not None
-        if self.use_cache:
-            ext = '.{}'.format(self.data_src.path.split('.')[-1])
-            self._cache = self.data_src.path.replace(ext, '.ttt')
-            self._npz_path = self._cache + '.npz'
-
-        self.offsets = None
+        self.triangle_features = None   # Index of the feature of each triangle of the current mesh
         self.needs_vertices = True
         self.needs_color = False
+        self._colors = None     # Color of each feature
+        self._colors_version = 0    # Incremented when colors are updated, to refresh the colors of cached meshes
 
-    @property
-    def zoom(self):
-        return self._zoom
-
-    @zoom.setter
+    @MapMeshFactory.zoom.setter
     def zoom(self, zoom):
         if zoom != self._zoom:
-            self._zoom = zoom
             self.needs_vertices = True
-            tiles = self.extent.tiles(self.zoom)
-            self._ul = tiles[0]
-            self._br = tiles[-1]
-            self.build()
+            MapMeshFactory.zoom.fset(self, zoom)
+
+    def take_mesh_set(self):
+        return super().take_mesh_set(), self.triangle_features, self._colors_version
+
+    def restore_mesh_set(self, mesh_set):
+        items, self.triangle_features, colors_version = mesh_set
+        super().restore_mesh_set(items)
+        self.needs_vertices = False
+
+        # Feature colors are the same for every zoom, so colors updated since the meshes were cached can be applied
+        if self.items and colors_version != self._colors_version and self._colors is not None:
+            self.items[0].geometry.colors = self.vertex_colors()
+
+    def mesh_set_nbytes(self, mesh_set):
+        return super().mesh_set_nbytes(mesh_set[0])
+
+    def dispose_mesh_set(self, mesh_set):
+        super().dispose_mesh_set(mesh_set[0])
+
+    def update_features(self, vertices=None, indices=None, normals=None, features=None, colors=None, zoom=None):
+        if zoom is not None and zoom != self.zoom:
+            vertices = indices = normals = features = None     # The zoom changed while the vertices were being built
 
-    def update_features(self, vertices=None, indices=None, normals=None, colors=None):
         # Update geometry information
-        if all(x is not None for x in (vertices, indices, normals)):
+        created = False
+        if all(x is not None for x in (vertices, indices, normals, features)):
+            self.triangle_features = features
+
+            # Simplification changes the number of vertices, which needs new buffers
+            if self.items and self.items[0].geometry.num_vertices != len(indices):
+                self.dispose()
+
             if not self.items:
+                created = True
                 num_indices = num_vertices = len(indices)
                 geometry = FeatureGeometry(num_indices, num_vertices, indices=indices, vertices=vertices)
                 geometry.normals = normals
@@ -92,56 +114,69 @@ class FeatureFactory(MapMeshFactory):
                 geometry.compute_bounding_box()
                 mesh.update()
         # Update color buffer
-        if self.items and colors is not None:
-            self.items[0].geometry.colors = colors
+        if colors is not None:
+            self._colors = colors
+            self._colors_version += 1
+        if self.items and self._colors is not None and (created or colors is not None):
+            self.items[0].geometry.colors = self.vertex_colors()
         self.update()
 
+    def vertex_colors(self):
+        """ Expands the color of each feature to the vertices of its triangles """
+
+        return numpy.repeat(self._colors[self.triangle_features], 3, axis=0)
+
+    def feature_of_triangle(self, triangle):
+        """ Returns the index of the feature a triangle of the current mesh belongs to """
+
+        return int(self.triangle_features[triangle])
+
+    def simplify_tolerance(self, zoom):
+        """ Tolerance to simplify features with at a zoom, in web mercator meters """
+
+        return meters_per_px(zoom) * self.simplify_pixels
+
+    def cache_key(self, zoom):
+        """ Key of the triangulation of the features at a zoom in the TriangulationCache """
+
+        projection = '{} > EPSG:3857'.format(self.extent.projection.srs)   # Triangles are in web mercator
+        params = '{};simplify={:.6g}'.format(TRIANGULATION_PARAMS, self.simplify_tolerance(zoom))
+        return TriangulationCache.app().key(self.data_src.path, projection, params)
+
     def generate_meshes(self, task=None):
-        """ Generates polygon mesh vertices for a feature collection """
+        """
+        Generates polygon mesh vertices for a feature collection. Features are simplified to the current zoom, and
+        triangulations are cached per zoom. Returns the vertices, indices and normals of the mesh, and the index of the
+        feature of each triangle.
+        """
 
         mercator = pyproj.Proj(init='EPSG:3857')
         mbounds = self.mercator_bounds
+        zoom = self.zoom
 
         # Check if a cache for this feature exists
-        if self.use_cache and os.path.exists(self._npz_path):
+        cached = TriangulationCache.app().get(self.cache_key(zoom)) if self.use_cache else None
+        if cached is not None:
             if task:
                 task.status = task.INDETERMINATE
 
-            nfile = numpy.load(self._npz_path)
-            verts = nfile['verts']
+            verts, offsets, counts = cached    # Copy-on-write, so verts can be modified in place
 
         # Build it out
         else:
-            task.progress = 0
-            task.target = self.data_src.get_num_features()
-
-            project = partial(pyproj.transform, self.extent.projection, mercator)   # Our projection method
-
-            tris = []
-            offsets = []
-            offset = 0
-            for feature in self.data_src.get_features():
-                shape = transform(project, shp.shape(feature['geometry']))
-                if task:
-                    task.inc_progress()
-
-                if isinstance(shape, shp.Polygon):
-                    polys = [list(shape.exterior.coords)[:-1]]
-                elif isinstance(shape, shp.MultiPolygon):
-                    polys = [list(p.exterior.coords)[:-1] for p in shape]
-                else:
-                    raise ValueError("Can't render non polygons!")
-
-                for p in polys:
-                    triangulation = triangulate(dict(vertices=numpy.array(p)))
-                    t = triangulation.get('vertices')[triangulation.get('triangles')].reshape(-1, 2)
-                    offset += t.size
-                    tris.append(t)
+            if task:
+                task.progress = 0
+                task.target = self.data_src.get_num_features()
 
-                offsets.append(offset)
+            transformer = pyproj.Transformer.from_proj(self.extent.projection, mercator, always_xy=True)
+            result = triangulate_features(
+                self.data_src.get_features(), transformer, task, tolerance=self.simplify_tolerance(zoom)
+            )
+            if result is None:
+                return None, None, None, None   # Cancelled
 
-            triangles = numpy.concatenate(tris)
-            offsets = numpy.array(offsets)
+            triangles, counts = result
+            offsets = numpy.cumsum(counts) * 2     # Offsets are in coordinates, two per vertex
 
             # Make room for elevation info
             xs = triangles[:, 0]
@@ -151,7 +186,7 @@ class FeatureFactory(MapMeshFactory):
 
             # cache the vertices
             if self.use_cache:
-                numpy.savez(self._cache, verts=verts, offsets=offsets)
+                TriangulationCache.app().put(self.cache_key(zoom), verts, offsets, counts)
 
         # Translate vertices to scene coordinates
         # Scale vertices according to current mercator_bounds
@@ -159,26 +194,25 @@ class FeatureFactory(MapMeshFactory):
         verts[:, 0] = (1 - (verts[:, 0] - mbounds.bottom) / (mbounds.top - mbounds.bottom))
 
         # Get data DEM to sample elevation from.
-        e = ElevationService()
-        dem = e.create_data_dem(self.extent, self.zoom, merge=True)
+        e = ElevationService(source=self.tile_source)
+        dem = e.create_data_dem(self.extent, zoom, merge=True)
         dheight, dwidth = dem.shape
 
         # Index into current DEM and assign heights
         us = numpy.floor(verts[:, 1] * dwidth).astype(int)
         vs = numpy.floor(verts[:, 0] * dheight).astype(int)
-        verts[:, 2] = dem[vs, us].ravel() / meters_per_px(self.zoom)
+        verts[:, 2] = dem[vs, us].ravel() / meters_per_px(zoom)
 
         # Scale vertices based on tile size
         verts[:, 0] *= (self._br.y - self._ul.y + 1) * TILE_SIZE
         verts[:, 1] *= (self._br.x - self._ul.x + 1) * TILE_SIZE
 
-        normals = e.create_data_dem(
-            self.extent, self.zoom, merge=True, src=ElevationService.AWS_NORMALS
-        )[vs, us].ravel()
+        normals = e.create_data_normals(dem, zoom)[vs, us].ravel()
 
         # Vertex indices are assumed to be unique
         indices = numpy.arange(verts.shape[0])
-        return verts, indices, normals
+        features = numpy.repeat(numpy.arange(len(counts)), numpy.asarray(counts) // 3)
+        return verts, indices, normals, features
 
     @staticmethod
     def _default_color_function(feature, data):
@@ -191,14 +225,48 @@ class FeatureFactory(MapMeshFactory):
         return RGBColor(0.5, 0.5, 0.5)
 
     def set_color_function(self, func):
+        """ Colors features one at a time with func(feature, data), which returns an RGBColor. """
+
         self._color_func = func
+        self._color_classifier = None
+
+    def set_color_classifier(self, column, classifier):
+        """
+        Colors features from an attribute column. classifier maps an array of the values of the column to an (n, 3)
+        array of RGB colors, so the colors of all features are computed at once. Replaces any color function.
+        """
+
+        self._color_classifier = (column, classifier)
+        self._color_func = None
 
     def generate_colors(self, task=None):
-        """ Generates a color buffer for the feature collection """
+        """
+        Generates the color of each feature, which is expanded to the vertices of the current mesh. Returns None if the
+        task is stopped.
+        """
+
+        if self._color_classifier is not None:
+            column, classifier = self._color_classifier
+            return numpy.asarray(classifier(self.get_column_values(column)), dtype=numpy.float32)
+
+        return self._feature_colors(task)
+
+    def get_column_values(self, column):
+        """
+        Returns the values of an attribute column of the features. Columns are read from the data source once and
+        cached, since the base attributes don't change while the factory exists. The returned array is read-only.
+        """
+
+        values = self._column_values.get(column)
+        if values is None:
+            values = self.data_src.get_values(column)
+            values.flags.writeable = False
+            self._column_values[column] = values
+        return values
+
+    def _feature_colors(self, task=None):
+        """ Colors features one at a time with the color function. Returns None if the task is stopped. """
 
-        # Color indices are stored in the cache
-        if self.offsets is None:
-            self.offsets = numpy.load(self._npz_path)['offsets']
         color_func = self._color_func
         if not color_func:
             color_func = self._default_color_function
@@ -211,24 +279,12 @@ class FeatureFactory(MapMeshFactory):
         # We use a mutable data structure that is limited to this thread's scope and can be mutated
         # based on color_func's scope. This allows multiple color threads to occur without locking.
         mutable_color_data = {}
-        for i, feature in enumerate(self.data_src.get_features()):
-            if i == 0:
-                left = 0
-            else:
-                left = self.offsets[i - 1]
-            right = self.offsets[i]
-
+        for feature in self.data_src.get_features():
             if task:
                 if task.should_stop:
-                    break
+                    return None
                 task.inc_progress()
 
-            num_vertices = (right - left) // 2
-            color = numpy.array(color_func(feature, mutable_color_data).rgb.rgb_list, dtype=numpy.float32)
-            for v in range(num_vertices):
-                colors.append(color)
-        colors = numpy.stack(colors)
-
-        return colors
-
+            colors.append(color_func(feature, mutable_color_data).rgb.rgb_list)
 
+        return numpy.array(colors, dtype=numpy.float32).reshape((-1, 3))
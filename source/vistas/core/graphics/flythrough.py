@@ -4,7 +4,7 @@ from pyrr import Vector3
 
 from vistas.core.graphics.camera import Camera
 from vistas.core.math import catmull_rom_splines
-from vistas.ui.utils import post_redisplay
+from vistas.core.utils import post_redisplay
 
 
 class FlythroughPoint:
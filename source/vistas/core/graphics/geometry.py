@@ -6,11 +6,51 @@ from pyrr import Vector3
 from pyrr.vector3 import generate_vertex_normals
 
 from vistas.core.bounds import BoundingBox
-from vistas.core.graphics.utils import map_buffer
+
+
+class UploadStats:
+    """ Counts the bytes uploaded to GPU buffers, per frame and in total. """
+
+    _app_stats = None
+
+    @classmethod
+    def app(cls):
+        """ Application upload counters """
+
+        if cls._app_stats is None:
+            cls._app_stats = UploadStats()
+
+        return cls._app_stats
+
+    def __init__(self):
+        self.frame_bytes = 0        # Bytes uploaded so far in the current frame
+        self.frame_uploads = 0
+        self.last_frame_bytes = 0   # Bytes uploaded in the last complete frame
+        self.last_frame_uploads = 0
+        self.total_bytes = 0
+        self.frames = 0
+
+    def add(self, nbytes):
+        self.frame_bytes += nbytes
+        self.frame_uploads += 1
+        self.total_bytes += nbytes
+
+    def end_frame(self):
+        self.last_frame_bytes = self.frame_bytes
+        self.last_frame_uploads = self.frame_uploads
+        self.frame_bytes = self.frame_uploads = 0
+        self.frames += 1
 
 
 class Geometry:
-    """ Base geometry class for 3D objects. Provides ability to specify vertex, normal, and color array buffers. """
+    """
+    Base geometry class for 3D objects. Provides ability to specify vertex, normal, and color array buffers.
+
+    Each buffer has a client-side copy, which is the source of truth; buffers are never read back. Setting an attribute
+    or marking a range of its copy as changed with mark_dirty() only records a dirty range, and upload() writes the
+    dirty range of each buffer with a single glBufferSubData before the geometry is drawn. Several updates between
+    draws are coalesced into one upload.
+    """
 
     POINTS = GL_POINTS
     LINE_STRIP = GL_LINE_STRIP
@@ -46,6 +86,7 @@ class Geometry:
         self._normals = None
         self._texcoords = None
         self._colors = None
+        self._dirty = {}    # Attribute name -> (start, stop) range of elements which need to be uploaded
 
         glBindVertexArray(self.vertex_array_object)
 
@@ -103,80 +144,106 @@ class Geometry:
         glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
         glBindVertexArray(0)
 
+    # Attribute name -> (buffer attribute, client copy attribute, dtype)
+    buffers = {
+        'indices': ('index_buffer', '_indices', numpy.uint32),
+        'vertices': ('vertex_buffer', '_vertices', numpy.float32),
+        'normals': ('normal_buffer', '_normals', numpy.float32),
+        'texcoords': ('texcoords_buffer', '_texcoords', numpy.float32),
+        'colors': ('color_buffer', '_colors', numpy.float32)
+    }
+
+    def set_data(self, name, data):
+        """ Replaces the client-side copy of an attribute, and marks it to be uploaded. """
+
+        _, attr, dtype = self.buffers[name]
+        data = numpy.ascontiguousarray(data, dtype=dtype).ravel()
+        setattr(self, attr, data)
+        self.mark_dirty(name, 0, data.size)
+
+    def mark_dirty(self, name, start=0, stop=None):
+        """
+        Marks the [start, stop) range of elements of the client-side copy of an attribute as changed, for the copy to be
+        modified in place. Dirty ranges are merged, and uploaded by upload().
+        """
+
+        if stop is None:
+            stop = getattr(self, self.buffers[name][1]).size
+        if name in self._dirty:
+            dirty_start, dirty_stop = self._dirty[name]
+            start, stop = min(start, dirty_start), max(stop, dirty_stop)
+        self._dirty[name] = (start, stop)
+
+    def upload(self):
+        """ Uploads the dirty ranges of all buffers. Must be called with the GL context current, before drawing. """
+
+        if not self._dirty:
+            return
+
+        stats = UploadStats.app()
+        for name, (start, stop) in self._dirty.items():
+            buffer_attr, attr, _ = self.buffers[name]
+            data = getattr(self, attr)[start:stop]
+
+            # The copy write target is used so that the element buffer binding of a vertex array isn't changed
+            glBindBuffer(GL_COPY_WRITE_BUFFER, getattr(self, buffer_attr))
+            glBufferSubData(GL_COPY_WRITE_BUFFER, start * data.itemsize, data.nbytes, data)
+            stats.add(data.nbytes)
+
+        glBindBuffer(GL_COPY_WRITE_BUFFER, 0)
+        self._dirty.clear()
+
     @property
     def indices(self):
-        if self._indices is None and self.has_index_array:
-            index_buf = self.acquire_index_array(GL_READ_ONLY)
-            self._indices = index_buf[:]
-            self.release_index_array()
         return self._indices
 
     @indices.setter
     def indices(self, indices):
-        self._indices = indices.ravel()
-        index_buf = self.acquire_index_array()
-        index_buf[:] = self._indices
-        self.release_index_array()
+        self.set_data('indices', indices)
 
     @property
     def vertices(self):
-        if self._vertices is None and self.has_vertex_array:
-            vert_buf = self.acquire_vertex_array(GL_READ_ONLY)
-            self._vertices = vert_buf[:]
-            self.release_vertex_array()
         return self._vertices
 
     @vertices.setter
     def vertices(self, verts):
-        self._vertices = verts.ravel()
-        vert_buf = self.acquire_vertex_array()
-        vert_buf[:] = self._vertices
-        self.release_vertex_array()
+        self.set_data('vertices', verts)
 
     @property
     def normals(self):
-        if self._normals is None and self.has_normal_array:
-            norm_buf = self.acquire_normal_array(GL_READ_ONLY)
-            self._normals = norm_buf[:]
-            self.release_normal_array()
         return self._normals
 
     @normals.setter
     def normals(self, norms):
-        self._normals = norms.ravel()
-        norm_buf = self.acquire_normal_array()
-        norm_buf[:] = self._normals
-        self.release_normal_array()
+        self.set_data('normals', norms)
 
     @property
     def texcoords(self):
-        if self._texcoords is None and self.has_texture_coords:
-            uvs = self.acquire_texcoords_array(GL_READ_ONLY)
-            self._texcoords = uvs[:]
-            self.release_texcoords_array()
         return self._texcoords
 
     @texcoords.setter
     def texcoords(self, texcoords):
-        self._texcoords = texcoords.ravel()
-        uvs = self.acquire_texcoords_array()
-        uvs[:] = self._texcoords
-        self.release_texcoords_array()
+        self.set_data('texcoords', texcoords)
 
     @property
     def colors(self):
-        if self._colors is None and self.has_color_array:
-            colors = self.acquire_color_array(GL_READ_ONLY)
-            self._colors = colors[:]
-            self.release_color_array()
         return self._colors
 
     @colors.setter
     def colors(self, colors):
-        self._colors = colors.ravel()
-        color_buf = self.acquire_color_array()
-        color_buf[:] = self._colors
-        self.release_color_array()
+        self.set_data('colors', colors)
+
+    @property
+    def nbytes(self):
+        """ Approximate memory used by this geometry's buffers and their client-side copies. """
+
+        floats_per_vertex = 3 * self.has_vertex_array + 3 * self.has_normal_array + 2 * self.has_texture_coords
+        if self.has_color_array:
+            floats_per_vertex += 4 if self.use_rgba else 3
+
+        gpu = self.num_vertices * floats_per_vertex * sizeof(GLfloat) + self.num_indices * sizeof(c_uint)
+        client = (self._indices, self._vertices, self._normals, self._texcoords, self._colors)
+        return gpu + sum(x.nbytes for x in client if x is not None)
 
     def compute_bounding_box(self):
         """ Compute the BoundingBox for this geometry directly from the vertex data. """
@@ -220,53 +287,7 @@ class Geometry:
             glDeleteBuffers(1, [self.texcoords_buffer])
 
         glDeleteVertexArrays(1, [self.vertex_array_object])
-
-    def acquire_index_array(self, access=GL_WRITE_ONLY):
-        """ Note: Mesh.release_index_array() must be called once the buffer is no longer needed """
-
-        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.index_buffer)
-        return map_buffer(GL_ELEMENT_ARRAY_BUFFER, numpy.uint32, access, self.num_indices * sizeof(c_uint))
-
-    def acquire_vertex_array(self, access=GL_WRITE_ONLY):
-        """ Note: Mesh.release_vertex_array() must be called once the buffer is no longer needed """
-
-        glBindBuffer(GL_ARRAY_BUFFER, self.vertex_buffer)
-        return map_buffer(GL_ARRAY_BUFFER, numpy.float32, access, self.num_vertices * 3 * sizeof(GLfloat))
-
-    def acquire_normal_array(self, access=GL_WRITE_ONLY):
-        """ Note: Mesh.release_normal_array() must be called once the buffer is no longer needed """
-
-        glBindBuffer(GL_ARRAY_BUFFER, self.normal_buffer)
-        return map_buffer(GL_ARRAY_BUFFER, numpy.float32, access, self.num_vertices * 3 * sizeof(GLfloat))
-
-    def acquire_color_array(self, access=GL_WRITE_ONLY):
-        """ Note: Mesh.release_color_array() must be called once the buffer is no longer needed """
-
-        size = 4 if self.use_rgba else 3
-
-        glBindBuffer(GL_ARRAY_BUFFER, self.color_buffer)
-        return map_buffer(GL_ARRAY_BUFFER, numpy.float32, access, self.num_vertices * size * sizeof(GLfloat))
-
-    def acquire_texcoords_array(self, access=GL_WRITE_ONLY):
-        glBindBuffer(GL_ARRAY_BUFFER, self.texcoords_buffer)
-        return map_buffer(GL_ARRAY_BUFFER, numpy.float32, access, self.num_vertices * 2 * sizeof(GLfloat))
-
-    def release_index_array(self):
-        glUnmapBuffer(GL_ELEMENT_ARRAY_BUFFER)
-        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
-
-    def release_normal_array(self):
-        glUnmapBuffer(GL_ARRAY_BUFFER)
-        glBindBuffer(GL_ARRAY_BUFFER, 0)
-
-    def release_color_array(self):
-        self.release_normal_array()
-
-    def release_vertex_array(self):
-        self.release_normal_array()
-
-    def release_texcoords_array(self):
-        self.release_normal_array()
+        self._dirty.clear()
 
 
 class InstancedGeometry(Geometry):
@@ -280,6 +301,8 @@ class InstancedGeometry(Geometry):
 
     DEFAULT_LOCATION = 4    # layout(location = DEFAULT_LOCATION) in <type> <name>;
 
+    buffers = dict(Geometry.buffers, instance_data=('instance_buffer', '_instance_data', numpy.float32))
+
     def __init__(self, max_instances=0, instance_buffer_spec=None, *args, **kwargs):
         """
         Constructor
@@ -343,27 +366,13 @@ class InstancedGeometry(Geometry):
         super().dispose()
         glDeleteBuffers(1, [self.instance_buffer])
 
-    def acquire_instance_array(self, access=GL_WRITE_ONLY):
-        glBindBuffer(GL_ARRAY_BUFFER, self.instance_buffer)
-        return map_buffer(
-            GL_ARRAY_BUFFER, numpy.float32, access, self.max_instances * self.instance_buffer_size * sizeof(GLfloat)
-        )
-
-    def release_instance_array(self):
-        glUnmapBuffer(GL_ARRAY_BUFFER)
-        glBindBuffer(GL_ARRAY_BUFFER, 0)
-
     @property
     def instance_data(self):
-        if self._instance_data is None:
-            instance_buf = self.acquire_instance_array(GL_READ_ONLY)
-            self._instance_data = instance_buf[:]
-            self.release_instance_array()
         return self._instance_data
 
     @instance_data.setter
     def instance_data(self, data):
-        self._instance_data = data.ravel()
-        instance_buf = self.acquire_instance_array()
-        instance_buf[:] = self._instance_data
-        self.release_instance_array()
+        """ Instance data may cover fewer than max_instances, in which case only the leading instances are written. """
+
+        assert data.size <= self.max_instances * self.instance_buffer_size
+        self.set_data('instance_data', data)
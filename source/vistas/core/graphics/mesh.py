@@ -7,6 +7,7 @@ from vistas.core.color import RGBColor
 from vistas.core.graphics.bounding_box import BoundingBoxHelper
 from vistas.core.graphics.geometry import Geometry, InstancedGeometry
 from vistas.core.graphics.object import Object3D, Face, Intersection
+from vistas.core.graphics.plane import plane_indices
 from vistas.core.math import Triangle, distance_from
 from vistas.core.plugins.visualization import VisualizationPlugin3D
 
@@ -113,20 +114,11 @@ class Mesh(Object3D):
             height, width, _ = grid.shape
             grid = grid.reshape(-1, 3)
 
-            index_array = []
-            for j in range(height - 1):
-                for i in range(width - 1):
-                    a = i + width * j
-                    b = i + width * (j + 1)
-                    c = (i + 1) + width * (j + 1)
-                    d = (i + 1) + width * j
-                    index_array += [a, b, d]
-                    index_array += [b, c, d]
-
-            if not index_array:
+            index_array = plane_indices(width, height)
+            if not index_array.size:
                 return intersects
 
-            index_array = numpy.array(index_array).reshape(-1, 3)
+            index_array = index_array.reshape(-1, 3)
             v1, v2, v3 = numpy.rollaxis(grid[index_array], axis=-2)
 
         # Otherwise, use all triangles
@@ -156,6 +148,7 @@ class Mesh(Object3D):
             camera.push_matrix()
             camera.matrix *= Matrix44.from_translation(self.position)
 
+            self.geometry.upload()
             self.shader.pre_render(camera)
             glBindVertexArray(self.geometry.vertex_array_object)
             glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.geometry.index_buffer)
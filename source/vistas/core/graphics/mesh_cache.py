@@ -0,0 +1,93 @@
+from collections import OrderedDict
+
+
+class MeshSetCache:
+    """
+    An LRU cache of mesh sets built by MapMeshFactories for zooms which aren't currently shown, so that switching back
+    to a zoom doesn't rebuild it. A mesh set is whatever state a factory needs to restore its meshes; the cache only
+    tracks its size in bytes, and disposes of it through a callback when it's evicted. The cache is kept within a
+    memory budget shared by all factories.
+    """
+
+    default_budget = 512 * 1024 ** 2    # 512 MB
+
+    _app_cache = None
+
+    @classmethod
+    def app(cls):
+        """ Application mesh set cache, shared by all factories """
+
+        if cls._app_cache is None:
+            # Imported here so that the cache can be used without the UI toolkit
+            from vistas.core.preferences import Preferences
+
+            cls._app_cache = MeshSetCache(Preferences.app().get('mesh_cache_budget', cls.default_budget))
+
+        return cls._app_cache
+
+    def __init__(self, budget=default_budget):
+        self._budget = budget
+        self._entries = OrderedDict()   # (owner, zoom) -> (mesh_set, nbytes, dispose)
+        self._size = 0
+
+    @property
+    def budget(self):
+        return self._budget
+
+    @budget.setter
+    def budget(self, budget):
+        self._budget = budget
+        self.evict()
+
+    @property
+    def size(self):
+        """ Total size in bytes of the cached mesh sets """
+
+        return self._size
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def put(self, owner, zoom, mesh_set, nbytes, dispose):
+        """
+        Adds a mesh set, replacing any existing set for the same owner and zoom, and evicts the least recently used sets
+        if the cache is over budget. dispose(mesh_set) is called when the set is evicted.
+        """
+
+        self.discard(owner, zoom)
+        self._entries[(owner, zoom)] = (mesh_set, nbytes, dispose)
+        self._size += nbytes
+        self.evict()
+
+    def pop(self, owner, zoom):
+        """ Removes and returns a mesh set, or returns None if there isn't one. The caller takes ownership of it. """
+
+        entry = self._entries.pop((owner, zoom), None)
+        if entry is None:
+            return None
+
+        self._size -= entry[1]
+        return entry[0]
+
+    def discard(self, owner, zoom=None):
+        """ Disposes of the mesh set of an owner at a zoom, or of all of its mesh sets if zoom is None. """
+
+        keys = [key for key in self._entries if key[0] == owner and (zoom is None or key[1] == zoom)]
+        for key in keys:
+            self._dispose(key)
+
+    def evict(self):
+        while self._size > self._budget and self._entries:
+            self._dispose(next(iter(self._entries)))
+
+    def clear(self):
+        for key in list(self._entries):
+            self._dispose(key)
+
+    def _dispose(self, key):
+        mesh_set, nbytes, dispose = self._entries.pop(key)
+        self._size -= nbytes
+        dispose(mesh_set)
@@ -131,6 +131,7 @@ class Overlay:
         glEnable(GL_BLEND)
         glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
 
+        self.geometry.upload()
         glUseProgram(self.shader.program)
         glBindVertexArray(self.geometry.vertex_array_object)
         glActiveTexture(GL_TEXTURE0)
@@ -1,8 +1,36 @@
-from numpy import indices, flipud, zeros, float32, array
+from functools import lru_cache
+
+from numpy import indices, flipud, zeros, float32, uint32, arange, stack
 
 from vistas.core.graphics.geometry import Geometry
 
 
+@lru_cache(maxsize=16)
+def plane_indices(width, height):
+    """
+    Triangle indices for a grid of width x height vertices, two triangles per cell. The result is cached and shared,
+    so it is read-only.
+    """
+
+    a = (arange(width - 1)[None, :] + width * arange(height - 1)[:, None]).ravel().astype(uint32)
+    b = a + width
+    c = b + 1
+    d = a + 1
+    index_array = stack((a, b, d, b, c, d), axis=1).ravel()
+    index_array.flags.writeable = False
+    return index_array
+
+
+def plane_vertices(width, height, cellsize):
+    """ Vertices for a flat grid of width x height vertices, as a (height, width, 3) array. """
+
+    vertices = zeros((height, width, 3), dtype=float32)
+    idx = indices((height, width))
+    vertices[:, :, 0] = idx[0] * cellsize
+    vertices[:, :, 1] = idx[1] * cellsize
+    return vertices
+
+
 class PlaneGeometry(Geometry):
     """ A flat plane geometry with normals and texture coordinates for use with Textures. """
 
@@ -16,27 +44,12 @@ class PlaneGeometry(Geometry):
         self.width = width
         self.height = height
 
-        vertices = zeros((height, width, 3), dtype=float32)
         idx = indices((height, width))
-        vertices[:, :, 0] = idx[0] * cellsize
-        vertices[:, :, 1] = idx[1] * cellsize
-
-        index_array = []
-        for j in range(height - 1):
-            for i in range(width - 1):
-                a = i + width * j
-                b = i + width * (j + 1)
-                c = (i + 1) + width * (j + 1)
-                d = (i + 1) + width * j
-                index_array += [a, b, d]
-                index_array += [b, c, d]
-        index_array = array(index_array)
-
         tex_coords = zeros((height, width, 2))
         tex_coords[:, :, 0] = idx[1] / width                # u   (0,1) --- (1,1)  UV coords origin is Cartesian
         tex_coords[:, :, 1] = flipud(idx[0] / height)       # v   (0,0) --- (1,0)
-        self.vertices = vertices
-        self.indices = index_array
+        self.vertices = plane_vertices(width, height, cellsize)
+        self.indices = plane_indices(width, height)
         self.texcoords = tex_coords
         self.compute_normals()
         self.compute_bounding_box()
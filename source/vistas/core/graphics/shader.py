@@ -2,17 +2,23 @@ import logging
 import os
 
 import numpy
-import wx
 from OpenGL.GL import *
 from pyrr import Matrix33, Matrix44
 
-from vistas.ui.utils import post_redisplay
+from vistas.core.utils import has_ui, post_redisplay
+
+try:
+    import wx
+except ImportError:
+    wx = None
 
 logger = logging.getLogger(__name__)
 
 
-class ShaderProgram(wx.PyEvtHandler):
-    """ Base shader program implementation. Programs are recompiled when .glsl files are modified. """
+class ShaderProgram(wx.PyEvtHandler if wx is not None else object):
+    """
+    Base shader program implementation. While the UI is running, programs are recompiled when .glsl files are modified.
+    """
 
     def __init__(self):
         self.program = -1
@@ -20,15 +26,18 @@ class ShaderProgram(wx.PyEvtHandler):
         self.shaders = {}
         self.file_infos = {}
 
-        self.timer = wx.Timer()
-        self.timer.Bind(wx.EVT_TIMER, self.on_notify)
+        self.timer = None
+        if has_ui():
+            self.timer = wx.Timer()
+            self.timer.Bind(wx.EVT_TIMER, self.on_notify)
 
     def attach_shader(self, path, type):
         if not os.path.exists(path):
             return False
 
         self.file_infos[type] = (path, os.path.getmtime(path))
-        self.timer.Start(100, True)
+        if self.timer is not None:
+            self.timer.Start(100, True)
 
         with open(path) as f:
             return self.attach_shader_source(f.read(), type)
@@ -1,3 +1,3 @@
-from .geometry import TerrainGeometry, TerrainColorGeometry, TerrainTileGeometry
+from .geometry import TerrainGeometry, TerrainColorGeometry, TerrainTileGeometry, TerrainTileBatchGeometry
 from .shader import TerrainShaderProgram, TerrainColorShaderProgram, TerrainTileShaderProgram
-from .factory import TerrainTileFactory
+from .factory import TerrainTileFactory, StreamingTerrainFactory
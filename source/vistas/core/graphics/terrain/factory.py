@@ -1,86 +1,375 @@
-from mercantile import Tile
-from numpy import arange
+import logging
+import queue
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy
+from OpenGL.GL import *
+from pyproj import Proj
 from pyrr import Vector3
 
 from vistas.core.gis.elevation import ElevationService, TILE_SIZE, meters_per_px
-from vistas.core.graphics.factory import MapMeshFactory, MeshFactoryWorker, use_event_loop
+from vistas.core.gis.quadtree import TileQuadtree
+from vistas.core.graphics.factory import MapMeshFactory, MeshFactoryWorker, run_as_task
 from vistas.core.graphics.mesh import Mesh
-from vistas.core.graphics.terrain.geometry import TerrainTileGeometry
+from vistas.core.graphics.terrain.geometry import TerrainTileGeometry, TerrainTileBatchGeometry
 from vistas.core.graphics.terrain.shader import TerrainTileShaderProgram
+from vistas.core.preferences import Preferences
+from vistas.core.utils import post_redisplay
+
+logger = logging.getLogger(__name__)
+
+
+def stitch_tile_seams(mosaic, available=None, tile_size=TILE_SIZE):
+    """
+    Stitches the seams of a merged tile grid in place. Tile meshes share their edge vertices with their neighbors, so
+    the first row and column of each tile are replaced with the last row and column of the tile before it. available
+    is an optional (rows, columns) boolean grid of the tiles in the mosaic; edges are only copied from available tiles,
+    and tiles after a missing tile keep their own edge.
+    """
+
+    if available is None:
+        mosaic[:, tile_size::tile_size] = mosaic[:, tile_size - 1:-1:tile_size]
+        mosaic[tile_size::tile_size, :] = mosaic[tile_size - 1:-1:tile_size, :]
+        return mosaic
+
+    available = numpy.asarray(available, dtype=bool)
+    rows_available = numpy.repeat(available, tile_size, axis=0)
+    for column in range(1, available.shape[1]):
+        source = rows_available[:, column - 1]
+        mosaic[source, column * tile_size] = mosaic[source, column * tile_size - 1]
+
+    columns_available = numpy.repeat(available, tile_size, axis=1)
+    for row in range(1, available.shape[0]):
+        source = columns_available[row - 1]
+        mosaic[row * tile_size, source] = mosaic[row * tile_size - 1, source]
+    return mosaic
 
 
 class TerrainTileWorker(MeshFactoryWorker):
 
     task_name = "Building Terrain"
 
-    @use_event_loop
+    @run_as_task
     def run(self):
-        grids = ElevationService().create_data_dem(self.factory.extent, self.factory.zoom)
-        for tile in self.factory.tiles:
-            if tile not in grids:       # Race condition
-                return
-            data = grids[tile]
-            data /= meters_per_px(tile.z)
+        tiles = self.factory.tiles
+        zoom = self.factory.zoom
+        ul = tiles[0]
+
+        service = ElevationService(source=self.factory.tile_source)
+        dem = service.create_data_dem(self.factory.extent, zoom, merge=True)
+
+        # Tiles that couldn't be fetched are zeros in the DEM, so their neighbors aren't stitched to them
+        available = numpy.zeros((dem.shape[0] // TILE_SIZE, dem.shape[1] // TILE_SIZE), dtype=bool)
+        for tile in tiles:
+            available[tile.y - ul.y, tile.x - ul.x] = service.has_tile(tile.x, tile.y, tile.z)
+        dem = stitch_tile_seams(dem, available) / meters_per_px(zoom)
+
+        for tile in tiles:
+            if not available[tile.y - ul.y, tile.x - ul.x]:    # The tile couldn't be fetched
+                continue
+            h = (tile.y - ul.y) * TILE_SIZE
+            w = (tile.x - ul.x) * TILE_SIZE
+            data = dem[h: h + TILE_SIZE, w: w + TILE_SIZE].copy()
             self.sync_with_main(self.factory.add_tile, (tile, data), block=True)
             self.task.inc_progress()
-        self.sync_with_main(self.factory.resolve_seams, block=True)
 
 
 class TerrainTileFactory(MapMeshFactory):
-    """ A MapMeshFactory for generating terrain from an ElevationSource. """
+    """
+    A MapMeshFactory for generating terrain from a TileSource. Tiles are packed into one TerrainTileBatchGeometry and
+    drawn together, while a Mesh is kept for each tile for raycasting and bounds.
+    """
 
     worker_class = TerrainTileWorker
 
-    def __init__(self, extent, shader=None, plugin=None, initial_zoom=10):
+    def __init__(self, extent, shader=None, plugin=None, initial_zoom=10, tile_source=None):
         if shader is None:
             shader = TerrainTileShaderProgram()
-        super().__init__(extent, shader, plugin, initial_zoom)
+        self.tile_meshes = {}   # Meshes keyed by (x, y, z)
+        self.tile_slots = {}    # Batch slots keyed by (x, y, z)
+        self.batch = None
+        super().__init__(extent, shader, plugin, initial_zoom, tile_source)
 
     def add_tile(self, tile, heights):
-        tile_mesh = Mesh(TerrainTileGeometry(tile, heights), self.shader, plugin=self.plugin)
+        """ Adds a mesh for a tile. Heights should already be stitched to the neighboring tiles. """
+
+        if tile.z != self.zoom:     # The zoom changed while the tile was being built
+            return
+
+        if self.batch is None:
+            self.batch = TerrainTileBatchGeometry(len(self.tiles))
         right = (tile.y - self._ul.y) * (TILE_SIZE - 1)
         down = (tile.x - self._ul.x) * (TILE_SIZE - 1)
-        tile_mesh.position = Vector3([right, down, 0.0])
+        self._add_tile_mesh(tile, heights, len(self.tile_slots), (right, down))
+
+    def _add_tile_mesh(self, tile, heights, slot, position, cellsize=1, skirt_depth=0.0):
+        """ Creates the mesh of a tile at a scene (x, y) position, and uploads its vertices to a slot of the batch. """
+
+        geometry = TerrainTileGeometry(tile, heights, cellsize)
+        tile_mesh = Mesh(geometry, self.shader, plugin=self.plugin)
+        tile_mesh.position = Vector3([*position, 0.0])
         tile_mesh.update()
+
+        # Tiles share the batch, so their vertices are stored in scene coordinates
+        vertices = geometry.vertices.reshape((-1, 3)) + [*position, 0.0]
+        self.batch.set_tile(slot, vertices, geometry.normals, skirt_depth)
+
+        key = (tile.x, tile.y, tile.z)
         self.items.append(tile_mesh)
+        self.tile_meshes[key] = tile_mesh
+        self.tile_slots[key] = slot
         self.update()
 
-    def resolve_seams(self):
-        tile_indices = arange(TILE_SIZE ** 2)
-        left_indices = tile_indices[::TILE_SIZE]
-        bottom_indices = tile_indices[TILE_SIZE**2 - TILE_SIZE:]
-        right_indices = tile_indices[TILE_SIZE - 1::TILE_SIZE]
-        top_indices = tile_indices[:TILE_SIZE]
-
-        for mesh in self.items:
-            geometry = mesh.geometry
-            t = geometry.tile
-
-            left = Tile(t.x - 1, t.y, t.z)
-            bottom = Tile(t.x, t.y + 1, t.x)
-            right = Tile(t.x + 1, t.y, t.z)
-            top = Tile(t.x, t.y - 1, t.z)
-
-            neighborhood = [x.geometry for x in self.items if x.geometry.tile in (left, bottom, right, top)]
-            if neighborhood:
-                heights = geometry.heights.ravel()
-                for neighbor in neighborhood:
-                    ntile = neighbor.tile
-                    if ntile == left:
-                        indices = left_indices
-                        neighbor_indices = right_indices
-                    elif ntile == bottom:
-                        indices = bottom_indices
-                        neighbor_indices = top_indices
-                    elif ntile == right:
-                        indices = right_indices
-                        neighbor_indices = left_indices
-                    elif ntile == top:
-                        indices = top_indices
-                        neighbor_indices = bottom_indices
-                    else:
-                        raise ValueError("Neighbor is not a neighbor!")
-                    neighbor_heights = neighbor.heights.ravel()
-                    heights[indices] = neighbor_heights[neighbor_indices]
-
-                geometry.heights = heights.reshape((TILE_SIZE, TILE_SIZE))
+    def render(self, camera):
+        if self.batch is None:
+            return
+
+        self._draw_slots(camera, [self.tile_slots[key] for key, mesh in self.tile_meshes.items() if mesh.visible])
+
+    def _draw_slots(self, camera, slots):
+        if not slots:
+            return
+
+        self.batch.upload()
+        self.shader.pre_render(camera)
+        glBindVertexArray(self.batch.vertex_array_object)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, self.batch.index_buffer)
+        self.batch.draw(slots)
+        glBindVertexArray(0)
+        glBindBuffer(GL_ELEMENT_ARRAY_BUFFER, 0)
+        self.shader.post_render(camera)
+
+    def take_mesh_set(self):
+        mesh_set = (super().take_mesh_set(), self.tile_meshes, self.tile_slots, self.batch)
+        self.tile_meshes = {}
+        self.tile_slots = {}
+        self.batch = None
+        return mesh_set
+
+    def restore_mesh_set(self, mesh_set):
+        items, self.tile_meshes, self.tile_slots, self.batch = mesh_set
+        super().restore_mesh_set(items)
+
+    def mesh_set_nbytes(self, mesh_set):
+        items, _, _, batch = mesh_set
+        return super().mesh_set_nbytes(items) + (batch.nbytes if batch is not None else 0)
+
+    def dispose_mesh_set(self, mesh_set):
+        items, _, _, batch = mesh_set
+        super().dispose_mesh_set(items)
+        if batch is not None:
+            batch.dispose()
+
+    def dispose(self):
+        super().dispose()
+        self.tile_meshes.clear()
+        self.tile_slots.clear()
+        if self.batch is not None:
+            self.batch.dispose()
+            self.batch = None
+
+
+class StreamingTerrainFactory(TerrainTileFactory):
+    """
+    A TerrainTileFactory which streams tiles at a zoom chosen for each part of the view. A TileQuadtree is refined where
+    the camera is close and coarsened where it is far, and culled to the view frustum. Tiles are loaded in the
+    background and kept resident within a GPU memory budget, least recently drawn tiles being unloaded first; until a
+    tile is loaded, its parent is drawn in its place. The zoom of the factory only sets the scene frame, which is shared
+    with other layers such as a FeatureFactory.
+    """
+
+    default_gpu_budget = 256 * 1024 ** 2    # 256 MB of vertex data
+    max_pixel_error = 2.0                   # Refine tiles whose cells are larger than this many pixels on screen
+    uploads_per_frame = 8
+    load_threads = 4
+    skirt_cells = 8                         # Depth of tile skirts, in cells of the tile
+
+    def __init__(self, extent, shader=None, plugin=None, initial_zoom=10, tile_source=None, gpu_budget=None):
+        if gpu_budget is None:
+            gpu_budget = Preferences.app().get('terrain_gpu_budget', self.default_gpu_budget)
+        self.gpu_budget = gpu_budget
+        self.quadtree = None
+        self._executor = ThreadPoolExecutor(self.load_threads)
+        self._ready = queue.Queue()     # Loaded (generation, tile, heights), waiting to be uploaded
+        self._generation = 0            # Incremented when the factory is disposed, so that stale loads are ignored
+        self._pending = set()
+        self._futures = set()           # Loads which haven't finished
+        self._failed = set()
+        self._free_slots = []
+        self._last_drawn = {}
+        self._frame = 0
+        self._z_range = None
+        self.service = ElevationService(source=tile_source)
+        super().__init__(extent, shader, plugin, initial_zoom, tile_source)
+
+    @property
+    def tile_bytes(self):
+        """ GPU memory used by a tile: vertices and normals, including skirts """
+
+        return (TILE_SIZE * TILE_SIZE + 4 * TILE_SIZE) * 3 * 4 * 2
+
+    def build(self):
+        self.quadtree = TileQuadtree(self.extent_bounds, self.zoom, max(self.service.source.max_zoom, self.zoom))
+
+        capacity = max(self.gpu_budget // self.tile_bytes, 4 * TileQuadtree.max_roots)
+        self.batch = TerrainTileBatchGeometry(capacity, skirts=True)
+        self._free_slots = list(range(capacity - 1, -1, -1))
+
+    @property
+    def extent_bounds(self):
+        return self.extent.project(Proj(init='EPSG:4326')).as_list()
+
+    def take_mesh_set(self):
+        """ Streamed tiles depend on the view and fill the GPU budget, so they aren't cached. """
+
+        return None
+
+    def is_loaded(self, tile):
+        return tile in self.tile_meshes
+
+    def load_heights(self, tile):
+        """
+        Returns the heights of a tile in scene units. The first row and column are taken from the neighboring tiles
+        before it, so that neighboring tiles of the same zoom share their edges, as stitch_tile_seams() does.
+        """
+
+        x, y, z = tile
+        heights = numpy.array(self.service.get_grid(x, y, z), dtype=numpy.float32)
+
+        def neighbor(nx, ny):
+            try:
+                return self.service.get_grid(nx, ny, z)
+            except Exception:
+                return None     # Keep the tile's own edge
+
+        if x > 0:
+            left = neighbor(x - 1, y)
+            if left is not None:
+                heights[:, 0] = left[:, -1]
+        if y > 0:
+            above = neighbor(x, y - 1)
+            if above is not None:
+                heights[0, :] = above[-1, :]
+        if x > 0 and y > 0:
+            above_left = neighbor(x - 1, y - 1)
+            if above_left is not None:
+                heights[0, 0] = above_left[-1, -1]
+
+        return heights / meters_per_px(self.zoom)
+
+    def _load(self, tile, generation):
+        try:
+            heights = self.load_heights(tile)
+        except Exception as e:
+            logger.warning('Could not load terrain tile {}: {}'.format(tuple(tile), e))
+            heights = None
+
+        self._ready.put((generation, tile, heights))
+        post_redisplay()
+
+    def _request(self, tiles):
+        """ Starts loading tiles, as long as there are slots to upload them to. """
+
+        evictable = sum(1 for frame in self._last_drawn.values() if frame < self._frame - 1)
+        available = len(self._free_slots) + evictable - len(self._pending)
+
+        for tile in tiles:
+            if available <= 0:
+                break
+            if tile in self._pending or tile in self._failed:
+                continue
+            self._pending.add(tile)
+            future = self._executor.submit(self._load, tile, self._generation)
+            self._futures.add(future)
+            future.add_done_callback(self._futures.discard)
+            available -= 1
+
+    def _upload_ready(self):
+        """ Uploads loaded tiles to the batch, unloading the least recently drawn tiles if the budget is full. """
+
+        for _ in range(self.uploads_per_frame):
+            try:
+                generation, tile, heights = self._ready.get_nowait()
+            except queue.Empty:
+                return
+
+            if generation != self._generation:
+                continue
+
+            self._pending.discard(tile)
+            if heights is None:
+                self._failed.add(tile)
+                continue
+
+            if not self._free_slots and not self._evict():
+                continue    # Everything resident is in view; the tile will be requested again
+
+            z_min, z_max = float(heights.min()), float(heights.max())
+            if self._z_range is None:
+                self._z_range = (z_min, z_max)
+            else:
+                self._z_range = (min(self._z_range[0], z_min), max(self._z_range[1], z_max))
+
+            cellsize = self.quadtree.cellsize(tile)
+            self._add_tile_mesh(
+                tile, heights, self._free_slots.pop(), self.quadtree.offset(tile), cellsize,
+                self.skirt_cells * cellsize
+            )
+            self._last_drawn[tile] = self._frame
+
+        if not self._ready.empty():
+            post_redisplay()
+
+    def _evict(self):
+        """ Unloads the least recently drawn tile which wasn't drawn in the last frame. Returns whether one was. """
+
+        candidates = [(frame, tile) for tile, frame in self._last_drawn.items() if frame < self._frame - 1]
+        if not candidates:
+            return False
+
+        tile = min(candidates)[1]
+        del self._last_drawn[tile]
+        tile_mesh = self.tile_meshes.pop(tile)
+        tile_mesh.bbox_helper.geometry.dispose()
+        self.items.remove(tile_mesh)
+        self._free_slots.append(self.tile_slots.pop(tile))
+        return True
+
+    def render(self, camera):
+        if self.quadtree is None:
+            return
+
+        self._frame += 1
+        self._upload_ready()
+
+        viewport_height = glGetIntegerv(GL_VIEWPORT)[3]
+        pixel_scale = viewport_height * camera.proj_matrix[1][1] / 2
+        view_projection = numpy.dot(numpy.array(camera.matrix), numpy.array(camera.proj_matrix))
+
+        z_range = (0.0, 0.0) if self._z_range is None else self._z_range
+        z_range = tuple(z * self.shader.height_factor for z in z_range)
+        draw, requests = self.quadtree.select(
+            camera.get_position(), view_projection, pixel_scale, self.is_loaded, z_range, self.max_pixel_error
+        )
+
+        self._request(requests)
+        for tile in draw:
+            self._last_drawn[tile] = self._frame
+        self._draw_slots(camera, [self.tile_slots[tile] for tile in draw])
+
+    def dispose(self):
+        self._generation += 1
+        self._pending.clear()
+        self._failed.clear()
+        self._last_drawn.clear()
+        self._z_range = None
+        self.quadtree = None
+        super().dispose()
+
+    def close(self):
+        """ Cancels the loads which haven't started, and shuts down the load threads without waiting for them. """
+
+        self._generation += 1
+        for future in list(self._futures):
+            future.cancel()
+        self._executor.shutdown(wait=False)
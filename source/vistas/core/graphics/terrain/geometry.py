@@ -1,8 +1,14 @@
+from ctypes import c_void_p
+
 import mercantile
-from vistas.core.gis.elevation import meters_per_px, TILE_SIZE
+import numpy
 from OpenGL.GL import *
-from vistas.core.graphics.plane import PlaneGeometry
-from vistas.core.graphics.utils import map_buffer
+
+from vistas.core.bounds import BoundingBox
+from vistas.core.gis.elevation import TILE_SIZE, normals_from_heights
+from vistas.core.graphics.geometry import Geometry, UploadStats
+from vistas.core.graphics.plane import PlaneGeometry, plane_indices, plane_vertices
+from vistas.core.graphics.texture import Texture
 
 
 class TerrainGeometry(PlaneGeometry):
@@ -20,77 +26,160 @@ class TerrainGeometry(PlaneGeometry):
 
     @heights.setter
     def heights(self, heights):
-        """ A 2D array of terrain heights, usually created from source data. """
+        """
+        A 2D array of terrain heights, usually created from source data. Heights are updated in place; x and y are
+        fixed by the grid, so only the z-component of the vertex copy is written before the buffer is uploaded.
+        """
 
         assert heights.shape == (self.height, self.width)
         self._heights = heights
-        verts = self.vertices.reshape((self.height, self.width, 3))
-        verts[:, :, 2] = heights
-        self.vertices = verts
+
+        self.vertices.reshape((-1, 3))[:, 2] = heights.ravel()
+        self.mark_dirty('vertices')
+
         self.compute_bounding_box()
         self.compute_normals()
 
+    def compute_bounding_box(self):
+        """ Computes the BoundingBox from the grid dimensions, so only the height range needs to be inspected. """
+
+        zs = self.vertices.reshape((-1, 3))[:, 2]
+        self.bounding_box = BoundingBox(
+            0, 0, float(zs.min()), (self.height - 1) * self.cellsize, (self.width - 1) * self.cellsize, float(zs.max())
+        )
+
+    def compute_normals(self):
+        """ Computes vertex normals from the gradient of the height grid. """
+
+        zs = self.vertices.reshape((self.height, self.width, 3))[:, :, 2]
+        self.normals = normals_from_heights(zs, self.cellsize)
+
 
 class TerrainColorGeometry(TerrainGeometry):
-    """ A TerrainGeometry with a float-wide vertex buffer for data. """
+    """
+    A TerrainGeometry with per-vertex data values. Values are stored either in a float-wide vertex buffer or, with
+    use_value_texture, in a float texture that is sampled by the terrain shader. Like the other buffers, the values have
+    a client-side copy which is never read back, and value updates only upload the rows that have changed.
+    """
+
+    buffers = dict(TerrainGeometry.buffers, values=('value_buffer', '_values', numpy.float32))
+
+    def __init__(self, width, height, cellsize, heights=None, values=None, value_size=1, use_value_texture=False):
+        """
+        Constructor
+        :param use_value_texture: Store values in a float texture instead of a vertex buffer.
+        """
 
-    def __init__(self, width, height, cellsize, heights=None, values=None, value_size=1):
         super().__init__(width, height, cellsize, heights)
 
         self._values = None
         self.value_size = value_size
+        self.use_value_texture = use_value_texture
+        self.value_buffer = None
+        self.value_texture = None
 
-        # Add a 'value' vertex buffer and bind it to this vertex_array_object
-        self.value_buffer = glGenBuffers(1)
-        glBindVertexArray(self.vertex_array_object)
-        glBindBuffer(GL_ARRAY_BUFFER, self.value_buffer)
-        glBufferData(GL_ARRAY_BUFFER, self.num_vertices * value_size * sizeof(GLfloat), None, GL_DYNAMIC_DRAW)
+        if self.use_value_texture:
+            assert value_size == 1
+            self.value_texture = Texture(
+                data=numpy.zeros((height, width), dtype=numpy.float32), width=width, height=height,
+                src_format=GL_R32F, gl_format=GL_RED, data_type=GL_FLOAT, tex_filter=GL_NEAREST
+            )
 
-        # Override location 3 to be 'value', since we are not using the 'color' array available from Geometry
-        glEnableVertexAttribArray(3)    # location 3 = 'value'
-        glVertexAttribPointer(3, self.value_size, GL_FLOAT, GL_FALSE, sizeof(GLfloat), None)
+        else:
+            # Add a 'value' vertex buffer and bind it to this vertex_array_object
+            self.value_buffer = glGenBuffers(1)
+            glBindVertexArray(self.vertex_array_object)
+            glBindBuffer(GL_ARRAY_BUFFER, self.value_buffer)
+            glBufferData(GL_ARRAY_BUFFER, self.num_vertices * value_size * sizeof(GLfloat), None, GL_DYNAMIC_DRAW)
 
-        glBindBuffer(GL_ARRAY_BUFFER, 0)
-        glBindVertexArray(0)
+            # Override location 3 to be 'value', since we are not using the 'color' array available from Geometry
+            glEnableVertexAttribArray(3)    # location 3 = 'value'
+            glVertexAttribPointer(3, self.value_size, GL_FLOAT, GL_FALSE, sizeof(GLfloat), None)
+
+            glBindBuffer(GL_ARRAY_BUFFER, 0)
+            glBindVertexArray(0)
 
         if values is not None:
             self.values = values
 
     def dispose(self):
         super().dispose()
-        glDeleteBuffers(1, [self.value_buffer])
+        if self.value_buffer is not None:
+            glDeleteBuffers(1, [self.value_buffer])
+        self.value_texture = None
 
-    def acquire_value_array(self, access=GL_WRITE_ONLY):
-        glBindBuffer(GL_ARRAY_BUFFER, self.value_buffer)
-        return map_buffer(GL_ARRAY_BUFFER, GLfloat, access, self.num_vertices * self.value_size * sizeof(GLfloat))
+    @property
+    def nbytes(self):
+        """ Includes the values, and the value buffer or texture they're uploaded to. """
 
-    def release_value_array(self):
-        glUnmapBuffer(GL_ARRAY_BUFFER)
-        glBindBuffer(GL_ARRAY_BUFFER, 0)
+        values = self.num_vertices * self.value_size * sizeof(GLfloat)
+        if self._values is not None:
+            values += self._values.nbytes
+        return super().nbytes + values
 
     @property
     def values(self):
-        if self._values is None:
-            values_buf = self.acquire_value_array(GL_READ_ONLY)
-            self._values = values_buf[:]
-            self.release_value_array()
         return self._values
 
     @values.setter
     def values(self, values):
+        self.update_values(values)
+
+    def update_values(self, values, rows=None):
+        """
+        Sets a new grid of values. Only the (start, stop) range of rows is uploaded. If rows is None, the range is
+        determined by comparison with the previous values. The value buffer is uploaded with the other buffers by
+        upload(), and the value texture is updated immediately.
+        """
+
         assert values.shape == (self.height, self.width)
-        self._values = values.ravel()
-        values_buf = self.acquire_value_array()
-        values_buf[:] = self._values
-        self.release_value_array()
+        values = numpy.asarray(values, dtype=numpy.float32)
+
+        if self._values is None:
+            self._values = numpy.empty(values.size, dtype=numpy.float32)
+            rows = (0, self.height)
+        elif rows is None:
+            rows = self._changed_rows(values)
+            if rows is None:
+                return      # Nothing to upload
 
+        start, stop = rows
+        grid = self._values.reshape((self.height, self.width))
+        grid[start:stop] = values[start:stop]
 
-class TerrainTileGeometry(TerrainGeometry):
-    """ TerrainGeometry that is derived from XYZ tiles. """
+        if self.use_value_texture:
+            self.value_texture.update(numpy.ascontiguousarray(grid[start:stop]), 0, start, self.width, stop - start)
+        else:
+            row_size = self.width * self.value_size
+            self.mark_dirty('values', start * row_size, stop * row_size)
 
-    def __init__(self, tile: mercantile.Tile, heights=None):
+    def _changed_rows(self, values):
+        """ Returns the (start, stop) range of rows which differ from the previous values, or None if none do. """
+
+        changed = numpy.flatnonzero(numpy.any(self._values.reshape((self.height, self.width)) != values, axis=1))
+        if not changed.size:
+            return None
+        return int(changed[0]), int(changed[-1]) + 1
+
+
+class TerrainTileGeometry:
+    """
+    CPU-side geometry of a terrain tile derived from XYZ tiles. Tiles are drawn from a TerrainTileBatchGeometry shared by
+    all tiles of a factory, so a tile geometry has no buffers of its own; it provides vertices and bounds for raycasting.
+    """
+
+    has_index_array = False
+    has_vertex_array = False
+
+    def __init__(self, tile: mercantile.Tile, heights=None, cellsize=1):
         self.tile = tile
-        super().__init__(TILE_SIZE, TILE_SIZE, 1)
+        self.width = self.height = TILE_SIZE
+        self.cellsize = cellsize
+        self.vertices = plane_vertices(TILE_SIZE, TILE_SIZE, self.cellsize).reshape(-1)
+        self.indices = plane_indices(TILE_SIZE, TILE_SIZE)
+        self.normals = None
+        self.bounding_box = None
+        self._heights = None
         if heights is not None:
             self.heights = heights
 
@@ -104,10 +193,103 @@ class TerrainTileGeometry(TerrainGeometry):
 
     @heights.setter
     def heights(self, heights):
-        assert heights.shape == (TILE_SIZE, TILE_SIZE)
+        assert heights.shape == (self.height, self.width)
         self._heights = heights
-        verts = self.vertices.reshape((self.height, self.width, 3))
-        verts[:, :, 2] = self._heights
-        self.vertices = verts
-        self.compute_bounding_box()
-        self.compute_normals()
+        self.vertices.reshape((-1, 3))[:, 2] = heights.ravel()
+        self.normals = normals_from_heights(heights, self.cellsize).ravel()
+        self.bounding_box = BoundingBox(
+            0, 0, float(heights.min()), (self.height - 1) * self.cellsize, (self.width - 1) * self.cellsize,
+            float(heights.max())
+        )
+
+    @property
+    def nbytes(self):
+        arrays = (self.vertices, self.normals, self._heights)
+        return sum(x.nbytes for x in arrays if x is not None)
+
+    def dispose(self):
+        pass
+
+
+def skirt_indices(size):
+    """
+    Triangle indices joining the edges of a size x size grid of vertices to a skirt of 4 * size vertices which follows
+    the grid: the first row, the last row, the first column and then the last column of the grid, lowered.
+    """
+
+    grid = numpy.arange(size * size, dtype=numpy.uint32).reshape((size, size))
+    triangles = []
+    for i, edge in enumerate((grid[0], grid[-1], grid[:, 0], grid[:, -1])):
+        skirt = numpy.arange(size, dtype=numpy.uint32) + size * (size + i)
+        triangles.append(
+            numpy.stack((edge[:-1], skirt[:-1], edge[1:], skirt[:-1], skirt[1:], edge[1:]), axis=1).ravel()
+        )
+    return numpy.concatenate(triangles)
+
+
+def grid_edges(data, size):
+    """ The edge rows of a size x size grid of 3-vectors, in the order of skirt_indices() """
+
+    grid = data.reshape((size, size, 3))
+    return numpy.concatenate((grid[0], grid[-1], grid[:, 0], grid[:, -1]))
+
+
+class TerrainTileBatchGeometry(Geometry):
+    """
+    Geometry holding the vertices of many terrain tiles in a single vertex buffer, one fixed-size slot per tile. All
+    tiles share one index buffer, and any set of slots is drawn with a single multi-draw call. With skirts, each tile
+    has a skirt hanging down from its edges, which hides cracks between neighboring tiles of different zooms.
+    """
+
+    def __init__(self, capacity, skirts=False):
+        self.capacity = capacity
+        self.skirts = skirts
+        self.tile_vertices = TILE_SIZE * TILE_SIZE
+        indices = plane_indices(TILE_SIZE, TILE_SIZE)
+        if skirts:
+            self.tile_vertices += 4 * TILE_SIZE
+            indices = numpy.concatenate((indices, skirt_indices(TILE_SIZE)))
+
+        super().__init__(
+            num_indices=indices.size, num_vertices=capacity * self.tile_vertices, has_normal_array=True,
+            mode=Geometry.TRIANGLES
+        )
+        self.indices = indices
+
+    def set_tile(self, slot, vertices, normals, skirt_depth=0.0):
+        """
+        Uploads the vertices and normals of a tile grid into a slot. Vertices should already be in scene coordinates.
+        Skirts, if used, are skirt_depth below the edges of the tile.
+        """
+
+        assert 0 <= slot < self.capacity
+        vertices = numpy.asarray(vertices, dtype=numpy.float32).reshape((-1, 3))
+        normals = numpy.asarray(normals, dtype=numpy.float32).reshape((-1, 3))
+
+        if self.skirts:
+            skirt = grid_edges(vertices, TILE_SIZE)
+            skirt[:, 2] -= skirt_depth
+            vertices = numpy.concatenate((vertices, skirt))
+            normals = numpy.concatenate((normals, grid_edges(normals, TILE_SIZE)))
+
+        # Tiles are uploaded directly, since keeping a client-side copy of every slot would double their memory
+        offset = slot * self.tile_vertices * 3 * sizeof(GLfloat)
+        for buffer, data in ((self.vertex_buffer, vertices), (self.normal_buffer, normals)):
+            data = numpy.ascontiguousarray(data)
+            assert data.size == self.tile_vertices * 3
+            glBindBuffer(GL_ARRAY_BUFFER, buffer)
+            glBufferSubData(GL_ARRAY_BUFFER, offset, data.nbytes, data)
+            UploadStats.app().add(data.nbytes)
+        glBindBuffer(GL_ARRAY_BUFFER, 0)
+
+    def draw(self, slots):
+        """ Draws the tiles in slots. The vertex array object and index buffer must already be bound. """
+
+        if not slots:
+            return
+
+        count = len(slots)
+        counts = numpy.full(count, self.num_indices, dtype=numpy.int32)
+        offsets = (c_void_p * count)()  # Every tile starts at the beginning of the shared index buffer
+        base_vertices = numpy.asarray(slots, dtype=numpy.int32) * self.tile_vertices
+        glMultiDrawElementsBaseVertex(self.mode, counts, GL_UNSIGNED_INT, offsets, count, base_vertices)
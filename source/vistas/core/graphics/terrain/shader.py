@@ -33,6 +33,7 @@ class TerrainColorShaderProgram(TerrainShaderProgram):
         img_data = (numpy.ones((tw, th, 3)).astype(numpy.uint8) * 255).ravel()
         self.boundary_texture = Texture(data=img_data, width=tw, height=tw)
         self.zonal_texture = Texture(data=img_data, width=tw, height=tw)
+        self.value_texture = None
 
         self.has_color = False
         self.has_boundaries = False
@@ -64,6 +65,12 @@ class TerrainColorShaderProgram(TerrainShaderProgram):
         glBindTexture(GL_TEXTURE_2D, self.zonal_texture.texture)
         self.uniform1i("zonalTexture", 1)
 
+        self.uniform1i("useValueTexture", self.value_texture is not None)
+        if self.value_texture is not None:
+            glActiveTexture(GL_TEXTURE2)
+            glBindTexture(GL_TEXTURE_2D, self.value_texture.texture)
+            self.uniform1i("valueTexture", 2)
+
         self.uniform1i("hideNoData", self.hide_no_data)
         self.uniform1i("perVertexColor", self.per_vertex_color)
         self.uniform1i("perVertexLighting", self.per_vertex_lighting)
@@ -86,11 +93,12 @@ class TerrainColorShaderProgram(TerrainShaderProgram):
 
     def post_render(self, camera):
         glBindTexture(GL_TEXTURE_2D, 0)
+        glActiveTexture(GL_TEXTURE0)
         super().post_render(camera)
 
 
 class TerrainTileShaderProgram(TerrainShaderProgram):
-    """ Terrain shading program for TerrainTileGeometry. """
+    """ Terrain shading program for TerrainTileBatchGeometry. """
 
     def __init__(self):
         super().__init__()
@@ -9,24 +9,40 @@ from numpy.core.multiarray import ndarray
 class Texture:
     """ Object representation of an OpenGL texture. """
 
-    def __init__(self, data: Union[ndarray, Image]=None, width=None, height=None, src_format=GL_RGB, gl_format=GL_RGB):
+    def __init__(self, data: Union[ndarray, Image]=None, width=None, height=None, src_format=GL_RGB, gl_format=GL_RGB,
+                 data_type=GL_UNSIGNED_BYTE, tex_filter=GL_LINEAR):
         if isinstance(data, Image):
             data = data.transpose(FLIP_TOP_BOTTOM)
             width, height = data.size
             data = numpy.array(data.getdata())
 
+        self.width = width
+        self.height = height
+        self.gl_format = gl_format
+        self.data_type = data_type
+
         self.texture = glGenTextures(1)
 
         # Set texture params
         glBindTexture(GL_TEXTURE_2D, self.texture)
-        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, GL_LINEAR)
-        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, GL_LINEAR)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MAG_FILTER, tex_filter)
+        glTexParameteri(GL_TEXTURE_2D, GL_TEXTURE_MIN_FILTER, tex_filter)
         glBindTexture(GL_TEXTURE_2D, 0)
 
         if data is not None and width is not None and height is not None:
             glBindTexture(GL_TEXTURE_2D, self.texture)
-            glTexImage2D(GL_TEXTURE_2D, 0, src_format, width, height, 0, gl_format, GL_UNSIGNED_BYTE, data)
+            glTexImage2D(GL_TEXTURE_2D, 0, src_format, width, height, 0, gl_format, data_type, data)
             glBindTexture(GL_TEXTURE_2D, 0)
 
+    def update(self, data: ndarray, x_offset=0, y_offset=0, width=None, height=None):
+        """ Replace a region of the texture without reallocating it. The whole texture is replaced by default. """
+
+        width = self.width if width is None else width
+        height = self.height if height is None else height
+
+        glBindTexture(GL_TEXTURE_2D, self.texture)
+        glTexSubImage2D(GL_TEXTURE_2D, 0, x_offset, y_offset, width, height, self.gl_format, self.data_type, data)
+        glBindTexture(GL_TEXTURE_2D, 0)
+
     def __del__(self):
         glDeleteTextures([self.texture])
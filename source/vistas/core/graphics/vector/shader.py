@@ -1,10 +1,14 @@
-import wx
 from OpenGL.GL import *
 
 from vistas.core.color import RGBColor
 from vistas.core.graphics.shader import ShaderProgram
 from vistas.core.paths import get_builtin_shader
-from vistas.ui.utils import post_redisplay
+from vistas.core.utils import has_ui, post_redisplay
+
+try:
+    import wx
+except ImportError:
+    wx = None
 
 
 class VectorShaderProgram(ShaderProgram):
@@ -33,10 +37,13 @@ class VectorShaderProgram(ShaderProgram):
         self.use_magnitude_scale = False
         self.vector_speed = 1
 
-        self.animation_timer = wx.Timer()
-        self.animation_timer.Bind(wx.EVT_TIMER, self.on_animate)
+        # Animation is driven by a UI timer. Without the UI, animation_value can be stepped with on_animate()
+        self.animation_timer = None
+        if has_ui():
+            self.animation_timer = wx.Timer()
+            self.animation_timer.Bind(wx.EVT_TIMER, self.on_animate)
 
-    def on_animate(self, event):
+    def on_animate(self, event=None):
         self.animation_value = self.animation_value + 0.1 if self.animation_value <= 1.0 else -1
         post_redisplay()
 
@@ -48,14 +55,16 @@ class VectorShaderProgram(ShaderProgram):
     def animate(self, value):
         self._animate = value
         if self._animate:
-            self.animation_timer.Start(self._animation_speed)
+            if self.animation_timer is not None:
+                self.animation_timer.Start(self._animation_speed)
         else:
-            self.animation_timer.Stop()
+            if self.animation_timer is not None:
+                self.animation_timer.Stop()
             self.animation_value = 0
 
     @property
     def is_animating(self):
-        return self.animation_timer.IsRunning()
+        return self.animation_timer is not None and self.animation_timer.IsRunning()
 
     @property
     def animation_speed(self):
@@ -64,7 +73,7 @@ class VectorShaderProgram(ShaderProgram):
     @animation_speed.setter
     def animation_speed(self, value):
         self._animation_speed = value
-        if self.animation_timer.IsRunning():
+        if self.is_animating:
             self.animation_timer.Stop()
             self.animation_timer.Start(self._animation_speed)
 
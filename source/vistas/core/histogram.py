@@ -1,13 +1,31 @@
 import numpy
 
+HISTOGRAM_BINS = 256  # Resolution of histograms precomputed for plugin stats
+
+
+def compute_histogram_counts(data, min_value, max_value, nodata_value=None, bins=HISTOGRAM_BINS):
+    """
+    Computes fixed-bin counts of the valid values in data over a range. The counts are stored in plugin stats and can be
+    rebinned by Histogram to any resolution without touching the data again.
+    """
+
+    values = numpy.ma.compressed(numpy.ma.masked_invalid(data))
+    if nodata_value is not None:
+        values = values[values != nodata_value]
+    return [int(x) for x in numpy.histogram(values, bins, range=(min_value, max_value))[0]]
+
 
 class Histogram:
-    """ Internal representation of a histogram. Internally handles array masking and ranges. """
+    """
+    Internal representation of a histogram. Internally handles array masking and ranges. A histogram is built either
+    from data, or from fixed-bin counts spanning min_value to max_value.
+    """
 
-    def __init__(self, data=None, min_value=None, max_value=None, nodata_value=None):
-        if data is None:
+    def __init__(self, data=None, min_value=None, max_value=None, nodata_value=None, counts=None):
+        if data is None and counts is None:
             data = numpy.zeros(1)
         self.data = data
+        self.counts = None if counts is None else numpy.asarray(counts)
         self.min_value = min_value
         self.max_value = max_value
         self.nodata_value = nodata_value
@@ -17,6 +35,14 @@ class Histogram:
         if all(x is not None for x in (self.min_value, self.max_value)):
             rng = (self.min_value, self.max_value)
 
+        if self.counts is not None:
+            # Rebin by splitting the count of each fixed bin across the bins it overlaps, in proportion to the overlap.
+            # Edges are interpolated in units of fixed bins, so that rebinning to a divisor of the count is exact.
+            num_counts = self.counts.size
+            cumulative = numpy.concatenate(([0], numpy.cumsum(self.counts, dtype=numpy.float64)))
+            edges = numpy.arange(bins + 1) * num_counts / bins
+            return numpy.diff(numpy.interp(edges, numpy.arange(num_counts + 1), cumulative))
+
         if self.nodata_value is None:
             return numpy.histogram(self.data, bins, range=rng)[0]
         else:
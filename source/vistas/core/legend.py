@@ -1,6 +1,7 @@
+import numpy
 from PIL import Image, ImageDraw, ImageFont
 
-from vistas.core.color import Color, interpolate_color
+from vistas.core.color import Color, RGBColor, interpolate_color
 from vistas.core.fonts import get_font_path
 
 
@@ -78,6 +79,11 @@ class Legend:
 
         raise NotImplementedError
 
+    def get_colors(self, values):
+        """ Returns an (n, 3) array of the RGB colors of an array of values. Implemented by subclasses """
+
+        raise NotImplementedError
+
 
 class StretchedLegend(Legend):
 
@@ -95,6 +101,23 @@ class StretchedLegend(Legend):
 
         return interpolate_color((self.low_value, self.high_value), self.low_color, self.high_color, value)
 
+    def get_colors(self, values, steps=256, nodata_color=RGBColor(0.5, 0.5, 0.5)):
+        """ Classifies values into a table of steps colors between low and high. Missing values are nodata_color. """
+
+        table = numpy.array([
+            interpolate_color((0, steps - 1), self.low_color, self.high_color, i).rgb.rgb_list for i in range(steps)
+        ], dtype=numpy.float32)
+
+        values = numpy.asarray(values, dtype=numpy.float64)
+        missing = numpy.isnan(values)
+        span = self.high_value - self.low_value
+        t = (values - self.low_value) / span if span > 0 else (values >= self.high_value).astype(numpy.float64)
+        index = numpy.clip(numpy.round(numpy.where(missing, 0, t) * (steps - 1)), 0, steps - 1).astype(numpy.intp)
+
+        colors = table[index]
+        colors[missing] = nodata_color.rgb.rgb_list
+        return colors
+
 
 class CategoricalLegend(Legend):
 
@@ -111,3 +134,17 @@ class CategoricalLegend(Legend):
                 return color
 
         return None
+
+    def get_colors(self, values, default_color=RGBColor(0.5, 0.5, 0.5)):
+        """ Maps labels to the colors of their categories. Labels without a category are default_color. """
+
+        colors = {}
+        for color, label in reversed(self.categories):  # The first category with a label wins, as with get_color()
+            colors[label] = color.rgb.rgb_list
+
+        codes = {}
+        index = numpy.fromiter((codes.setdefault(value, len(codes)) for value in values), dtype=numpy.intp)
+        palette = numpy.array(
+            [colors.get(value, default_color.rgb.rgb_list) for value in codes], dtype=numpy.float32
+        ).reshape((-1, 3))
+        return palette[index]
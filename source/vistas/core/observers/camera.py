@@ -1,5 +1,5 @@
 from vistas.core.observers.interface import Observable
-from vistas.ui.utils import post_redisplay
+from vistas.core.utils import post_redisplay
 
 
 class CameraObservable(Observable):
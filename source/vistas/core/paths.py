@@ -1,9 +1,12 @@
 import os
 
-import wx
-
 from vistas.core.utils import get_platform
 
+try:
+    import wx
+except ImportError:
+    wx = None   # Paths are derived from the source tree and the user's home directory instead
+
 try:
     import BUILD_CONSTANTS
 except ImportError:
@@ -17,9 +20,16 @@ def get_assets_dir():
     return '' if profile == 'deploy' else '..'
 
 
+def get_source_root():
+    """ Return the root of the source tree, which contains the plugins and resources directories. """
+    return os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..', '..'))
+
+
 def get_builtin_plugins_directory():
     """ Return the current builtin plugins directory. """
-    if get_platform() == 'windows':
+    if wx is None:
+        return os.path.join(get_source_root(), 'plugins')
+    elif get_platform() == 'windows':
         return os.path.join(os.getcwd(), get_assets_dir(), 'plugins')
     else:
         return os.path.join(os.path.dirname(wx.StandardPaths.Get().ExecutablePath), '..', 'plugins')
@@ -27,7 +37,9 @@ def get_builtin_plugins_directory():
 
 def get_resources_directory():
     """ Return the current resources directory. """
-    if get_platform() == 'windows':
+    if wx is None:
+        return os.path.join(get_source_root(), 'resources')
+    elif get_platform() == 'windows':
         return os.path.join(os.getcwd(), get_assets_dir(), 'resources')
     else:
         return os.path.join(os.path.dirname(wx.StandardPaths.Get().ExecutablePath), '..', 'resources')
@@ -38,7 +50,11 @@ def get_builtin_shader(path):
 
 
 def get_config_dir():
-    if get_platform() == 'macos':
+    if wx is None:
+        if get_platform() == 'macos':
+            return os.path.join(os.path.expanduser('~'), 'Library', 'Application Support', 'VISTAS')
+        return os.path.join(os.environ.get('APPDATA', os.path.expanduser('~')), 'VISTAS')
+    elif get_platform() == 'macos':
         return os.path.join(wx.StandardPaths.Get().UserLocalDataDir, 'VISTAS')
     else:
         return os.path.join(wx.StandardPaths.Get().UserConfigDir, 'VISTAS')
@@ -1,8 +1,12 @@
 import os
 from typing import Optional
 
+import numpy
+
+from vistas.core.histogram import Histogram, compute_histogram_counts
 from vistas.core.stats import PluginStats, VariableStats
 from vistas.core.gis.extent import Extent
+from vistas.core.gis.spatial_index import FeatureIndex
 from vistas.core.plugins.interface import Plugin
 
 
@@ -148,12 +152,93 @@ class RasterDataPlugin(DataPlugin):
 
         raise NotImplemented
 
+    def sample(self, variable, date, rows, cols):
+        """
+        Returns the values of the cells at the given rows and columns and time. rows and cols may be scalars or arrays
+        of the same shape. Plugins should override this with reads that don't require the whole grid in memory.
+        """
+
+        return self.get_data(variable, date)[numpy.asarray(rows, dtype=int), numpy.asarray(cols, dtype=int)]
+
+    def sample_time_series(self, variable, rows, cols, dates=None):
+        """
+        Returns the values of the cells at each of the given dates, which default to all timestamps of the data. The
+        result has the dates as the first dimension.
+        """
+
+        if dates is None:
+            time_info = self.time_info
+            dates = time_info.timestamps if time_info is not None and time_info.is_temporal else [None]
+
+        return numpy.ma.stack([numpy.ma.asarray(self.sample(variable, date, rows, cols)) for date in dates])
+
+    def _histogram_dates(self):
+        time_info = self.time_info
+        return time_info.timestamps if time_info is not None and time_info.is_temporal else [None]
+
+    def calculate_histograms(self, variable, stats: VariableStats):
+        """
+        Computes fixed-bin histograms of a variable for each timestep, and an aggregate over all timesteps, and stores
+        them in the variable stats. Called by plugins from `calculate_stats()` once the range of the variable is known.
+        """
+
+        if stats.min_value is None or stats.max_value is None:
+            return
+
+        histograms = [
+            compute_histogram_counts(
+                self.get_data(variable, date), stats.min_value, stats.max_value, stats.nodata_value
+            ) for date in self._histogram_dates()
+        ]
+        stats.misc['histograms'] = histograms
+        stats.misc['histogram'] = [int(x) for x in numpy.sum(histograms, axis=0)]
+
+    def get_histogram(self, variable, date=None, all_timesteps=False) -> Histogram:
+        """
+        Returns a histogram of the variable at the given time, or over all timesteps. Histograms precomputed by
+        `calculate_histograms()` are used when available, otherwise the histogram is built from the data.
+        """
+
+        stats = self.variable_stats(variable)
+        misc = stats.misc if stats is not None else {}
+        dates = self._histogram_dates()
+
+        counts = None
+        if all_timesteps:
+            counts = misc.get('histogram')
+        elif misc.get('histograms') is not None and len(misc['histograms']) == len(dates):
+            if date is None or dates[0] is None:
+                index = 0
+            else:
+                index = min(range(len(dates)), key=lambda i: abs(dates[i] - date))
+            counts = misc['histograms'][index]
+
+        if counts is not None:
+            return Histogram(counts=counts, min_value=stats.min_value, max_value=stats.max_value)
+
+        min_value, max_value, nodata_value = (None, None, None) if stats is None else (
+            stats.min_value, stats.max_value, stats.nodata_value
+        )
+        if all_timesteps:
+            data = numpy.ma.concatenate([numpy.ma.ravel(self.get_data(variable, d)) for d in dates])
+        else:
+            data = self.get_data(variable, date)
+        return Histogram(data, min_value=min_value, max_value=max_value, nodata_value=nodata_value)
+
 
 class FeatureDataPlugin(DataPlugin):
     """ Base class for feature data (e.g., shapefile) """
 
     data_type = DataPlugin.FEATURE
 
+    def __init__(self):
+        super().__init__()
+        self._spatial_index = None
+
+    def set_path(self, path):
+        self._spatial_index = None
+        super().set_path(path)
+
     def get_num_features(self):
         """ Returns the number of features in a feature collection. """
 
@@ -163,3 +248,31 @@ class FeatureDataPlugin(DataPlugin):
         """ Returns an array of shapely features for the given time """
 
         raise NotImplemented
+
+    def get_values(self, variable, date=None):
+        """ Returns an array of the values of an attribute of every feature, in the order of get_features() """
+
+        return numpy.array([feature['properties'].get(variable) for feature in self.get_features(date)])
+
+    def get_ids(self):
+        """ Returns an array of the ids of the features, in the order of get_features() """
+
+        return numpy.array([feature.get('id') for feature in self.get_features()])
+
+    @property
+    def spatial_index(self) -> FeatureIndex:
+        """ A spatial index of the features. The index is built on first use and cached until the path changes. """
+
+        if self._spatial_index is None:
+            self._spatial_index = FeatureIndex(self.get_features())
+        return self._spatial_index
+
+    def query_point(self, x, y):
+        """ Returns the features containing the point """
+
+        return self.spatial_index.query_point(x, y)
+
+    def query_bbox(self, xmin, ymin, xmax, ymax):
+        """ Returns the features intersecting the bounding box """
+
+        return self.spatial_index.query_bbox(xmin, ymin, xmax, ymax)
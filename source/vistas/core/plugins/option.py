@@ -1,8 +1,7 @@
-from vistas.ui.events import PluginOptionEvent
-from vistas.ui.utils import get_main_window
-
 import sys
 
+from vistas.core.utils import has_ui
+
 
 class Option:
     """ An interface for specifying plugin options for a visualization. """
@@ -64,6 +63,13 @@ class Option:
             return self.value
 
     def option_updated(self):
+        if not has_ui():
+            return
+
+        # Imported here so that options can be used without the UI toolkit
+        from vistas.ui.events import PluginOptionEvent
+        from vistas.ui.utils import get_main_window
+
         get_main_window().AddPendingEvent(PluginOptionEvent(plugin=self.plugin, option=self,
                                                             change=PluginOptionEvent.OPTION_CHANGED))
 
@@ -1,7 +1,6 @@
 import os
 from typing import List, Dict, Optional, Union
 
-import wx
 from PIL import Image
 from pyrr import Vector3
 from shapely.geometry import LinearRing, Point
@@ -9,10 +8,17 @@ from shapely.geometry import LinearRing, Point
 from vistas.core.plugins.data import DataPlugin
 from vistas.core.plugins.interface import Plugin
 from vistas.core.threading import Thread
-from vistas.ui.utils import get_main_window
+from vistas.core.utils import has_ui
 
-RenderEvent, EVT_VISUALIZATION_RENDERED = wx.lib.newevent.NewEvent()
-VisualizationUpdateEvent, EVT_VISUALIZATION_UPDATED = wx.lib.newevent.NewEvent()
+try:
+    import wx
+    import wx.lib.newevent
+except ImportError:
+    wx = None
+
+if wx is not None:
+    RenderEvent, EVT_VISUALIZATION_RENDERED = wx.lib.newevent.NewEvent()
+    VisualizationUpdateEvent, EVT_VISUALIZATION_UPDATED = wx.lib.newevent.NewEvent()
 
 
 class VisualizationPlugin(Plugin):
@@ -79,6 +85,12 @@ class VisualizationPlugin(Plugin):
 
         return None
 
+    @property
+    def filter_histogram_all_timesteps(self):
+        """ A histogram representing the filterable data over all timesteps, if different from `filter_histogram` """
+
+        return None
+
     @property
     def is_filtered(self):
         return False
@@ -113,12 +125,16 @@ class VisualizationPlugin2D(VisualizationPlugin):
             self.handler = handler
 
         def run(self):
-            event = RenderEvent(image=self.plugin.render(self.width, self.height))
-            handler = self.handler if self.handler is not None else get_main_window()
+            image = self.plugin.render(self.width, self.height)
 
             self.sync_with_main(self.post_render)
 
-            wx.PostEvent(handler, event)
+            if has_ui():
+                # Imported here so that visualizations can be rendered without the UI toolkit
+                from vistas.ui.utils import get_main_window
+
+                handler = self.handler if self.handler is not None else get_main_window()
+                wx.PostEvent(handler, RenderEvent(image=image))
 
         def post_render(self):
             self.plugin.post_render()
@@ -1,24 +1,48 @@
-import asyncio
-import sys
+import queue
 import threading
 from time import sleep
 
-import wx.lib.newevent
+from vistas.core.utils import has_ui
 
-ThreadSyncEvent, EVT_THREAD_SYNC = wx.lib.newevent.NewEvent()
+try:
+    import wx.lib.newevent
+except ImportError:
+    wx = None
 
+if wx is not None:
+    ThreadSyncEvent, EVT_THREAD_SYNC = wx.lib.newevent.NewEvent()
+    EvtHandler = wx.EvtHandler
+else:
+    EvtHandler = object
 
-class Thread(threading.Thread, wx.EvtHandler):
-    """ Base threading class. Enables event-based synchronization of the worker thread with the main thread. """
+
+class Thread(threading.Thread, EvtHandler):
+    """
+    Base threading class. Enables event-based synchronization of the worker thread with the main thread. Without the UI
+    toolkit there is no main loop to synchronize with. Synchronized functions often make OpenGL calls, and a headless
+    context is only current on the thread that created it, so they are queued instead, and run by that thread when it
+    calls run_synced(). Camera.render() does so before drawing.
+    """
+
+    _synced = queue.Queue()     # Headless: (func, args, kwargs) waiting to be run by run_synced()
 
     def __init__(self, *args, **kwargs):
         threading.Thread.__init__(self, *args, **kwargs)
-        wx.EvtHandler.__init__(self)
-        self.loop = None
 
-        self.Bind(EVT_THREAD_SYNC, self.on_sync)
+        if wx is not None:
+            wx.EvtHandler.__init__(self)
+            self.Bind(EVT_THREAD_SYNC, self.on_sync)
 
     def sync_with_main(self, func, args=(), kwargs={}, block=False, delay=0):
+        """
+        Runs func in the main thread. Without the UI toolkit, func is queued for run_synced() and this never blocks,
+        since the thread which runs the queue may itself be waiting for this thread's task to finish.
+        """
+
+        if not has_ui():
+            Thread._synced.put((func, args, kwargs))
+            return
+
         thread_event = threading.Event()
         event = ThreadSyncEvent(func=func, args=args, kwargs=kwargs, event=thread_event)
 
@@ -34,11 +58,16 @@ class Thread(threading.Thread, wx.EvtHandler):
 
         event.event.set()
 
-    def init_event_loop(self):
-        """ Start an asyncio event loop in this thread. """
-        if sys.platform == 'win32':
-            asyncio.set_event_loop(asyncio.ProactorEventLoop())
-        else:
-            asyncio.set_event_loop(asyncio.SelectorEventLoop())
+    @classmethod
+    def run_synced(cls):
+        """
+        Runs the functions queued by sync_with_main() without the UI toolkit, in the order they were queued. Must be
+        called by the thread which owns the OpenGL context.
+        """
 
-        self.loop = asyncio.get_event_loop()
+        while True:
+            try:
+                func, args, kwargs = cls._synced.get_nowait()
+            except queue.Empty:
+                return
+            func(*args, **kwargs)
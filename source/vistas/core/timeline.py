@@ -1,9 +1,11 @@
 import datetime
 from bisect import insort
 
-from vistas.core.utils import DatetimeEncoder, DatetimeDecoder
-from vistas.ui.events import TimelineEvent
-from vistas.ui.utils import post_timeline_change
+from vistas.core.utils import DatetimeEncoder, DatetimeDecoder, post_timeline_change
+
+# Kinds of timeline changes, posted with the current time and used by TimelineEvent
+VALUE_CHANGED = 0
+ATTR_CHANGED = 1
 
 
 class Timeline:
@@ -72,9 +74,9 @@ class Timeline:
     @start.setter
     def start(self, start: datetime.datetime):
         self._start = start
-        post_timeline_change(self._current, TimelineEvent.ATTR_CHANGED)
+        post_timeline_change(self._current, ATTR_CHANGED)
         if self.nearest_step():
-            post_timeline_change(self._current, TimelineEvent.VALUE_CHANGED)
+            post_timeline_change(self._current, VALUE_CHANGED)
 
     @property
     def end(self):
@@ -83,9 +85,9 @@ class Timeline:
     @end.setter
     def end(self, end):
         self._end = end
-        post_timeline_change(self._current, TimelineEvent.ATTR_CHANGED)
+        post_timeline_change(self._current, ATTR_CHANGED)
         if self.nearest_step():
-            post_timeline_change(self._current, TimelineEvent.VALUE_CHANGED)
+            post_timeline_change(self._current, VALUE_CHANGED)
 
     @property
     def current(self):
@@ -96,7 +98,7 @@ class Timeline:
         if self.enabled:
             self._current = current
             self.nearest_step()
-            post_timeline_change(self._current, TimelineEvent.VALUE_CHANGED)
+            post_timeline_change(self._current, VALUE_CHANGED)
 
     @property
     def min_step(self):
@@ -186,7 +188,7 @@ class Timeline:
             index = 0
         self._current_idx = index
         self._current = self.timestamps[self._current_idx]
-        post_timeline_change(self._current, TimelineEvent.VALUE_CHANGED)
+        post_timeline_change(self._current, VALUE_CHANGED)
 
     def back(self, steps=1):
         self.forward(steps * -1)
@@ -1,6 +1,7 @@
 import datetime
 import json
 import platform
+import sys
 
 
 def get_platform():
@@ -8,6 +9,39 @@ def get_platform():
     return 'macos' if platform.uname().system == 'Darwin' else 'windows'
 
 
+def has_ui():
+    """
+    Utility function for determining whether the UI toolkit is running. Without it, e.g. when rendering headless, UI
+    notifications are skipped and work which would be synchronized with the main thread is run directly.
+    """
+
+    wx = sys.modules.get('wx')
+    return wx is not None and wx.GetApp() is not None
+
+
+# The UI utilities are imported when they're called, so that the core can be used without the UI toolkit
+
+def post_redisplay():
+    """ Utility function for updating all 2D and 3D panels, if the UI is running. """
+    if has_ui():
+        from vistas.ui.utils import post_redisplay
+        post_redisplay()
+
+
+def post_message(msg, level):
+    """ Utility function for posting a message to the user, if the UI is running. """
+    if has_ui():
+        from vistas.ui.utils import post_message
+        post_message(msg, level)
+
+
+def post_timeline_change(time, change):
+    """ Utility function for alerting the UI that a timeline change has occurred, if the UI is running. """
+    if has_ui():
+        from vistas.ui.utils import post_timeline_change
+        post_timeline_change(time, change)
+
+
 class DatetimeEncoder(json.JSONEncoder):
     """
     Converts a python object, where datetime and timedelta objects are converted
@@ -1,5 +1,7 @@
 import wx.lib.newevent
 
+from vistas.core.timeline import ATTR_CHANGED, VALUE_CHANGED
+
 
 # Event for alerting the UI that the project has changed in some way
 ProjectChangedEventBase, EVT_COMMAND_PROJECT_CHANGED = wx.lib.newevent.NewEvent()
@@ -35,8 +37,8 @@ TimelineEventBase, EVT_TIMELINE_CHANGED = wx.lib.newevent.NewEvent()
 
 
 class TimelineEvent(TimelineEventBase):
-    VALUE_CHANGED = 0
-    ATTR_CHANGED = 1
+    VALUE_CHANGED = VALUE_CHANGED
+    ATTR_CHANGED = ATTR_CHANGED
 
     def __init__(self, time=None, timeline=None, change=None):
         super().__init__(time=time, timeline=timeline, change=change)
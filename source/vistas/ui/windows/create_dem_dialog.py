@@ -1,6 +1,3 @@
-import asyncio
-import sys
-
 from vistas.core.gis.elevation import ElevationService
 from vistas.core.task import Task
 from vistas.core.threading import Thread
@@ -22,12 +19,6 @@ class GenerateDEMThread(Thread):
         self.task.status = Task.INDETERMINATE
 
     def run(self):
-
-        if sys.platform == 'win32':
-            asyncio.set_event_loop(asyncio.ProactorEventLoop())
-        else:
-            asyncio.set_event_loop(asyncio.SelectorEventLoop())
-
         plugin = self.service.create_dem_from_plugin(self.data_plugin, self.path, self.task)
         DataNode(plugin, plugin.data_name, self.controller.project.data_root)
         self.controller.PopulateTreesFromProject(self.controller.project)
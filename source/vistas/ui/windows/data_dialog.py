@@ -94,7 +94,8 @@ class DataDialog(wx.Dialog):
                     info['Maximum Value'] = stats.max_value
                     info['No Data Value'] = stats.nodata_value
                     for row in stats.misc.items():
-                        info[row[0]] = row[1]
+                        if row[0] not in ('histogram', 'histograms'):
+                            info[row[0]] = row[1]
                 self.SetInfo(self.attr_text, info)
                 break
 
@@ -43,6 +43,7 @@ class VisualizationDialog(wx.Frame):
         if self.viz.is_filterable:
             self.filter_panel = wx.Panel(self.notebook)
             self.filter_histogram = HistogramCtrl(self.filter_panel, wx.ID_ANY)
+            self.all_timesteps_checkbox = wx.CheckBox(self.filter_panel, wx.ID_ANY, "Show All Timesteps")
             self.clear_filter_button = wx.Button(self.filter_panel, wx.ID_ANY, "Clear Filter")
             self.notebook.AddPage(self.filter_panel, "Filter")
 
@@ -61,10 +62,12 @@ class VisualizationDialog(wx.Frame):
             self.filter_panel_sizer = wx.BoxSizer(wx.VERTICAL)
             self.filter_panel.SetSizer(self.filter_panel_sizer)
             self.filter_panel_sizer.Add(self.filter_histogram, 1, wx.EXPAND)
+            self.filter_panel_sizer.Add(self.all_timesteps_checkbox, 0, wx.TOP, 5)
             self.filter_panel_sizer.Add(self.clear_filter_button, 0, wx.TOP, 5)
 
             self.filter_histogram.Bind(HISTOGRAM_CTRL_RANGE_VALUE_CHANGED_EVT, self.OnFilterChange)
             self.clear_filter_button.Bind(wx.EVT_BUTTON, self.OnClearFilter)
+            self.all_timesteps_checkbox.Bind(wx.EVT_CHECKBOX, self.OnAllTimesteps)
 
         self.options_panel.options = self.viz.get_options()
         self.options_panel.plugin = self.viz
@@ -236,20 +239,31 @@ class VisualizationDialog(wx.Frame):
             self.options_panel.plugin = self.viz
             self.options_panel.Layout()
         elif page == 3:
-            self.filter_histogram.SetHistogram(self.viz.filter_histogram)
+            self.filter_histogram.SetHistogram(self.GetFilterHistogram())
             if self.viz.is_filtered:
                 self.filter_histogram.SetStops(self.viz.filter_min, self.viz.filter_max)
         event.Skip()
 
+    def GetFilterHistogram(self):
+        if self.all_timesteps_checkbox.GetValue():
+            histogram = self.viz.filter_histogram_all_timesteps
+            if histogram is not None:
+                return histogram
+        return self.viz.filter_histogram
+
+    def OnAllTimesteps(self, event):
+        self.filter_histogram.SetHistogram(self.GetFilterHistogram(), not self.viz.is_filtered)
+
     def OnFilterChange(self, event):
         if self.viz.is_filterable:
             self.viz.set_filter(event.min_stop, event.max_stop)
 
     def OnClearFilter(self, event):
         if self.viz.is_filterable:
-            self.filter_histogram.SetHistogram(self.viz.filter_histogram, True)
+            self.filter_histogram.SetHistogram(self.GetFilterHistogram(), True)
             self.viz.clear_filter()
 
     def TimelineChanged(self):
         if self.viz.is_filterable:
-            self.filter_histogram.SetHistogram(self.viz.filter_histogram, not self.viz.is_filtered)
+            if not self.all_timesteps_checkbox.GetValue():
+                self.filter_histogram.SetHistogram(self.GetFilterHistogram(), not self.viz.is_filtered)